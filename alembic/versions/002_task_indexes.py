@@ -0,0 +1,63 @@
+"""task list indexes
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Индексы строятся без блокировки записи, поэтому вне транзакции
+    with op.get_context().autocommit_block():
+        # Индекс по первичному ключу дублирует сам ключ
+        op.drop_index('ix_tasks_id', table_name='tasks', postgresql_concurrently=True)
+        
+        op.create_index(
+            'ix_tasks_created_at_id', 'tasks', ['created_at', 'id'],
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_tasks_status_created_at_id', 'tasks', ['status', 'created_at', 'id'],
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_tasks_priority_created_at_id', 'tasks', ['priority', 'created_at', 'id'],
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_tasks_active_priority_created_at', 'tasks',
+            [sa.text('priority DESC'), 'created_at'],
+            postgresql_where=sa.text("status IN ('NEW', 'PENDING', 'IN_PROGRESS')"),
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_tasks_active_priority_created_at', table_name='tasks',
+            postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_tasks_priority_created_at_id', table_name='tasks',
+            postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_tasks_status_created_at_id', table_name='tasks',
+            postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_tasks_created_at_id', table_name='tasks',
+            postgresql_concurrently=True
+        )
+        
+        op.create_index('ix_tasks_id', 'tasks', ['id'], unique=False)
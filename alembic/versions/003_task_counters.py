@@ -0,0 +1,46 @@
+"""task counters
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Enum типы уже созданы в 001
+    task_status = postgresql.ENUM(name='taskstatus', create_type=False)
+    task_priority = postgresql.ENUM(name='taskpriority', create_type=False)
+    
+    op.create_table(
+        'task_counters',
+        sa.Column('status', task_status, nullable=False),
+        sa.Column('priority', task_priority, nullable=False),
+        sa.Column('shard', sa.SmallInteger(), nullable=False),
+        sa.Column('count', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('status', 'priority', 'shard')
+    )
+    
+    # Начальные значения по существующим задачам
+    op.execute(
+        """
+        INSERT INTO task_counters (status, priority, shard, count)
+        SELECT status, priority, 0, count(*)
+        FROM tasks
+        WHERE status IS NOT NULL AND priority IS NOT NULL
+        GROUP BY status, priority
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('task_counters')
@@ -0,0 +1,43 @@
+"""task outbox
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    task_priority = postgresql.ENUM(name='taskpriority', create_type=False)
+    
+    op.create_table(
+        'task_outbox',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('priority', task_priority, nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('id')
+    )
+    
+    # Задачи, застрявшие в NEW без сообщения в очереди, отправляются заново
+    op.execute(
+        """
+        INSERT INTO task_outbox (task_id, priority)
+        SELECT id, priority FROM tasks
+        WHERE status = 'NEW' AND priority IS NOT NULL
+        ORDER BY id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('task_outbox')
@@ -0,0 +1,32 @@
+"""task type and payload
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'tasks',
+        sa.Column('task_type', sa.String(length=64), nullable=False, server_default='default')
+    )
+    op.add_column(
+        'tasks',
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('tasks', 'payload')
+    op.drop_column('tasks', 'task_type')
@@ -0,0 +1,26 @@
+"""outbox task type
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'task_outbox',
+        sa.Column('task_type', sa.String(length=64), nullable=False, server_default='default')
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('task_outbox', 'task_type')
@@ -0,0 +1,41 @@
+"""task results storage
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('result_size', sa.BigInteger(), nullable=True))
+    op.add_column(
+        'tasks',
+        sa.Column('result_external', sa.Boolean(), nullable=False, server_default=sa.false())
+    )
+    op.create_table(
+        'task_results',
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.LargeBinary(), nullable=False),
+        sa.Column('encoding', sa.String(length=16), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('task_id')
+    )
+    # Содержимое сжимается приложением; без сжатия TOAST substring читает
+    # только нужные чанки значения
+    op.execute("ALTER TABLE task_results ALTER COLUMN content SET STORAGE EXTERNAL")
+
+
+def downgrade() -> None:
+    op.drop_table('task_results')
+    op.drop_column('tasks', 'result_external')
+    op.drop_column('tasks', 'result_size')
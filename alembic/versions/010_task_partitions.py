@@ -0,0 +1,124 @@
+"""partition tasks by created_at
+
+Миграция с простоем: после переименования tasks держится ACCESS EXCLUSIVE
+до конца транзакции, а SET NOT NULL, построение уникального индекса и
+VALIDATE сканируют всю таблицу. Запись и чтение задач на это время стоят,
+поэтому API и воркеры перед миграцией останавливаются.
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+# Секции на месяцы вперед; дальше их создает PartitionMaintainer
+PREMAKE_MONTHS = 3
+
+INDEXES = [
+    'ix_tasks_created_at_id',
+    'ix_tasks_status_created_at_id',
+    'ix_tasks_priority_created_at_id',
+    'ix_tasks_active_priority_created_at',
+]
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _create_indexes() -> None:
+    op.create_index('ix_tasks_created_at_id', 'tasks', ['created_at', 'id'])
+    op.create_index('ix_tasks_status_created_at_id', 'tasks', ['status', 'created_at', 'id'])
+    op.create_index('ix_tasks_priority_created_at_id', 'tasks', ['priority', 'created_at', 'id'])
+    op.create_index(
+        'ix_tasks_active_priority_created_at', 'tasks',
+        [sa.text('priority DESC'), 'created_at'],
+        postgresql_where=sa.text("status IN ('NEW', 'PENDING', 'IN_PROGRESS')")
+    )
+
+
+def upgrade() -> None:
+    # Ключ секционирования входит в первичный ключ и не может быть NULL
+    op.execute("UPDATE tasks SET created_at = now() WHERE created_at IS NULL")
+    op.alter_column(
+        'tasks', 'created_at',
+        existing_type=sa.DateTime(timezone=True),
+        nullable=False
+    )
+    
+    # Существующая таблица становится первой секцией без копирования строк.
+    # Первичный ключ секции должен совпадать с ключом tasks, иначе ATTACH
+    # построит еще один индекс (id, created_at) рядом со старым по id:
+    # ключ заменяется на готовый уникальный индекс, старый удаляется
+    op.execute("CREATE UNIQUE INDEX tasks_legacy_pkey ON tasks (id, created_at)")
+    op.rename_table('tasks', 'tasks_legacy')
+    op.execute(
+        "ALTER TABLE tasks_legacy DROP CONSTRAINT tasks_pkey, "
+        "ADD CONSTRAINT tasks_legacy_pkey PRIMARY KEY USING INDEX tasks_legacy_pkey"
+    )
+    for name in INDEXES:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name.replace('ix_tasks', 'ix_tasks_legacy', 1)}")
+    
+    op.execute(
+        "CREATE TABLE tasks (LIKE tasks_legacy INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute("ALTER TABLE tasks ADD CONSTRAINT tasks_pkey PRIMARY KEY (id, created_at)")
+    op.execute("ALTER SEQUENCE tasks_id_seq OWNED BY tasks.id")
+    # Индексы секционированной таблицы создаются и на каждой секции;
+    # совпадающие индексы и ключ tasks_legacy присоединяются при ATTACH
+    _create_indexes()
+    
+    # tasks_legacy принимает задачи до конца текущего месяца. Нижней границы
+    # у нее нет, поэтому при TASK_RETENTION_DAYS она архивируется целиком,
+    # когда срок хранения истечет для ее верхней границы
+    now = datetime.now(timezone.utc)
+    first = _add_months(now.replace(day=1, hour=0, minute=0, second=0, microsecond=0), 1)
+    # С проверенным CHECK ATTACH не сканирует секцию второй раз. VALIDATE
+    # выполняется под уже взятой ACCESS EXCLUSIVE и входит в простой
+    op.execute(
+        f"ALTER TABLE tasks_legacy ADD CONSTRAINT tasks_legacy_created_at_bound "
+        f"CHECK (created_at < '{first.isoformat()}') NOT VALID"
+    )
+    op.execute("ALTER TABLE tasks_legacy VALIDATE CONSTRAINT tasks_legacy_created_at_bound")
+    op.execute(
+        f"ALTER TABLE tasks ATTACH PARTITION tasks_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{first.isoformat()}')"
+    )
+    # После ATTACH границу гарантирует сама секция
+    op.execute("ALTER TABLE tasks_legacy DROP CONSTRAINT tasks_legacy_created_at_bound")
+    for offset in range(PREMAKE_MONTHS):
+        start = _add_months(first, offset)
+        op.execute(
+            f"CREATE TABLE tasks_p{start:%Y%m} PARTITION OF tasks "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{_add_months(start, 1).isoformat()}')"
+        )
+    # Страховка, если секции не были созданы заранее: вставка не падает
+    op.execute("CREATE TABLE tasks_default PARTITION OF tasks DEFAULT")
+
+
+def downgrade() -> None:
+    # Архивированные секции не возвращаются
+    op.execute("CREATE TABLE tasks_unpartitioned (LIKE tasks INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO tasks_unpartitioned SELECT * FROM tasks")
+    op.execute("ALTER SEQUENCE tasks_id_seq OWNED BY tasks_unpartitioned.id")
+    op.execute("DROP TABLE tasks")
+    op.rename_table('tasks_unpartitioned', 'tasks')
+    op.execute("ALTER TABLE tasks ADD CONSTRAINT tasks_pkey PRIMARY KEY (id)")
+    op.alter_column(
+        'tasks', 'created_at',
+        existing_type=sa.DateTime(timezone=True),
+        nullable=True
+    )
+    _create_indexes()
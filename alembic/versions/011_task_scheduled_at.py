@@ -0,0 +1,26 @@
+"""task scheduled_at for database dispatch
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Колонка добавляется в секционированную таблицу и во все ее секции.
+    # Отдельный индекс не нужен: захват задач идет по
+    # ix_tasks_active_priority_created_at, scheduled_at проверяется фильтром
+    op.add_column('tasks', sa.Column('scheduled_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('tasks', 'scheduled_at')
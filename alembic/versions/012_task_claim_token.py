@@ -0,0 +1,24 @@
+"""task claim_token for database dispatch
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Метка захвата проверяется по строке задачи, индекс не нужен
+    op.add_column('tasks', sa.Column('claim_token', sa.String(32), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('tasks', 'claim_token')
@@ -0,0 +1,3 @@
+"""
+Нагрузочные тесты конвейера create_task -> TaskWorker -> COMPLETED
+"""
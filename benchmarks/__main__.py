@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Пропускная способность create_task -> TaskWorker -> COMPLETED"
+    )
+    parser.add_argument(
+        "--concurrency", default="1,8,32",
+        help="уровни параллелизма клиентов через запятую"
+    )
+    parser.add_argument("--tasks", type=int, default=500, help="задач на уровень")
+    parser.add_argument("--worker-concurrency", type=int, default=None)
+    parser.add_argument("--work-ms", type=float, default=0, help="работа обработчика")
+    parser.add_argument("--warmup", type=int, default=20, help="задач на прогрев")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", type=Path, help="файл для результатов в JSON")
+    parser.add_argument("--baseline", type=Path, help="результаты для сравнения")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help="допустимое ухудшение относительно baseline"
+    )
+    parser.add_argument(
+        "--broker", choices=["rabbitmq", "memory"],
+        help="брокер вместо BROKER из окружения"
+    )
+    parser.add_argument(
+        "--dispatch", choices=["broker", "database"],
+        help="режим доставки задач вместо TASK_DISPATCH_MODE"
+    )
+    parser.add_argument(
+        "--database-url",
+        help="база вместо DATABASE_URL, например sqlite+aiosqlite:///bench.db"
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    # Настройки читаются при импорте приложения, поэтому окружение
+    # задается до импорта benchmarks.pipeline
+    if args.broker:
+        os.environ["BROKER"] = args.broker
+    if args.dispatch:
+        os.environ["TASK_DISPATCH_MODE"] = args.dispatch
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    from benchmarks.pipeline import BenchmarkConfig, compare, run_benchmark
+
+    config = BenchmarkConfig(
+        concurrency_levels=[int(value) for value in args.concurrency.split(",")],
+        tasks_per_level=args.tasks,
+        worker_concurrency=args.worker_concurrency,
+        work_ms=args.work_ms,
+        warmup_tasks=args.warmup,
+        timeout_seconds=args.timeout,
+    )
+    results = asyncio.run(run_benchmark(config))
+
+    print(f"{'clients':>8} {'tasks/s':>10} {'create p50':>11} {'create p99':>11} "
+          f"{'e2e p50':>10} {'e2e p99':>10}")
+    for level in results["levels"]:
+        create, e2e = level["create_latency_ms"], level["end_to_end_latency_ms"]
+        print(f"{level['concurrency']:>8} {level['throughput']:>10} "
+              f"{create['p50']:>11} {create['p99']:>11} {e2e['p50']:>10} {e2e['p99']:>10}")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        regressions = compare(
+            results, json.loads(args.baseline.read_text()), args.tolerance
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
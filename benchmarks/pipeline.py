@@ -0,0 +1,246 @@
+import asyncio
+import contextlib
+import math
+import platform
+import subprocess
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.core.config import settings
+from src.main import app
+from src.models.task import DEFAULT_TASK_TYPE, TERMINAL_STATUSES, TaskStatus
+from src.services.handlers import HandlerRegistry
+from src.services.status_sink import StatusSink
+from src.services.worker import TaskWorker
+
+@dataclass
+class BenchmarkConfig:
+    """Параметры прогона"""
+    # Число параллельных клиентов API на каждом уровне
+    concurrency_levels: list[int] = field(default_factory=lambda: [1, 8, 32])
+    tasks_per_level: int = 500
+    # Параллелизм воркера; по умолчанию WORKERS_NUM
+    worker_concurrency: Optional[int] = None
+    # Имитация работы обработчика
+    work_ms: float = 0
+    warmup_tasks: int = 20
+    timeout_seconds: float = 120
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(latencies: list[float]) -> dict:
+    """p50, p99 и максимум в миллисекундах"""
+    return {
+        "p50": round(percentile(latencies, 50) * 1000, 3),
+        "p99": round(percentile(latencies, 99) * 1000, 3),
+        "max": round(max(latencies, default=0) * 1000, 3),
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Регрессии текущего прогона относительно базового.
+
+    Сравниваются уровни с одинаковым числом клиентов: пропускная способность
+    не должна упасть, а p99 задержек вырасти больше чем на tolerance.
+    """
+    regressions = []
+    baseline_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in current["levels"]:
+        base = baseline_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        concurrency = level["concurrency"]
+        if level["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"concurrency {concurrency}: throughput {level['throughput']} "
+                f"< baseline {base['throughput']}"
+            )
+        for metric in ("create_latency_ms", "end_to_end_latency_ms"):
+            p99, base_p99 = level[metric]["p99"], base[metric]["p99"]
+            if p99 > base_p99 * (1 + tolerance):
+                regressions.append(
+                    f"concurrency {concurrency}: {metric} p99 {p99} > baseline {base_p99}"
+                )
+    return regressions
+
+
+class CompletionTracker(StatusSink):
+    """StatusSink, запоминающий момент commit итогового статуса задачи.
+
+    Время фиксируется после записи в базу, то есть тогда, когда
+    завершение задачи видно клиентам API. Задачи, завершившиеся не
+    COMPLETED, попадают в failed, и ожидание не висит до таймаута.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker):
+        super().__init__(session_factory)
+        self.completed: dict[int, float] = {}
+        self.failed: dict[int, TaskStatus] = {}
+        self._changed = asyncio.Event()
+
+    def record(self, task_id: int, status: TaskStatus, **kwargs) -> asyncio.Future:
+        future = super().record(task_id, status, **kwargs)
+        if status in TERMINAL_STATUSES:
+            future.add_done_callback(
+                lambda done: self._on_committed(task_id, status, done)
+            )
+        return future
+
+    def _on_committed(self, task_id: int, status: TaskStatus, future: asyncio.Future):
+        if future.cancelled() or future.exception() is not None or not future.result():
+            return
+        if status == TaskStatus.COMPLETED:
+            self.completed[task_id] = time.perf_counter()
+        else:
+            self.failed[task_id] = status
+        self._changed.set()
+
+    async def wait_for(self, task_ids, timeout: float):
+        """Ожидание итогового статуса всех задач task_ids.
+
+        RuntimeError, если какая-то из них завершилась не COMPLETED.
+        """
+        async def wait_all():
+            while not all(
+                task_id in self.completed or task_id in self.failed
+                for task_id in task_ids
+            ):
+                self._changed.clear()
+                await self._changed.wait()
+
+        await asyncio.wait_for(wait_all(), timeout)
+        failed = sorted(task_id for task_id in task_ids if task_id in self.failed)
+        if failed:
+            raise RuntimeError(
+                f"{len(failed)} benchmark tasks did not complete, "
+                f"first: {failed[0]} ({self.failed[failed[0]].value})"
+            )
+
+
+def benchmark_handlers(work_ms: float) -> HandlerRegistry:
+    """Реестр с единственным обработчиком для прогона.
+
+    API принимает только зарегистрированные типы, поэтому обработчик
+    прогона подменяет тип по умолчанию.
+    """
+    handlers = HandlerRegistry()
+
+    @handlers.register(DEFAULT_TASK_TYPE)
+    async def benchmark_task(payload: dict) -> str:
+        if work_ms:
+            await asyncio.sleep(work_ms / 1000)
+        return "ok"
+
+    return handlers
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    tracker: CompletionTracker,
+    concurrency: int,
+    tasks: int,
+    timeout: float
+) -> dict:
+    """Создание tasks задач concurrency клиентами и ожидание их завершения"""
+    started_at: dict[int, float] = {}
+    create_latencies: list[float] = []
+    issued = 0
+
+    async def client_loop():
+        nonlocal issued
+        while issued < tasks:
+            issued += 1
+            started = time.perf_counter()
+            response = await client.post("/api/v1/tasks/", json={"name": "benchmark"})
+            response.raise_for_status()
+            create_latencies.append(time.perf_counter() - started)
+            started_at[response.json()["id"]] = started
+
+    level_started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    await tracker.wait_for(started_at, timeout)
+
+    finished = max(tracker.completed[task_id] for task_id in started_at)
+    return {
+        "concurrency": concurrency,
+        "tasks": tasks,
+        "throughput": round(tasks / (finished - level_started), 2),
+        "create_latency_ms": summarize(create_latencies),
+        "end_to_end_latency_ms": summarize([
+            tracker.completed[task_id] - started
+            for task_id, started in started_at.items()
+        ]),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    with contextlib.suppress(Exception):
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    return None
+
+
+async def run_benchmark(config: BenchmarkConfig) -> dict:
+    """Прогон API и воркера в одном процессе.
+
+    API работает через lifespan приложения и ASGI транспорт httpx, без
+    сети; воркер читает задачи из той же очереди, что и в продакшене.
+    """
+    # Метрики воркера в этом процессе не нужны
+    settings.worker_metrics_port = 0
+
+    async with app.router.lifespan_context(app):
+        # Брокер и пул соединений принадлежат lifespan приложения
+        worker = TaskWorker(
+            concurrency=config.worker_concurrency,
+            handlers=benchmark_handlers(config.work_ms),
+            embedded=True
+        )
+        tracker = CompletionTracker(worker.async_session)
+        worker.status_sink = tracker
+        worker_run = asyncio.create_task(worker.run())
+        try:
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url="http://benchmark"
+            ) as client:
+                if config.warmup_tasks:
+                    await run_level(
+                        client, tracker, 1, config.warmup_tasks, config.timeout_seconds
+                    )
+                levels = []
+                for concurrency in config.concurrency_levels:
+                    levels.append(await run_level(
+                        client,
+                        tracker,
+                        concurrency,
+                        config.tasks_per_level,
+                        config.timeout_seconds
+                    ))
+        finally:
+            worker.stop()
+            await worker_run
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "worker_concurrency": worker.concurrency,
+        "config": asdict(config),
+        "levels": levels,
+    }
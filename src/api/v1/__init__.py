@@ -2,6 +2,13 @@
 API version 1
 """
 
-from .endpoints import router
-
 __all__ = ["router"]
+
+
+def __getattr__(name: str):
+    # Роутер импортируется лениво: сервисы импортируют src.api.v1.schemas,
+    # и жадный импорт endpoints отсюда замыкал цикл при старте воркера
+    if name == "router":
+        from .endpoints import router
+        return router
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
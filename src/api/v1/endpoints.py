@@ -1,50 +1,135 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.ext.asyncio import AsyncSession
+import json
+from typing import AsyncIterator, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy import select, func
 
 from src.api.dependencies import get_db
 from src.api.v1.schemas import (
-    TaskCreate, TaskResponse, TaskListResponse, TaskStatus
+    TaskCreate, TaskResponse, TaskListResponse, TaskStatus, TotalMode,
+    TaskCountResponse, TaskStatsResponse, TaskPriority,
+    TaskBatchCreate, TaskBatchResponse, TaskWaitResponse, TASK_FIELDS
 )
-from src.models.task import Task as TaskModel
-from src.services.task_service import TaskService
+from src.core.config import settings
+from src.models.task import TERMINAL_STATUSES, Task as TaskModel
+from src.services.handlers import registry
+from src.services.results import GZIP, ResultReader
+from src.services.status_hub import task_status_hub
+from src.services.task_cache import task_cache
+from src.services.task_service import InvalidCursorError, TaskService, next_cursor
 
 router = APIRouter(prefix="/api/v1/tasks", tags=["tasks"])
 
 
+def _check_task_types(tasks: List[TaskCreate]):
+    """Задача без обработчика упала бы в воркере: ошибка сразу в ответе"""
+    unknown = sorted({task.task_type for task in tasks if task.task_type not in registry})
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown task type: {', '.join(unknown)}"
+        )
+
+
 @router.post("/", response_model=TaskResponse, status_code=201)
 async def create_task(
     task_data: TaskCreate,
     db: AsyncSession = Depends(get_db)
 ):
     """Создание новой задачи"""
+    _check_task_types([task_data])
     task_service = TaskService(db)
     task = await task_service.create_task(task_data)
     return task
 
 
+@router.post("/batch", response_model=TaskBatchResponse, status_code=201)
+async def create_tasks_batch(
+    batch: TaskBatchCreate,
+    db: AsyncSession = Depends(get_db)
+):
+    """Пакетное создание задач"""
+    _check_task_types(batch.tasks)
+    task_service = TaskService(db)
+    tasks = await task_service.create_tasks(batch.tasks)
+    return TaskBatchResponse(ids=[task.id for task in tasks])
+
+
 @router.get("/", response_model=TaskListResponse)
 async def get_tasks(
     status: Optional[TaskStatus] = None,
     priority: Optional[str] = None,
     page: int = Query(1, ge=1),
     size: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    total_mode: TotalMode = TotalMode.EXACT,
+    fields: Optional[str] = Query(None, description="Поля задач через запятую"),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получение списка задач с фильтрацией и пагинацией"""
+    """Получение списка задач с фильтрацией и пагинацией.
+    
+    Для обхода всего списка используйте cursor из next_cursor предыдущей
+    страницы: выборка по ключу не замедляется с глубиной страницы.
+    total_mode=estimate или total_mode=none избавляет от COUNT(*) по таблице.
+    fields=id,status загружает из базы и отдает только перечисленные поля.
+    """
+    selected = None
+    if fields is not None:
+        selected = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = set(selected) - set(TASK_FIELDS)
+        if not selected or unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid fields, allowed: {', '.join(TASK_FIELDS)}"
+            )
+    
     task_service = TaskService(db)
-    tasks, total = await task_service.get_tasks(
-        status=status,
-        priority=priority,
-        page=page,
-        size=size
-    )
+    try:
+        tasks, total = await task_service.get_tasks(
+            status=status,
+            priority=priority,
+            page=page,
+            size=size,
+            cursor=cursor,
+            total_mode=total_mode,
+            fields=selected
+        )
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     return TaskListResponse(
-        tasks=tasks,
+        tasks=tasks if selected is None else [
+            {name: getattr(task, name) for name in selected} for task in tasks
+        ],
         total=total,
-        page=page,
-        size=size
+        page=None if cursor else page,
+        size=size,
+        next_cursor=next_cursor(tasks, size)
+    )
+
+
+@router.get("/stats", response_model=TaskStatsResponse)
+async def get_task_stats(
+    db: AsyncSession = Depends(get_db)
+):
+    """Количество задач по статусам и приоритетам"""
+    task_service = TaskService(db)
+    counts = await task_service.get_stats()
+    
+    by_status = {status: 0 for status in TaskStatus}
+    by_priority = {priority: 0 for priority in TaskPriority}
+    for status, priority, count in counts:
+        by_status[status] += count
+        by_priority[priority] += count
+    
+    return TaskStatsResponse(
+        total=sum(by_status.values()),
+        by_status=by_status,
+        by_priority=by_priority,
+        counts=[
+            TaskCountResponse(status=status, priority=priority, count=count)
+            for status, priority, count in counts
+        ]
     )
 
 
@@ -54,11 +139,18 @@ async def get_task(
     db: AsyncSession = Depends(get_db)
 ):
     """Получение информации о конкретной задаче"""
+    cached = task_cache.get(task_id, "task")
+    if cached is not None:
+        return cached
+    
+    epoch = task_cache.epoch
     task_service = TaskService(db)
     task = await task_service.get_task(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    return task
+    response = TaskResponse.model_validate(task)
+    task_cache.put(task_id, "task", response, task.status, epoch)
+    return response
 
 
 @router.delete("/{task_id}", status_code=204)
@@ -69,6 +161,9 @@ async def cancel_task(
     """Отмена задачи"""
     task_service = TaskService(db)
     success = await task_service.cancel_task(task_id)
+    # Уведомление о смене статуса дойдет позже: следующее чтение в этом
+    # процессе не должно вернуть задачу из кэша
+    task_cache.invalidate(task_id)
     if not success:
         raise HTTPException(status_code=404, detail="Task not found or cannot be cancelled")
     return None
@@ -79,9 +174,127 @@ async def get_task_status(
     task_id: int,
     db: AsyncSession = Depends(get_db)
 ):
-    """Получение статуса задачи"""
+    """Получение статуса задачи.
+    
+    Частый опрос обслуживается из кэша процесса без обращения к базе.
+    """
+    status = task_cache.get(task_id, "status")
+    if status is None:
+        epoch = task_cache.epoch
+        task_service = TaskService(db)
+        status = await task_service.get_task_status(task_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        task_cache.put(task_id, "status", status, status, epoch)
+    return {"status": status}
+
+
+@router.get("/{task_id}/result")
+async def get_task_result(
+    task_id: int,
+    accept_encoding: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """Результат задачи целиком.
+    
+    Большой результат читается из task_results по частям и отдается
+    потоком; сжатый отдается без распаковки, если клиент принимает gzip.
+    """
     task_service = TaskService(db)
-    task = await task_service.get_task(task_id)
+    task = await task_service.get_task(
+        task_id, fields=("status", "result", "result_external", "result_size")
+    )
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    return {"status": task.status}
+    if not task.result_external:
+        if task.result is None:
+            raise HTTPException(status_code=404, detail="Task result not found")
+        return PlainTextResponse(task.result)
+    # Поток читает части в своих сессиях того же движка, соединение
+    # запроса больше не нужно
+    await db.close()
+    
+    reader = ResultReader(async_sessionmaker(db.bind, expire_on_commit=False))
+    info = await reader.get_info(task_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Task result not found")
+    
+    if info.encoding == GZIP and "gzip" in (accept_encoding or "").lower():
+        return StreamingResponse(
+            reader.iter_content(task_id, info),
+            media_type="text/plain",
+            headers={"Content-Encoding": "gzip", "Content-Length": str(info.length)}
+        )
+    return StreamingResponse(
+        reader.iter_decoded(task_id, info),
+        media_type="text/plain",
+        headers={"Content-Length": str(info.size)}
+    )
+
+
+def _status_loader(task_id: int, db: AsyncSession):
+    """Чтение статуса, не удерживающее соединение на время ожидания"""
+    async def load_status():
+        try:
+            return await TaskService(db).get_task_status(task_id)
+        finally:
+            await db.close()
+    return load_status
+
+
+@router.get("/{task_id}/wait", response_model=TaskWaitResponse)
+async def wait_task(
+    task_id: int,
+    timeout: float = Query(30, gt=0, le=settings.task_wait_max_timeout_seconds),
+    db: AsyncSession = Depends(get_db)
+):
+    """Long-poll: ответ приходит, когда задача завершится или истечет timeout"""
+    status = None
+    async for status in task_status_hub.follow(
+        task_id, _status_loader(task_id, db), timeout=timeout
+    ):
+        pass
+    if status is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return TaskWaitResponse(status=status, done=status in TERMINAL_STATUSES)
+
+
+def _sse_event(task_id: int, status: Optional[TaskStatus]) -> str:
+    """Событие SSE о статусе задачи или комментарий keepalive"""
+    if status is None:
+        return ": keepalive\n\n"
+    data = json.dumps({"task_id": task_id, "status": status.value})
+    return f"event: status\ndata: {data}\n\n"
+
+
+@router.get("/{task_id}/events")
+async def stream_task_events(
+    task_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Server-Sent Events: текущий статус и все последующие переходы.
+    
+    Поток закрывается после перехода задачи в завершенный статус.
+    """
+    events = task_status_hub.follow(
+        task_id,
+        _status_loader(task_id, db),
+        keepalive=settings.task_events_keepalive_seconds
+    )
+    first = await anext(events, None)
+    if first is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    async def stream() -> AsyncIterator[str]:
+        try:
+            yield _sse_event(task_id, first)
+            async for status in events:
+                yield _sse_event(task_id, status)
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,8 +1,10 @@
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import Any, Optional, Union
 from pydantic import BaseModel, Field
 
+from src.models.task import DEFAULT_TASK_TYPE
+
 
 class TaskPriority(str, Enum):
     LOW = "LOW"
@@ -19,16 +21,34 @@ class TaskStatus(str, Enum):
     CANCELLED = "CANCELLED"
 
 
+class TotalMode(str, Enum):
+    EXACT = "exact"
+    ESTIMATE = "estimate"
+    NONE = "none"
+
+
 class TaskBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
     description: Optional[str] = None
     priority: TaskPriority = TaskPriority.MEDIUM
+    timeout_seconds: Optional[int] = Field(None, ge=1)
+    # Тип задачи определяет обработчик в воркере, payload - его входные данные
+    task_type: str = Field(DEFAULT_TASK_TYPE, min_length=1, max_length=64)
+    payload: Optional[dict[str, Any]] = None
 
 
 class TaskCreate(TaskBase):
     pass
 
 
+class TaskBatchCreate(BaseModel):
+    tasks: list[TaskCreate] = Field(..., min_length=1, max_length=1000)
+
+
+class TaskBatchResponse(BaseModel):
+    ids: list[int]
+
+
 class TaskUpdate(BaseModel):
     status: Optional[TaskStatus] = None
     result: Optional[str] = None
@@ -42,14 +62,45 @@ class TaskResponse(TaskBase):
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     result: Optional[str] = None
+    # Размер результата; большой результат отдается через /result
+    result_size: Optional[int] = None
+    result_external: bool = False
     error_info: Optional[str] = None
+    retry_count: int = 0
     
     class Config:
         from_attributes = True
 
 
+# Поля, которые можно запросить в списке через fields=
+TASK_FIELDS = tuple(TaskResponse.model_fields)
+
+
 class TaskListResponse(BaseModel):
-    tasks: list[TaskResponse]
-    total: int
-    page: int
+    # При заданном fields задачи отдаются словарями только с этими полями
+    tasks: list[Union[TaskResponse, dict[str, Any]]]
+    # None, если подсчет отключен через total_mode=none
+    total: Optional[int] = None
+    page: Optional[int] = None
     size: int
+    # Курсор следующей страницы для прохода по списку по ключу (created_at, id)
+    next_cursor: Optional[str] = None
+
+
+class TaskWaitResponse(BaseModel):
+    status: TaskStatus
+    # Задача в завершенном статусе; False, если ожидание истекло
+    done: bool
+
+
+class TaskCountResponse(BaseModel):
+    status: TaskStatus
+    priority: TaskPriority
+    count: int
+
+
+class TaskStatsResponse(BaseModel):
+    total: int
+    by_status: dict[TaskStatus, int]
+    by_priority: dict[TaskPriority, int]
+    counts: list[TaskCountResponse]
@@ -1,18 +1,113 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 from typing import Optional
 
 
 class Settings(BaseSettings):
-    # Database
+    # Database: PostgreSQL (asyncpg) или SQLite (aiosqlite) для локальных прогонов
     database_url: str
+    # Пул соединений на процесс; без DB_POOL_SIZE размер - WORKERS_NUM + 2
+    db_pool_size: Optional[int] = None
+    db_max_overflow: int = 5
+    db_pool_timeout_seconds: float = 30
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = True
+    # Кэш подготовленных выражений asyncpg; 0 для pgbouncer
+    db_statement_cache_size: int = 100
+    # statement_timeout на стороне сервера; 0 отключает
+    db_statement_timeout_ms: int = 30000
     
-    # RabbitMQ
-    rabbitmq_url: str
+    # Брокер сообщений: rabbitmq или memory (очереди в памяти процесса,
+    # только когда API и воркер работают в одном процессе)
+    broker: str = "rabbitmq"
+    
+    # RabbitMQ; обязателен, если задачи доставляются через BROKER=rabbitmq
+    rabbitmq_url: Optional[str] = None
+    rabbitmq_connection_pool_size: int = 2
+    rabbitmq_channel_pool_size: int = 10
+    # Маршрутизация задач по очередям: single, priority или task_type
+    task_queue_routing: str = "single"
+    # Веса очередей при потреблении воркером
+    task_priority_weights: dict[str, int] = {"HIGH": 6, "MEDIUM": 3, "LOW": 1}
+    task_type_weights: dict[str, int] = {}
     
     # Application
     log_level: str = "INFO"
     workers_num: int = 3
     task_timeout_seconds: int = 300
+    # Время на корректное завершение задачи после отмены
+    task_cancel_grace_seconds: float = 5
+    # Повторы упавших задач с экспоненциальной задержкой
+    task_max_retries: int = 3
+    task_retry_base_delay_ms: int = 1000
+    task_retry_max_delay_ms: int = 60000
+    
+    # Outbox: пересылка созданных задач в очередь
+    outbox_relay_enabled: bool = True
+    outbox_batch_size: int = 500
+    outbox_poll_interval_ms: int = 1000
+    
+    # Доставка задач воркерам: broker (outbox и брокер) или database
+    # (воркеры забирают задачи из tasks через FOR UPDATE SKIP LOCKED)
+    task_dispatch_mode: str = "broker"
+    # Опрос tasks в режиме database на случай потерянного NOTIFY и для
+    # отложенных повторов
+    task_claim_poll_interval_ms: int = 1000
+    # Запас сверх таймаута задачи, после которого задачу остановившегося
+    # воркера забирает другой
+    task_claim_lease_grace_seconds: int = 60
+    
+    # Число шардов счетчиков задач на пару (status, priority)
+    task_counter_shards: int = 8
+    
+    # Пакетная запись статусов задач воркером
+    status_flush_interval_ms: int = 5
+    status_batch_size: int = 500
+    
+    # Кэш чтений задач в процессе API; 0 отключает кэш
+    task_cache_size: int = 10000
+    task_cache_ttl_seconds: float = 5
+    
+    # Ожидание завершения задач через /wait и /events
+    task_wait_max_timeout_seconds: float = 60
+    task_wait_recheck_seconds: float = 5
+    task_events_keepalive_seconds: float = 15
+    
+    # Результаты длиннее лимита (в символах) хранятся в task_results
+    task_result_inline_limit: int = 4096
+    task_result_compression: bool = True
+    task_result_chunk_size: int = 262144
+    
+    # Секции tasks по месяцам created_at: создание заранее и архивирование
+    task_partition_maintenance_enabled: bool = True
+    task_partition_maintenance_interval_seconds: int = 3600
+    task_partition_premake_months: int = 3
+    # Срок хранения секций с завершенными задачами; 0 отключает архивирование
+    task_retention_days: int = 0
+    # detach - перенос секции в схему task_archive_schema, drop - удаление
+    task_archive_mode: str = "detach"
+    task_archive_schema: str = "archive"
+    
+    # Метрики Prometheus: /metrics в API и отдельный порт воркера (0 - выключен)
+    metrics_enabled: bool = True
+    worker_metrics_port: int = 9100
+    
+    # Executors
+    executor_thread_pool_size: Optional[int] = None
+    executor_process_pool_size: Optional[int] = None
+    # Бэкенд выполнения по типу задачи: loop, thread или process
+    task_executors: dict[str, str] = {}
+    
+    @model_validator(mode="after")
+    def require_rabbitmq_url(self):
+        """RABBITMQ_URL без значения по умолчанию, если нужен RabbitMQ"""
+        if (
+            self.broker == "rabbitmq"
+            and self.task_dispatch_mode == "broker"
+            and not self.rabbitmq_url
+        ):
+            raise ValueError("RABBITMQ_URL is required when BROKER=rabbitmq")
+        return self
     
     class Config:
         env_file = ".env"
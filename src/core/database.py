@@ -1,9 +1,168 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import time
+from typing import Optional
+
+from sqlalchemy import DateTime, event, exc
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
+)
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.expression import FunctionElement
 
 from .config import settings
 
-engine = create_async_engine(settings.database_url, echo=False)
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, измеряющий ожидание соединения при checkout.
+
+    По времени ожидания и заполненности пула подбирается его размер:
+    долгие ожидания при saturation около 1 означают, что соединений мало.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def capacity(self) -> int:
+        """Максимум одновременно выданных соединений"""
+        return self.size() + max(self._max_overflow, 0)
+
+    def stats(self) -> dict:
+        """Состояние пула и ожидание соединений"""
+        checked_out = self.checkedout()
+        capacity = self.capacity()
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": checked_out,
+            "saturation": round(checked_out / capacity, 3) if capacity else 0,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms_avg": round(
+                self.wait_seconds_total / self.checkouts * 1000, 3
+            ) if self.checkouts else 0,
+            "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+        }
+
+
+class utcnow(FunctionElement):
+    """Текущее время на стороне базы для server_default.
+
+    В SQLite CURRENT_TIMESTAMP дает строку с точностью до секунды, которая
+    не сравнивается со значениями SQLAlchemy вида 'YYYY-MM-DD HH:MM:SS.ffffff',
+    поэтому там время собирается в том же формате.
+    """
+    type = DateTime(timezone=True)
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    return "now()"
+
+
+@compiles(utcnow, "sqlite")
+def _utcnow_sqlite(element, compiler, **kw):
+    return (
+        "(strftime('%Y-%m-%d %H:%M:%S', 'now') || '.' || "
+        "substr(strftime('%f', 'now'), 4) || '000')"
+    )
+
+
+def default_pool_size() -> int:
+    """Размер пула: каждая выполняющаяся задача воркера берет соединение,
+    плюс запись статусов и фоновые задачи"""
+    if settings.db_pool_size is not None:
+        return settings.db_pool_size
+    return max(5, settings.workers_num + 2)
+
+
+def create_engine(
+    database_url: Optional[str] = None,
+    pool_size: Optional[int] = None
+) -> AsyncEngine:
+    """Асинхронный движок с настройками пула и соединений из Settings"""
+    url = make_url(database_url or settings.database_url)
+    if url.get_backend_name() == "sqlite":
+        return _create_sqlite_engine(url, pool_size)
+    connect_args = {}
+    if url.get_driver_name() == "asyncpg":
+        connect_args = {
+            # Кэш asyncpg и кэш диалекта SQLAlchemy; за pgbouncer в режиме
+            # transaction оба должны быть 0
+            "statement_cache_size": settings.db_statement_cache_size,
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+        }
+        if settings.db_statement_timeout_ms:
+            connect_args["server_settings"] = {
+                "statement_timeout": str(settings.db_statement_timeout_ms)
+            }
+    return create_async_engine(
+        url,
+        echo=False,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size or default_pool_size(),
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args=connect_args,
+    )
+
+
+def _create_sqlite_engine(url: URL, pool_size: Optional[int]) -> AsyncEngine:
+    """Движок SQLite (aiosqlite) для локальных прогонов и бенчмарков.
+
+    База в памяти живет, пока открыто ее единственное соединение, поэтому
+    пул из одного соединения без overflow: сессии ждут его по очереди.
+    Файловая база работает в режиме WAL, чтобы чтение не ждало запись.
+    """
+    in_memory = url.database in (None, "", ":memory:")
+    sqlite_engine = create_async_engine(
+        url,
+        echo=False,
+        poolclass=InstrumentedQueuePool,
+        pool_size=1 if in_memory else pool_size or default_pool_size(),
+        max_overflow=0 if in_memory else settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds,
+    )
+    if in_memory:
+        return sqlite_engine
+
+    @event.listens_for(sqlite_engine.sync_engine, "connect")
+    def set_wal(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
+    return sqlite_engine
+
+
+# Один движок на процесс: API и воркер делят его пул
+engine = create_engine()
 AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
@@ -13,3 +172,21 @@ Base = declarative_base()
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
+
+
+async def init_db():
+    """Создание таблиц при старте"""
+    # Можно использовать Alembic, но для простоты создадим таблицы
+    from src.models.task import Base
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+def pool_health() -> dict:
+    """Состояние пула соединений для health check"""
+    return engine.pool.stats()
+
+
+async def close_db():
+    """Закрытие пула соединений"""
+    await engine.dispose()
@@ -0,0 +1,167 @@
+import time
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Задачи выполняются и ждут секунды и минуты, а не миллисекунды
+TASK_BUCKETS = (0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Время до начала ответа по шаблону маршрута",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Обрабатываемые HTTP запросы",
+)
+
+TASK_PUBLISH_DURATION = Histogram(
+    "task_publish_duration_seconds",
+    "Публикация пакета сообщений в RabbitMQ с подтверждением брокера",
+    ["kind"],
+)
+TASK_PUBLISH_FAILURES = Counter(
+    "task_publish_failures_total",
+    "Сообщения, которые не удалось опубликовать",
+    ["kind"],
+)
+
+# task_type приходит от клиента: метки берутся только из реестра
+# обработчиков, остальные типы попадают в одну серию
+UNKNOWN_TASK_TYPE = "unknown"
+
+TASK_QUEUE_WAIT = Histogram(
+    "task_queue_wait_seconds",
+    "Время от создания задачи до начала выполнения (created_at -> started_at)",
+    ["task_type"],
+    buckets=TASK_BUCKETS,
+)
+TASK_EXECUTION = Histogram(
+    "task_execution_seconds",
+    "Время выполнения задачи (started_at -> completed_at)",
+    ["task_type", "outcome"],
+    buckets=TASK_BUCKETS,
+)
+TASKS_IN_FLIGHT = Gauge(
+    "tasks_in_flight",
+    "Выполняющиеся в воркере задачи",
+    ["task_type"],
+)
+TASKS_DEFERRED = Counter(
+    "tasks_deferred_total",
+    "Задачи, отложенные из-за занятого лимита параллелизма типа",
+    ["task_type"],
+)
+TASK_FAILURES = Counter(
+    "task_failures_total",
+    "Неудачные попытки выполнения задач по причине",
+    ["task_type", "reason"],
+)
+
+DB_SESSION_DURATION = Histogram(
+    "db_session_duration_seconds",
+    "Время, на которое соединение с базой выдано из пула",
+)
+
+
+class PoolCollector:
+    """Состояние пула соединений движка в момент сбора метрик"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+
+    def collect(self):
+        pool = self.engine.pool
+        checked_out = GaugeMetricFamily(
+            "db_pool_checked_out", "Выданные из пула соединения"
+        )
+        checked_out.add_metric([], pool.checkedout())
+        yield checked_out
+        capacity = GaugeMetricFamily(
+            "db_pool_capacity", "Максимум соединений: размер пула и overflow"
+        )
+        capacity.add_metric([], pool.capacity())
+        yield capacity
+        checkouts = CounterMetricFamily(
+            "db_pool_checkouts", "Выдачи соединений из пула"
+        )
+        checkouts.add_metric([], pool.checkouts)
+        yield checkouts
+        wait = CounterMetricFamily(
+            "db_pool_checkout_wait_seconds", "Суммарное ожидание соединения"
+        )
+        wait.add_metric([], pool.wait_seconds_total)
+        yield wait
+        timeouts = CounterMetricFamily(
+            "db_pool_timeouts", "Истекшие ожидания соединения"
+        )
+        timeouts.add_metric([], pool.timeouts)
+        yield timeouts
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info["checkout_at"] = time.perf_counter()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    checkout_at = connection_record.info.pop("checkout_at", None)
+    if checkout_at is not None:
+        DB_SESSION_DURATION.observe(time.perf_counter() - checkout_at)
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Метрики пула и длительности сессий движка; повторный вызов ничего не делает"""
+    if event.contains(engine.sync_engine, "checkout", _on_checkout):
+        return
+    event.listen(engine.sync_engine, "checkout", _on_checkout)
+    event.listen(engine.sync_engine, "checkin", _on_checkin)
+    REGISTRY.register(PoolCollector(engine))
+
+
+class MetricsMiddleware:
+    """ASGI middleware с латентностью запросов по шаблону маршрута.
+
+    Метка route - путь маршрута вида /api/v1/tasks/{task_id}, поэтому число
+    рядов не растет с числом задач. Для потоковых ответов измеряется время
+    до начала ответа.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        responded = False
+
+        async def send_with_metrics(message):
+            nonlocal responded
+            if message["type"] == "http.response.start":
+                responded = True
+                self._observe(scope, message["status"], started)
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        except Exception:
+            if not responded:
+                self._observe(scope, 500, started)
+            raise
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+
+    @staticmethod
+    def _observe(scope, status: int, started: float):
+        route = scope.get("route")
+        HTTP_REQUEST_DURATION.labels(
+            scope["method"],
+            route.path if route is not None else "unmatched",
+            str(status),
+        ).observe(time.perf_counter() - started)
@@ -1,25 +1,51 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from contextlib import asynccontextmanager
 from alembic import command
 from alembic.config import Config
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from src.api.v1.endpoints import router as api_router
-from src.core.database import engine
+from src.core.database import engine, init_db, close_db, pool_health
+from src.core.metrics import MetricsMiddleware, instrument_engine
+from src.core.config import settings
+from src.services.notifications import notification_listener
+from src.services.outbox import outbox_relay
+from src.services.partitions import partition_maintainer
+from src.services.publisher import publisher
+from src.services.status_hub import task_status_hub
+from src.services.task_cache import task_cache
+from src.services.task_service import DispatchMode, dispatch_mode
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan events"""
     # Создаем таблицы при старте
-    async with engine.begin() as conn:
-        # Можно использовать Alembic, но для простоты создадим таблицы
-        from src.models.task import Base
-        await conn.run_sync(Base.metadata.create_all)
+    await init_db()
+    # В режиме database воркеры забирают задачи из tasks, брокер не нужен
+    if dispatch_mode() == DispatchMode.BROKER:
+        # Поднимаем брокер (пул соединений и каналов RabbitMQ) один раз на процесс
+        await publisher.start()
+        # Пересылка outbox в очередь, запросы API брокер не ждут
+        if settings.outbox_relay_enabled:
+            await outbox_relay.start()
+    # Секции tasks создаются заранее, старые архивируются
+    if settings.task_partition_maintenance_enabled:
+        await partition_maintainer.start()
+    # Один LISTEN на процесс инвалидирует кэш чтений задач и будит
+    # клиентов, ожидающих задачи через /wait и /events
+    task_cache.attach(notification_listener)
+    task_status_hub.attach(notification_listener)
+    await notification_listener.start_in_background()
     
     yield
     
     # Cleanup
-    await engine.dispose()
+    await notification_listener.close()
+    await partition_maintainer.close()
+    await outbox_relay.close()
+    await publisher.close()
+    await close_db()
 
 
 app = FastAPI(
@@ -31,8 +57,35 @@ app = FastAPI(
 
 app.include_router(api_router)
 
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в формате Prometheus"""
+    return Response(generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy"}
+    publisher_health = publisher.health()
+    mode = dispatch_mode()
+    status = (
+        "healthy"
+        if mode == DispatchMode.DATABASE or publisher_health["status"] == "healthy"
+        else "degraded"
+    )
+    return {
+        "status": status,
+        "dispatch_mode": mode.value,
+        "publisher": publisher_health,
+        "database": pool_health(),
+        "outbox_relay": outbox_relay.health(),
+        "partitions": partition_maintainer.health(),
+        "notifications": notification_listener.health(),
+        "task_cache": task_cache.health(),
+        "task_waiters": task_status_hub.health(),
+    }
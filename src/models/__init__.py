@@ -2,6 +2,8 @@
 Database models
 """
 
-from .task import Task, TaskStatus, TaskPriority
+from .task import Task, TaskCounter, TaskOutbox, TaskResult, TaskStatus, TaskPriority
 
-__all__ = ["Task", "TaskStatus", "TaskPriority"]
+__all__ = [
+    "Task", "TaskCounter", "TaskOutbox", "TaskResult", "TaskStatus", "TaskPriority"
+]
@@ -1,10 +1,12 @@
 from datetime import datetime
 from enum import Enum
-from sqlalchemy import Column, Integer, String, DateTime, Text, Enum as SQLEnum
-from sqlalchemy.dialects.postgresql import ENUM
-from sqlalchemy.sql import func
+from sqlalchemy import (
+    JSON, BigInteger, Boolean, Column, Integer, LargeBinary, SmallInteger, String,
+    DateTime, Text, Index, Enum as SQLEnum, false
+)
+from sqlalchemy.dialects.postgresql import ENUM, JSONB
 
-from src.core.database import Base
+from src.core.database import Base, utcnow
 
 
 class TaskStatus(str, Enum):
@@ -22,19 +24,148 @@ class TaskPriority(str, Enum):
     HIGH = "HIGH"
 
 
+# Тип задачи без явного task_type
+DEFAULT_TASK_TYPE = "default"
+
+ACTIVE_STATUSES = [TaskStatus.NEW, TaskStatus.PENDING, TaskStatus.IN_PROGRESS]
+TERMINAL_STATUSES = [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]
+
+# Статусы, из которых допустим переход в данный. Из завершенных статусов
+# переходов нет, поэтому воркер не может перезаписать отмену задачи.
+# IN_PROGRESS переходит в PENDING при повторе, а в IN_PROGRESS - при
+# продлении захвата; записи воркера проверяют его claim_token.
+ALLOWED_TRANSITIONS = {
+    TaskStatus.NEW: set(),
+    TaskStatus.PENDING: set(ACTIVE_STATUSES),
+    TaskStatus.IN_PROGRESS: set(ACTIVE_STATUSES),
+    TaskStatus.COMPLETED: {TaskStatus.PENDING, TaskStatus.IN_PROGRESS},
+    TaskStatus.FAILED: set(ACTIVE_STATUSES),
+    TaskStatus.CANCELLED: set(ACTIVE_STATUSES),
+}
+
+
 class Task(Base):
+    """Задача.
+    
+    В PostgreSQL таблица секционирована по месяцам created_at (миграция 010),
+    первичный ключ в базе - (id, created_at). Секции создает и архивирует
+    PartitionMaintainer.
+    """
     __tablename__ = "tasks"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String(255), nullable=False)
     description = Column(Text)
     priority = Column(SQLEnum(TaskPriority), default=TaskPriority.MEDIUM)
+    # Ключ обработчика в реестре и его входные данные
+    task_type = Column(
+        String(64),
+        nullable=False,
+        default=DEFAULT_TASK_TYPE,
+        server_default=DEFAULT_TASK_TYPE
+    )
+    payload = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
     status = Column(SQLEnum(TaskStatus), default=TaskStatus.NEW)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=utcnow())
     started_at = Column(DateTime(timezone=True), nullable=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
+    # Небольшой результат хранится в строке задачи, большой - в task_results
     result = Column(Text, nullable=True)
+    result_size = Column(BigInteger, nullable=True)
+    result_external = Column(
+        Boolean, nullable=False, default=False, server_default=false()
+    )
     error_info = Column(Text, nullable=True)
+    # Собственный лимит времени выполнения; если не задан, берется из настроек
+    timeout_seconds = Column(Integer, nullable=True)
+    # Число выполненных повторов после ошибок
+    retry_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # В режиме TASK_DISPATCH_MODE=database: время, раньше которого задачу не
+    # забирают - задержка повтора или срок захвата воркером
+    scheduled_at = Column(DateTime(timezone=True), nullable=True)
+    # Метка последнего захвата: итоговый статус записывает только воркер,
+    # чей захват не перехватили после истечения срока
+    claim_token = Column(String(32), nullable=True)
+    
+    __table_args__ = (
+        # Списки без фильтров и курсорная пагинация по (created_at, id)
+        Index("ix_tasks_created_at_id", "created_at", "id"),
+        # Фильтр по статусу или приоритету с сортировкой по created_at
+        Index("ix_tasks_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_tasks_priority_created_at_id", "priority", "created_at", "id"),
+        # Рабочий набор активных задач в порядке выборки из очереди
+        Index(
+            "ix_tasks_active_priority_created_at",
+            priority.desc(),
+            created_at,
+            postgresql_where=status.in_(ACTIVE_STATUSES)
+        ),
+    )
     
     def __repr__(self):
         return f"<Task(id={self.id}, name='{self.name}', status='{self.status}')>"
+
+
+class TaskCounter(Base):
+    """Счетчик задач по статусу и приоритету.
+    
+    Каждая пара (status, priority) разбита на несколько шардов, чтобы
+    параллельные транзакции не выстраивались в очередь за одной строкой.
+    Итоговое значение - сумма по шардам.
+    """
+    __tablename__ = "task_counters"
+    
+    status = Column(SQLEnum(TaskStatus), primary_key=True)
+    priority = Column(SQLEnum(TaskPriority), primary_key=True)
+    shard = Column(SmallInteger, primary_key=True, default=0)
+    count = Column(BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return (
+            f"<TaskCounter(status='{self.status}', priority='{self.priority}', "
+            f"shard={self.shard}, count={self.count})>"
+        )
+
+
+class TaskOutbox(Base):
+    """Исходящие сообщения о задачах, ожидающие публикации в очередь.
+    
+    Строка пишется в той же транзакции, что и задача, и удаляется
+    после подтверждения публикации брокером.
+    """
+    __tablename__ = "task_outbox"
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    priority = Column(SQLEnum(TaskPriority), nullable=False)
+    # Нужен для выбора очереди при маршрутизации по типам задач
+    task_type = Column(
+        String(64),
+        nullable=False,
+        default=DEFAULT_TASK_TYPE,
+        server_default=DEFAULT_TASK_TYPE
+    )
+    created_at = Column(DateTime(timezone=True), server_default=utcnow())
+    
+    def __repr__(self):
+        return f"<TaskOutbox(id={self.id}, task_id={self.task_id})>"
+
+
+class TaskResult(Base):
+    """Большой результат задачи вне горячей таблицы tasks.
+    
+    Содержимое хранится уже сжатым (encoding), поэтому сжатие TOAST для
+    колонки отключено и чтение по частям не распаковывает значение целиком.
+    """
+    __tablename__ = "task_results"
+    
+    task_id = Column(Integer, primary_key=True)
+    content = Column(LargeBinary, nullable=False)
+    # identity или gzip
+    encoding = Column(String(16), nullable=False)
+    # Размер результата до сжатия, в байтах
+    size = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=utcnow())
+    
+    def __repr__(self):
+        return f"<TaskResult(task_id={self.task_id}, size={self.size})>"
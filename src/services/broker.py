@@ -0,0 +1,267 @@
+import asyncio
+import itertools
+import json
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import AsyncContextManager, AsyncIterator, Callable, Optional, Protocol
+
+from src.core.config import settings
+from src.models.task import DEFAULT_TASK_TYPE, TaskPriority
+
+TASK_QUEUE = "task_queue"
+# Очередь сообщений, которые не удалось обработать: битые сообщения
+# и задачи, исчерпавшие повторы
+DEAD_LETTER_QUEUE = f"{TASK_QUEUE}.dead"
+
+PRIORITY_MAP = {
+    TaskPriority.LOW: 1,
+    TaskPriority.MEDIUM: 5,
+    TaskPriority.HIGH: 10
+}
+
+
+class BrokerBackend(str, Enum):
+    RABBITMQ = "rabbitmq"
+    # Очереди asyncio в памяти процесса: API и воркер в одном процессе
+    MEMORY = "memory"
+
+
+class QueueRouting(str, Enum):
+    # Одна очередь с приоритетами сообщений
+    SINGLE = "single"
+    # Отдельная очередь на каждый приоритет
+    PRIORITY = "priority"
+    # Отдельная очередь на каждый тип задачи из TASK_TYPE_WEIGHTS
+    TASK_TYPE = "task_type"
+
+
+def task_queues() -> dict[str, int]:
+    """Очереди задач и их веса при потреблении"""
+    routing = QueueRouting(settings.task_queue_routing)
+    if routing == QueueRouting.SINGLE:
+        return {TASK_QUEUE: 1}
+    if routing == QueueRouting.PRIORITY:
+        return {
+            f"{TASK_QUEUE}.{priority.value.lower()}":
+                settings.task_priority_weights.get(priority.value, 1)
+            for priority in TaskPriority
+        }
+    weights = {DEFAULT_TASK_TYPE: 1, **settings.task_type_weights}
+    return {
+        f"{TASK_QUEUE}.type.{task_type}": weight
+        for task_type, weight in weights.items()
+    }
+
+
+def route(priority: TaskPriority, task_type: str = DEFAULT_TASK_TYPE) -> str:
+    """Очередь для задачи; типы без своей очереди идут в очередь default"""
+    routing = QueueRouting(settings.task_queue_routing)
+    if routing == QueueRouting.SINGLE:
+        return TASK_QUEUE
+    if routing == QueueRouting.PRIORITY:
+        return f"{TASK_QUEUE}.{priority.value.lower()}"
+    if task_type not in settings.task_type_weights:
+        task_type = DEFAULT_TASK_TYPE
+    return f"{TASK_QUEUE}.type.{task_type}"
+
+
+def retry_delay_ms(attempt: int) -> int:
+    """Экспоненциальная задержка перед попыткой attempt (начиная с 1)"""
+    delay = settings.task_retry_base_delay_ms * 2 ** (attempt - 1)
+    return min(delay, settings.task_retry_max_delay_ms)
+
+
+def task_message_body(task_id: int) -> bytes:
+    """Тело сообщения о задаче"""
+    return json.dumps({"task_id": task_id}).encode()
+
+
+class BrokerMessage(Protocol):
+    """Полученное сообщение в том виде, в каком его обрабатывает воркер"""
+    body: bytes
+
+    def process(self, requeue: bool = False) -> AsyncContextManager:
+        """Подтверждение после блока; при исключении - отказ с requeue"""
+
+
+class Broker(ABC):
+    """Брокер сообщений о задачах.
+
+    Публикует задачи в очереди по route, откладывает повторы и отдает
+    воркеру сообщения очереди. Реализации: RabbitMQ (TaskPublisher) и
+    очереди в памяти процесса (MemoryBroker).
+    """
+
+    @abstractmethod
+    async def start(self):
+        """Подготовка соединений и очередей"""
+
+    @abstractmethod
+    async def close(self):
+        """Освобождение соединений"""
+
+    async def publish(
+        self,
+        task_id: int,
+        priority: TaskPriority,
+        task_type: str = DEFAULT_TASK_TYPE
+    ):
+        """Публикация задачи"""
+        await self.publish_many([(task_id, priority, task_type)])
+
+    @abstractmethod
+    async def publish_many(self, tasks: list[tuple[int, TaskPriority, str]]):
+        """Публикация пакета задач (id, приоритет, тип)"""
+
+    @abstractmethod
+    async def publish_retry(
+        self,
+        task_id: int,
+        priority: TaskPriority,
+        attempt: int,
+        task_type: str = DEFAULT_TASK_TYPE
+    ):
+        """Повтор задачи после задержки retry_delay_ms(attempt)"""
+
+    @abstractmethod
+    async def publish_dead(self, body: bytes, reason: str):
+        """Перенос необрабатываемого сообщения в dead letter"""
+
+    @abstractmethod
+    def consume(self, queue: str, prefetch: int) -> AsyncIterator[BrokerMessage]:
+        """Сообщения очереди; неподтвержденных не больше prefetch"""
+
+    @abstractmethod
+    def health(self) -> dict:
+        """Состояние для health check"""
+
+
+class MemoryMessage:
+    """Сообщение MemoryBroker с интерфейсом подтверждения как у aio_pika"""
+
+    def __init__(self, body: bytes, priority: int = 0):
+        self.body = body
+        self.priority = priority
+        self._settle: Optional[Callable[[bool], None]] = None
+
+    @asynccontextmanager
+    async def process(self, requeue: bool = False):
+        """Подтверждение после блока; при исключении - возврат в очередь"""
+        try:
+            yield self
+        except BaseException:
+            self._finish(requeue)
+            raise
+        self._finish(False)
+
+    def _finish(self, requeue: bool):
+        settle, self._settle = self._settle, None
+        if settle is not None:
+            settle(requeue)
+
+
+class MemoryBroker(Broker):
+    """Брокер на очередях asyncio в памяти процесса.
+
+    Нужен для запуска API и воркера в одном процессе без RabbitMQ: в
+    тестах и нагрузочных прогонах. Сообщения очереди выдаются по убыванию
+    приоритета, как из task_queue с x-max-priority, повторы откладываются
+    таймером. Сообщения не переживают перезапуск процесса.
+    """
+
+    DEAD_LETTERS_LIMIT = 1000
+
+    def __init__(self):
+        self._queues: dict[str, asyncio.PriorityQueue] = {}
+        self._sequence = itertools.count()
+        self._timers: set[asyncio.TimerHandle] = set()
+        self.dead_letters: deque[tuple[bytes, str]] = deque(
+            maxlen=self.DEAD_LETTERS_LIMIT
+        )
+        self._started = False
+        self._published = 0
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    async def start(self):
+        self._started = True
+
+    async def close(self):
+        self._started = False
+        for timer in self._timers:
+            timer.cancel()
+        self._timers.clear()
+
+    async def publish_many(self, tasks: list[tuple[int, TaskPriority, str]]):
+        self._check_started()
+        for task_id, priority, task_type in tasks:
+            self._put(
+                route(priority, task_type),
+                MemoryMessage(task_message_body(task_id), PRIORITY_MAP[priority])
+            )
+        self._published += len(tasks)
+
+    async def publish_retry(
+        self,
+        task_id: int,
+        priority: TaskPriority,
+        attempt: int,
+        task_type: str = DEFAULT_TASK_TYPE
+    ):
+        self._check_started()
+        queue = route(priority, task_type)
+        message = MemoryMessage(task_message_body(task_id), PRIORITY_MAP[priority])
+
+        def deliver():
+            self._timers.discard(timer)
+            self._put(queue, message)
+
+        timer = asyncio.get_running_loop().call_later(
+            retry_delay_ms(attempt) / 1000, deliver
+        )
+        self._timers.add(timer)
+
+    async def publish_dead(self, body: bytes, reason: str):
+        self.dead_letters.append((body, reason))
+
+    async def consume(self, queue: str, prefetch: int) -> AsyncIterator[MemoryMessage]:
+        source = self._queue(queue)
+        unsettled = asyncio.Semaphore(prefetch)
+        while True:
+            await unsettled.acquire()
+            _, _, message = await source.get()
+
+            def settle(requeue: bool, message: MemoryMessage = message):
+                unsettled.release()
+                if requeue:
+                    self._put(queue, message)
+
+            message._settle = settle
+            yield message
+
+    def health(self) -> dict:
+        return {
+            "status": "healthy" if self._started else "stopped",
+            "broker": BrokerBackend.MEMORY.value,
+            "published": self._published,
+            "queued": {name: queue.qsize() for name, queue in self._queues.items()},
+            "dead_letters": len(self.dead_letters),
+        }
+
+    def _queue(self, name: str) -> asyncio.PriorityQueue:
+        if name not in self._queues:
+            self._queues[name] = asyncio.PriorityQueue()
+        return self._queues[name]
+
+    def _put(self, queue: str, message: MemoryMessage):
+        self._queue(queue).put_nowait(
+            (-message.priority, next(self._sequence), message)
+        )
+
+    def _check_started(self):
+        if not self._started:
+            raise RuntimeError("Broker is not started")
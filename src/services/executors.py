@@ -0,0 +1,242 @@
+import asyncio
+import contextlib
+import functools
+import multiprocessing
+import os
+import signal
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from enum import Enum
+from typing import Any, Callable, Optional
+
+from src.core.config import settings
+
+
+class TaskTimeoutError(Exception):
+    """Обработчик не уложился в отведенное время"""
+
+    def __init__(self, timeout: Optional[float]):
+        super().__init__(f"timed out after {timeout} seconds")
+        self.timeout = timeout
+
+
+class ProcessPoolRestartedError(Exception):
+    """Пул процессов остановлен из-за чужой задачи, пока выполнялась эта"""
+
+    def __init__(self):
+        super().__init__("process pool was killed to stop a timed-out task")
+
+
+class ExecutionBackend(str, Enum):
+    LOOP = "loop"
+    THREAD = "thread"
+    PROCESS = "process"
+
+
+def _run_coroutine(func: Callable, *args: Any) -> Any:
+    """Запуск асинхронного обработчика в отдельном потоке или процессе"""
+    return asyncio.run(func(*args))
+
+
+def _wrap_job(job: Future) -> asyncio.Future:
+    """asyncio-обертка над задачей пула; результат читается из самой задачи"""
+    waiter = asyncio.wrap_future(job)
+    waiter.add_done_callback(
+        lambda waiter: waiter.cancelled() or waiter.exception()
+    )
+    return waiter
+
+
+def _report_pid(pids: multiprocessing.SimpleQueue):
+    """Initializer процесса пула: PID процесса сообщается родителю"""
+    pids.put(os.getpid())
+
+
+class _TrackedProcessPool(ProcessPoolExecutor):
+    """Пул процессов, который знает PID запущенных им процессов.
+
+    Процесс сообщает свой PID из initializer до первой задачи, поэтому
+    принудительная остановка не зависит от приватных полей пула.
+    """
+
+    def __init__(self, max_workers: int):
+        self._reported_pids = multiprocessing.SimpleQueue()
+        super().__init__(
+            max_workers=max_workers,
+            initializer=_report_pid,
+            initargs=(self._reported_pids,)
+        )
+        self.pids: set[int] = set()
+
+    def kill(self):
+        """Остановка всех процессов пула, включая выполняющие задачи"""
+        while not self._reported_pids.empty():
+            self.pids.add(self._reported_pids.get())
+        for pid in self.pids:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+        self.shutdown(wait=False, cancel_futures=True)
+
+
+class TaskExecutor:
+    """Выполнение обработчиков задач в event loop, пуле потоков или процессов.
+
+    Бэкенд выбирается по типу задачи: CPU-bound обработчики уходят в пул
+    процессов и не блокируют потребление очереди и heartbeat соединения.
+    """
+
+    def __init__(
+        self,
+        backends: Optional[dict[str, ExecutionBackend]] = None,
+        thread_pool_size: Optional[int] = None,
+        process_pool_size: Optional[int] = None,
+        cancel_grace: Optional[float] = None
+    ):
+        if backends is None:
+            backends = {
+                task_type: ExecutionBackend(backend)
+                for task_type, backend in settings.task_executors.items()
+            }
+        self.backends = backends
+        self.thread_pool_size = thread_pool_size or settings.executor_thread_pool_size
+        self.process_pool_size = (
+            process_pool_size
+            or settings.executor_process_pool_size
+            or os.cpu_count()
+        )
+        self.cancel_grace = (
+            cancel_grace if cancel_grace is not None
+            else settings.task_cancel_grace_seconds
+        )
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[_TrackedProcessPool] = None
+
+    def backend_for(self, task_type: str) -> ExecutionBackend:
+        """Бэкенд выполнения для типа задачи"""
+        return self.backends.get(task_type, ExecutionBackend.LOOP)
+
+    def _get_pool(self, backend: ExecutionBackend) -> Executor:
+        if backend == ExecutionBackend.THREAD:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=self.thread_pool_size,
+                    thread_name_prefix="task-executor"
+                )
+            return self._thread_pool
+
+        if self._process_pool is None:
+            self._process_pool = _TrackedProcessPool(self.process_pool_size)
+        return self._process_pool
+
+    async def run(
+        self,
+        task_type: str,
+        func: Callable,
+        *args: Any,
+        timeout: Optional[float] = None
+    ) -> Any:
+        """Выполнение обработчика на бэкенде, назначенном типу задачи.
+
+        Для пула процессов обработчик и аргументы должны сериализоваться
+        через pickle, то есть быть объявлены на уровне модуля. По истечении
+        timeout обработчик отменяется и выбрасывается TaskTimeoutError.
+        Синхронный обработчик типа с бэкендом LOOP выполняется в пуле
+        потоков: в event loop его нельзя ни прервать по таймауту, ни
+        выполнить, не остановив остальные задачи воркера.
+        """
+        backend = self.backend_for(task_type)
+        if backend == ExecutionBackend.LOOP and not asyncio.iscoroutinefunction(func):
+            backend = ExecutionBackend.THREAD
+
+        if backend == ExecutionBackend.LOOP:
+            return await self._await_with_deadline(
+                asyncio.ensure_future(func(*args)), timeout
+            )
+
+        if asyncio.iscoroutinefunction(func):
+            call = functools.partial(_run_coroutine, func, *args)
+        else:
+            call = functools.partial(func, *args)
+
+        if backend == ExecutionBackend.PROCESS:
+            return await self._run_in_process(call, timeout)
+
+        # Поток нельзя прервать: по таймауту задача освобождается,
+        # а поток дорабатывает в фоне
+        loop = asyncio.get_running_loop()
+        return await self._await_with_deadline(
+            loop.run_in_executor(self._get_pool(backend), call), timeout
+        )
+
+    async def _await_with_deadline(
+        self, future: asyncio.Future, timeout: Optional[float]
+    ) -> Any:
+        try:
+            done, _ = await asyncio.wait({future}, timeout=timeout)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+        if not done:
+            # Кооперативная отмена: даем обработчику время на очистку
+            future.cancel()
+            await asyncio.wait({future}, timeout=self.cancel_grace)
+            raise TaskTimeoutError(timeout)
+
+        return future.result()
+
+    async def _run_in_process(self, call: Callable, timeout: Optional[float]) -> Any:
+        for attempt in range(2):
+            pool = self._get_pool(ExecutionBackend.PROCESS)
+            job = pool.submit(call)
+            try:
+                done, _ = await asyncio.wait({_wrap_job(job)}, timeout=timeout)
+            except asyncio.CancelledError:
+                if not job.cancel():
+                    self._kill_process_pool(pool)
+                raise
+
+            if not done:
+                await self._stop_process_job(pool, job)
+                raise TaskTimeoutError(timeout)
+
+            if pool is not self._process_pool:
+                # Пул убит из-за чужой задачи. Не начатая задача один раз
+                # запускается на новом пуле, а начатую повторять нельзя:
+                # ее побочные эффекты могли уже случиться
+                if attempt == 0 and job.cancelled():
+                    continue
+                if job.cancelled() or isinstance(job.exception(), BrokenProcessPool):
+                    raise ProcessPoolRestartedError()
+            return job.result()
+
+    async def _stop_process_job(self, pool: _TrackedProcessPool, job: Future):
+        """Отмена задачи в пуле процессов: мягкая, затем принудительная"""
+        if job.cancel():
+            return
+        # Задача уже выполняется: ждем grace-период, затем останавливаем пул
+        await asyncio.wait({_wrap_job(job)}, timeout=self.cancel_grace)
+        if not job.done():
+            self._kill_process_pool(pool)
+
+    def _kill_process_pool(self, pool: _TrackedProcessPool):
+        """Принудительная остановка процессов пула.
+
+        ProcessPoolExecutor не позволяет остановить отдельную задачу: после
+        гибели любого процесса пул считается сломанным и завершает остальные.
+        Поэтому пул убивается целиком и пересоздается при следующем запуске.
+        Задачи, еще не отданные процессам, запускаются на новом пуле, а
+        выполнявшиеся завершаются ProcessPoolRestartedError.
+        """
+        if self._process_pool is pool:
+            self._process_pool = None
+        pool.kill()
+
+    def shutdown(self, wait: bool = True):
+        """Остановка пулов потоков и процессов"""
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=wait)
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait)
+            self._process_pool = None
@@ -0,0 +1,123 @@
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+from src.models.task import DEFAULT_TASK_TYPE
+from src.services.executors import ExecutionBackend
+
+
+class TaskExecutionError(Exception):
+    """Ошибка выполнения задачи, сообщение которой сохраняется как есть"""
+
+
+class InvalidTaskError(Exception):
+    """Задачу невозможно выполнить: неизвестный тип или неверный payload.
+
+    Такие задачи не повторяются.
+    """
+
+
+@dataclass
+class TaskHandler:
+    """Обработчик задач одного типа"""
+    task_type: str
+    func: Callable
+    # Модель для проверки payload; без нее обработчик получает dict
+    payload_model: Optional[Type[BaseModel]] = None
+    # Максимум одновременно выполняемых задач этого типа в воркере
+    concurrency: Optional[int] = None
+    # Бэкенд выполнения; настройка TASK_EXECUTORS имеет приоритет
+    backend: Optional[ExecutionBackend] = None
+
+    def parse_payload(self, payload: Optional[dict]) -> Any:
+        """Аргумент обработчика из payload задачи"""
+        payload = payload or {}
+        if self.payload_model is None:
+            return payload
+        try:
+            return self.payload_model.model_validate(payload)
+        except ValidationError as e:
+            raise InvalidTaskError(
+                f"Invalid payload for task type {self.task_type}: {e}"
+            ) from e
+
+
+class HandlerRegistry:
+    """Реестр обработчиков задач по task_type.
+
+    Обработчик - асинхронная или синхронная функция, принимающая payload
+    задачи. Для пула процессов функция и модель payload должны быть
+    объявлены на уровне модуля.
+    """
+
+    def __init__(self):
+        self._handlers: dict[str, TaskHandler] = {}
+
+    def register(
+        self,
+        task_type: str,
+        payload_model: Optional[Type[BaseModel]] = None,
+        concurrency: Optional[int] = None,
+        backend: Optional[ExecutionBackend] = None
+    ) -> Callable[[Callable], Callable]:
+        """Декоратор регистрации обработчика типа задачи"""
+        if concurrency is not None and concurrency < 1:
+            raise ValueError("concurrency must be positive")
+
+        def decorator(func: Callable) -> Callable:
+            if task_type in self._handlers:
+                raise ValueError(f"Handler for task type {task_type} already registered")
+            self._handlers[task_type] = TaskHandler(
+                task_type,
+                func,
+                payload_model=payload_model,
+                concurrency=concurrency,
+                backend=backend
+            )
+            return func
+
+        return decorator
+
+    def get(self, task_type: str) -> TaskHandler:
+        """Обработчик типа задачи"""
+        handler = self._handlers.get(task_type)
+        if handler is None:
+            raise InvalidTaskError(f"Unknown task type: {task_type}")
+        return handler
+
+    def backends(self) -> dict[str, ExecutionBackend]:
+        """Бэкенды выполнения, объявленные обработчиками"""
+        return {
+            task_type: handler.backend
+            for task_type, handler in self._handlers.items()
+            if handler.backend is not None
+        }
+
+    def limits(self) -> dict[str, int]:
+        """Лимиты параллелизма, объявленные обработчиками"""
+        return {
+            task_type: handler.concurrency
+            for task_type, handler in self._handlers.items()
+            if handler.concurrency is not None
+        }
+
+    def __contains__(self, task_type: str) -> bool:
+        return task_type in self._handlers
+
+
+registry = HandlerRegistry()
+task_handler = registry.register
+
+
+@task_handler(DEFAULT_TASK_TYPE)
+async def simulate_task(payload: dict) -> str:
+    """Имитация длительной операции"""
+    await asyncio.sleep(random.uniform(1, 5))
+
+    # 90% успеха, 10% ошибки для демонстрации
+    if random.random() < 0.9:
+        return "Task completed successfully"
+    raise TaskExecutionError("Task failed due to random error")
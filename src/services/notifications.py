@@ -0,0 +1,169 @@
+import asyncio
+from collections import defaultdict
+from typing import Callable, Optional
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import settings
+from src.models.task import TaskStatus
+
+TASK_CANCELLED_CHANNEL = "task_cancelled"
+# Созданы задачи, которые воркеры забирают из tasks (TASK_DISPATCH_MODE=database)
+TASK_CREATED_CHANNEL = "task_created"
+# Переходы статусов в формате "id:STATUS,id:STATUS"
+TASK_STATUS_CHANNEL = "task_status"
+# Полезная нагрузка NOTIFY ограничена 8000 байтами
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+
+async def notify(db: AsyncSession, channel: str, payload: str):
+    """NOTIFY в текущей транзакции; слушатели получат его после commit"""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    await db.execute(select(func.pg_notify(channel, payload)))
+
+
+async def notify_status_changes(db: AsyncSession, changes: list[tuple[int, TaskStatus]]):
+    """Уведомление о переходах статусов, упакованных в минимум NOTIFY"""
+    chunk: list[str] = []
+    size = 0
+    for task_id, status in changes:
+        item = f"{task_id}:{status.value}"
+        if chunk and size + len(item) + 1 > NOTIFY_PAYLOAD_LIMIT:
+            await notify(db, TASK_STATUS_CHANNEL, ",".join(chunk))
+            chunk, size = [], 0
+        chunk.append(item)
+        size += len(item) + 1
+    if chunk:
+        await notify(db, TASK_STATUS_CHANNEL, ",".join(chunk))
+
+
+def parse_status_changes(payload: str) -> list[tuple[int, TaskStatus]]:
+    """Разбор полезной нагрузки канала task_status"""
+    changes = []
+    for item in payload.split(","):
+        task_id, _, status = item.partition(":")
+        try:
+            changes.append((int(task_id), TaskStatus(status)))
+        except ValueError:
+            continue
+    return changes
+
+
+def _listener_dsn(database_url: str) -> str:
+    """DSN для asyncpg из URL SQLAlchemy"""
+    url = make_url(database_url).set(drivername="postgresql")
+    return url.render_as_string(hide_password=False)
+
+
+class NotificationListener:
+    """Подписка на каналы PostgreSQL LISTEN/NOTIFY.
+
+    Держит одно отдельное соединение asyncpg вне пула SQLAlchemy и
+    раздает полезную нагрузку уведомлений подписчикам канала. При обрыве
+    соединения переподключается с паузой reconnect_delay. Уведомления,
+    отправленные без соединения, теряются, поэтому подписчики on_connect
+    должны сбросить состояние, которое от них зависит. На других базах
+    (SQLite) уведомлений нет, и слушатель не подключается.
+    """
+
+    def __init__(
+        self,
+        database_url: Optional[str] = None,
+        reconnect_delay: float = 1.0
+    ):
+        self.database_url = database_url or settings.database_url
+        self.reconnect_delay = reconnect_delay
+        self._subscribers: dict[str, list[Callable[[str], None]]] = defaultdict(list)
+        self._connect_callbacks: list[Callable[[], None]] = []
+        self._connection: Optional[asyncpg.Connection] = None
+        self._reconnect: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        """Подписка на канал; подписываться нужно до start"""
+        self._subscribers[channel].append(callback)
+
+    def on_connect(self, callback: Callable[[], None]):
+        """Вызов callback после каждого подключения, в том числе повторного"""
+        self._connect_callbacks.append(callback)
+
+    @property
+    def enabled(self) -> bool:
+        """LISTEN/NOTIFY есть только в PostgreSQL"""
+        return make_url(self.database_url).get_backend_name() == "postgresql"
+
+    @property
+    def connected(self) -> bool:
+        """Есть ли сейчас соединение, по которому приходят уведомления"""
+        return self._connection is not None and not self._connection.is_closed()
+
+    async def start(self):
+        """Подключение и LISTEN на все каналы подписчиков"""
+        self._closed = False
+        if not self.enabled:
+            return
+        self._connection = await asyncpg.connect(_listener_dsn(self.database_url))
+        self._connection.add_termination_listener(self._on_termination)
+        for channel in self._subscribers:
+            await self._connection.add_listener(channel, self._dispatch)
+        for callback in self._connect_callbacks:
+            callback()
+
+    async def start_in_background(self):
+        """Подключение без падения: при ошибке повторяется в фоне"""
+        try:
+            await self.start()
+        except Exception as e:
+            print(f"Error starting notification listener: {e}")
+            self._on_termination(None)
+
+    async def close(self):
+        """Отключение от базы"""
+        self._closed = True
+        if self._reconnect is not None:
+            self._reconnect.cancel()
+            self._reconnect = None
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            await connection.close()
+
+    def _dispatch(self, connection, pid: int, channel: str, payload: str):
+        for callback in self._subscribers.get(channel, []):
+            try:
+                callback(payload)
+            except Exception as e:
+                print(f"Error handling notification on {channel}: {e}")
+
+    def health(self) -> dict:
+        """Состояние слушателя для health check"""
+        return {
+            "status": (
+                "connected" if self.connected
+                else "disconnected" if self.enabled else "disabled"
+            ),
+            "channels": sorted(self._subscribers),
+        }
+
+    def _on_termination(self, connection):
+        if not self._closed and self._reconnect is None:
+            self._reconnect = asyncio.create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self):
+        try:
+            while not self._closed:
+                await asyncio.sleep(self.reconnect_delay)
+                try:
+                    await self.start()
+                    return
+                except Exception as e:
+                    print(f"Error reconnecting notification listener: {e}")
+        finally:
+            self._reconnect = None
+
+
+# Общий слушатель процесса API
+notification_listener = NotificationListener()
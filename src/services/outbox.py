@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.core.config import settings
+from src.core.database import AsyncSessionLocal
+from src.models.task import TaskOutbox
+from src.services.broker import Broker
+from src.services.publisher import publisher as default_publisher
+
+
+class OutboxRelay:
+    """Фоновая пересылка сообщений из task_outbox в брокер.
+
+    Строки выбираются пакетами через FOR UPDATE SKIP LOCKED, поэтому
+    несколько процессов API могут работать параллельно, не публикуя одно
+    сообщение дважды. Строка удаляется только после подтверждения брокера;
+    при сбое между публикацией и commit сообщение уйдет повторно, и воркер
+    должен быть к этому готов (доставка at-least-once).
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        publisher: Optional[Broker] = None,
+        batch_size: Optional[int] = None,
+        poll_interval_ms: Optional[int] = None
+    ):
+        self.session_factory = session_factory
+        self.publisher = publisher or default_publisher
+        self.batch_size = batch_size or settings.outbox_batch_size
+        self.poll_interval = (
+            poll_interval_ms or settings.outbox_poll_interval_ms
+        ) / 1000
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        self._closed = False
+        self._relayed = 0
+        self._last_error: Optional[str] = None
+        self._last_relay_at: Optional[float] = None
+
+    async def start(self):
+        """Запуск фоновой пересылки"""
+        if self._runner is None:
+            self._closed = False
+            self._runner = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Остановка пересылки; неотправленные строки остаются в outbox"""
+        self._closed = True
+        self._wakeup.set()
+        if self._runner is not None:
+            await self._runner
+            self._runner = None
+
+    def wakeup(self):
+        """Сигнал о новых строках, чтобы не ждать следующего опроса"""
+        self._wakeup.set()
+
+    async def relay_once(self) -> int:
+        """Публикация одного пакета; возвращает число отправленных сообщений"""
+        async with self.session_factory() as db:
+            query = (
+                select(TaskOutbox)
+                .order_by(TaskOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            rows = (await db.execute(query)).scalars().all()
+            if not rows:
+                return 0
+
+            await self.publisher.publish_many(
+                [(row.task_id, row.priority, row.task_type) for row in rows]
+            )
+            await db.execute(
+                delete(TaskOutbox).where(TaskOutbox.id.in_([row.id for row in rows]))
+            )
+            await db.commit()
+
+        self._relayed += len(rows)
+        self._last_relay_at = time.time()
+        return len(rows)
+
+    async def _run(self):
+        while not self._closed:
+            self._wakeup.clear()
+            try:
+                relayed = await self.relay_once()
+                self._last_error = None
+            except Exception as e:
+                print(f"Error relaying outbox: {e}")
+                self._last_error = str(e)
+                relayed = 0
+
+            # Полный пакет означает, что в outbox могут быть еще строки
+            if relayed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def health(self) -> dict:
+        """Состояние пересылки для health check"""
+        return {
+            "status": "running" if self._runner is not None else "stopped",
+            "relayed": self._relayed,
+            "last_error": self._last_error,
+            "last_relay_at": self._last_relay_at,
+        }
+
+
+outbox_relay = OutboxRelay()
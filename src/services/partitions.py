@@ -0,0 +1,317 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.core.config import settings
+from src.core.database import AsyncSessionLocal
+from src.models.task import ACTIVE_STATUSES, TaskPriority, TaskStatus
+from src.services.task_service import TaskService
+
+PARTITION_PREFIX = "tasks_p"
+# Ключ advisory lock: обслуживание выполняет один процесс за раз
+MAINTENANCE_LOCK_KEY = 0x7461736B
+
+# Секции tasks и верхние границы их диапазонов; у DEFAULT границы нет
+PARTITIONS_QUERY = text(
+    r"""
+    SELECT c.relname,
+           (regexp_match(
+               pg_get_expr(c.relpartbound, c.oid), 'TO \(''([^'']+)''\)'
+           ))[1]::timestamptz AS upper_bound
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass('tasks')
+    """
+)
+
+
+class ArchiveMode(str, Enum):
+    # Секция отсоединяется и переносится в схему архива
+    DETACH = "detach"
+    # Секция удаляется вместе с результатами задач
+    DROP = "drop"
+
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def missing_partitions(
+    last_upper: Optional[datetime],
+    now: datetime,
+    premake_months: int
+) -> list[tuple[str, datetime, datetime]]:
+    """Месячные секции (имя, начало, конец) от последней существующей
+    до premake_months месяцев после текущего"""
+    end = _add_months(_month_start(now), premake_months + 1)
+    start = _month_start(last_upper) if last_upper is not None else _month_start(now)
+    partitions = []
+    while start < end:
+        following = _add_months(start, 1)
+        partitions.append((f"{PARTITION_PREFIX}{start:%Y%m}", start, following))
+        start = following
+    return partitions
+
+
+def create_partition_sql(table: str, start: datetime, end: datetime) -> str:
+    """Команда создания секции table на [start, end); имя уже в кавычках"""
+    return (
+        f"CREATE TABLE {table} PARTITION OF tasks "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+class PartitionMaintainer:
+    """Фоновое обслуживание секций таблицы tasks.
+
+    Заранее создает месячные секции, чтобы новые задачи не попадали в
+    DEFAULT, и архивирует секции старше task_retention_days. Строки в
+    DEFAULT означают, что секции кончились: обслуживание не переносит их
+    под блокировкой tasks, а сообщает о них в health, и секцию с такими
+    строками не создает. Секция с активными задачами не архивируется. Счетчики задач уменьшаются в той
+    же транзакции, что и отсоединение секции. Несколько процессов API
+    не мешают друг другу: каждый шаг берет advisory lock.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        interval_seconds: Optional[float] = None,
+        premake_months: Optional[int] = None,
+        retention_days: Optional[int] = None,
+        archive_mode: Optional[ArchiveMode] = None
+    ):
+        self.session_factory = session_factory
+        self.interval = interval_seconds or settings.task_partition_maintenance_interval_seconds
+        self.premake_months = (
+            premake_months if premake_months is not None
+            else settings.task_partition_premake_months
+        )
+        self.retention_days = (
+            retention_days if retention_days is not None
+            else settings.task_retention_days
+        )
+        self.archive_mode = ArchiveMode(archive_mode or settings.task_archive_mode)
+        self.archive_schema = settings.task_archive_schema
+        self._stop = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        self._last_error: Optional[str] = None
+        self._last_run_at: Optional[float] = None
+        self._created: list[str] = []
+        # Строки в DEFAULT и секции, которые из-за них нельзя создать
+        self._default_rows = 0
+        self._blocked: list[str] = []
+        self._archived: list[str] = []
+        # Секции старше срока хранения, в которых остались активные задачи
+        self._retained: list[str] = []
+
+    async def start(self):
+        """Запуск фонового обслуживания"""
+        if self._runner is None:
+            self._stop.clear()
+            self._runner = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Остановка обслуживания"""
+        self._stop.set()
+        if self._runner is not None:
+            await self._runner
+            self._runner = None
+
+    async def run_once(self) -> dict:
+        """Один проход обслуживания; возвращает созданные и архивированные секции"""
+        summary = {
+            "created": [], "default_rows": 0, "blocked": [],
+            "archived": [], "retained": []
+        }
+        now = datetime.now(timezone.utc)
+
+        async with self.session_factory() as db:
+            if db.get_bind().dialect.name != "postgresql":
+                return summary
+            if not await self._lock(db):
+                return summary
+            partitions = await self._partitions(db)
+            if partitions is None:
+                # Таблица создана без миграции 010 и не секционирована
+                return summary
+
+            bounds = [upper for upper in partitions.values() if upper is not None]
+            default = next(
+                (name for name, upper in partitions.items() if upper is None), None
+            )
+            summary["default_rows"] = await self._default_rows(db, default)
+            for name, start, end in missing_partitions(
+                max(bounds, default=None), now, self.premake_months
+            ):
+                # CREATE ... PARTITION OF упадет, если в DEFAULT есть строки
+                # диапазона: их переносят вручную, следующие месяцы ждут,
+                # чтобы в диапазоне секций не было пропуска
+                if summary["default_rows"] and await self._default_rows(
+                    db, default, start, end
+                ):
+                    summary["blocked"] = [
+                        name for name, _, _ in missing_partitions(
+                            start, now, self.premake_months
+                        )
+                    ]
+                    break
+                await db.execute(text(
+                    create_partition_sql(self._quote(db, name), start, end)
+                ))
+                summary["created"].append(name)
+            await db.commit()
+        if summary["default_rows"]:
+            print(
+                f"Warning: {summary['default_rows']} tasks in the default partition, "
+                f"partitions not created: {', '.join(summary['blocked']) or 'none'}"
+            )
+
+        if self.retention_days > 0:
+            cutoff = now - timedelta(days=self.retention_days)
+            expired = sorted(
+                (upper, name) for name, upper in partitions.items()
+                if upper is not None and upper <= cutoff
+            )
+            for _, name in expired:
+                # Каждая секция в своей транзакции, чтобы не держать блокировку tasks
+                async with self.session_factory() as db:
+                    if not await self._lock(db):
+                        break
+                    if await self._archive(db, name):
+                        summary["archived"].append(name)
+                    else:
+                        summary["retained"].append(name)
+                    await db.commit()
+
+        self._created.extend(summary["created"])
+        self._default_rows = summary["default_rows"]
+        self._blocked = summary["blocked"]
+        self._archived.extend(summary["archived"])
+        self._retained = summary["retained"]
+        return summary
+
+    async def _run(self):
+        while not self._stop.is_set():
+            try:
+                await self.run_once()
+                self._last_error = None
+            except Exception as e:
+                print(f"Error maintaining task partitions: {e}")
+                self._last_error = str(e)
+            self._last_run_at = time.time()
+
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _lock(self, db: AsyncSession) -> bool:
+        query = select(func.pg_try_advisory_xact_lock(MAINTENANCE_LOCK_KEY))
+        return bool(await db.scalar(query))
+
+    async def _partitions(self, db: AsyncSession) -> Optional[dict[str, Optional[datetime]]]:
+        partitioned = await db.scalar(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass('tasks'))"
+        ))
+        if not partitioned:
+            return None
+        rows = await db.execute(PARTITIONS_QUERY)
+        return {name: upper for name, upper in rows}
+
+    async def _default_rows(
+        self,
+        db: AsyncSession,
+        default: Optional[str],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> int:
+        """Число строк секции DEFAULT, всего или в диапазоне [start, end)"""
+        if default is None:
+            return 0
+        query = f"SELECT count(*) FROM {self._quote(db, default)}"
+        if start is None:
+            return await db.scalar(text(query))
+        return await db.scalar(
+            text(f"{query} WHERE created_at >= :start AND created_at < :end"),
+            {"start": start, "end": end}
+        )
+
+    async def _archive(self, db: AsyncSession, name: str) -> bool:
+        """Архивирование секции; False, если в ней остались активные задачи"""
+        table = self._quote(db, name)
+        active = ", ".join(f"'{status.value}'" for status in ACTIVE_STATUSES)
+        if await db.scalar(text(
+            f"SELECT EXISTS (SELECT 1 FROM {table} WHERE status IN ({active}))"
+        )):
+            return False
+
+        counts = await db.execute(text(
+            f"SELECT status, priority, count(*) FROM {table} GROUP BY status, priority"
+        ))
+        deltas = {
+            (TaskStatus(status), TaskPriority(priority)): -count
+            for status, priority, count in counts
+            if status is not None and priority is not None
+        }
+
+        await db.execute(text(f"ALTER TABLE tasks DETACH PARTITION {table}"))
+        if self.archive_mode == ArchiveMode.DETACH:
+            schema = self._quote(db, self.archive_schema)
+            results = self._quote(db, f"{name}_results")
+            await db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+            await db.execute(text(f"ALTER TABLE {table} SET SCHEMA {schema}"))
+            table = f"{schema}.{table}"
+            # Большие результаты уезжают в архив вместе с задачами
+            await db.execute(text(
+                f"CREATE TABLE {schema}.{results} AS "
+                f"SELECT r.* FROM task_results r WHERE r.task_id IN (SELECT id FROM {table})"
+            ))
+        await db.execute(text(
+            f"DELETE FROM task_results WHERE task_id IN (SELECT id FROM {table})"
+        ))
+        if self.archive_mode == ArchiveMode.DROP:
+            await db.execute(text(f"DROP TABLE {table}"))
+
+        await TaskService(db).adjust_counters(deltas)
+        return True
+
+    @staticmethod
+    def _quote(db: AsyncSession, name: str) -> str:
+        return db.get_bind().dialect.identifier_preparer.quote(name)
+
+    def health(self) -> dict:
+        """Состояние обслуживания для health check"""
+        if self._runner is None:
+            status = "stopped"
+        elif self._default_rows:
+            # Задачи попали в DEFAULT: секции созданы недостаточно далеко
+            status = "degraded"
+        else:
+            status = "running"
+        return {
+            "status": status,
+            "last_run_at": self._last_run_at,
+            "last_error": self._last_error,
+            "created": self._created[-10:],
+            "default_rows": self._default_rows,
+            "blocked": self._blocked,
+            "archived": self._archived[-10:],
+            "retained": self._retained,
+        }
+
+
+partition_maintainer = PartitionMaintainer()
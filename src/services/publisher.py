@@ -0,0 +1,247 @@
+import asyncio
+import time
+from typing import AsyncIterator, Optional
+
+import aio_pika
+from aio_pika.abc import (
+    AbstractChannel, AbstractIncomingMessage, AbstractRobustConnection
+)
+from aio_pika.pool import Pool
+
+from src.core.config import settings
+from src.core.metrics import TASK_PUBLISH_DURATION, TASK_PUBLISH_FAILURES
+from src.models.task import DEFAULT_TASK_TYPE, TaskPriority
+from src.services.broker import (
+    DEAD_LETTER_QUEUE,
+    PRIORITY_MAP,
+    TASK_QUEUE,
+    Broker,
+    BrokerBackend,
+    MemoryBroker,
+    retry_delay_ms,
+    route,
+    task_message_body,
+    task_queues,
+)
+
+TASK_QUEUE_ARGUMENTS = {"x-max-priority": 10}
+
+
+def task_queue_arguments(queue: str) -> dict:
+    """Аргументы очереди задач; выделенным очередям приоритеты не нужны"""
+    return TASK_QUEUE_ARGUMENTS if queue == TASK_QUEUE else {}
+
+
+def retry_queue(queue: str, attempt: int) -> str:
+    """Очередь отложенного повтора для очереди задач и номера попытки"""
+    return f"{queue}.retry.{attempt}"
+
+
+def retry_queue_arguments(queue: str) -> dict:
+    """Истекшие сообщения очереди повтора возвращаются в исходную очередь"""
+    return {
+        "x-dead-letter-exchange": "",
+        "x-dead-letter-routing-key": queue,
+    }
+
+
+def _task_message(task_id: int, priority: TaskPriority, **kwargs) -> aio_pika.Message:
+    return aio_pika.Message(
+        body=task_message_body(task_id),
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        priority=PRIORITY_MAP[priority],
+        **kwargs
+    )
+
+
+class TaskPublisher(Broker):
+    """Долгоживущий издатель сообщений в RabbitMQ.
+
+    Держит пул соединений и пул каналов поверх него, очередь объявляется
+    один раз при старте. Публикация задачи стоит один кадр до брокера
+    вместо полного TCP+AMQP рукопожатия. Потребители воркера работают
+    через отдельное соединение, чтобы не занимать пул публикации.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        connection_pool_size: Optional[int] = None,
+        channel_pool_size: Optional[int] = None
+    ):
+        self.url = url or settings.rabbitmq_url
+        self.connection_pool_size = (
+            connection_pool_size or settings.rabbitmq_connection_pool_size
+        )
+        self.channel_pool_size = (
+            channel_pool_size or settings.rabbitmq_channel_pool_size
+        )
+        self._connection_pool: Optional[Pool[AbstractRobustConnection]] = None
+        self._channel_pool: Optional[Pool[AbstractChannel]] = None
+        self._consumer_connection: Optional[AbstractRobustConnection] = None
+        self._consumer_lock = asyncio.Lock()
+        self._started = False
+        self._published = 0
+        self._failed = 0
+        self._last_error: Optional[str] = None
+        self._last_publish_at: Optional[float] = None
+
+    async def _create_connection(self) -> AbstractRobustConnection:
+        return await aio_pika.connect_robust(self.url)
+
+    async def _create_channel(self) -> AbstractChannel:
+        async with self._connection_pool.acquire() as connection:
+            return await connection.channel()
+
+    async def start(self):
+        """Создание пулов и однократное объявление очереди"""
+        if self._started:
+            return
+
+        self._connection_pool = Pool(
+            self._create_connection, max_size=self.connection_pool_size
+        )
+        self._channel_pool = Pool(
+            self._create_channel, max_size=self.channel_pool_size
+        )
+
+        async with self._channel_pool.acquire() as channel:
+            for queue in task_queues():
+                await channel.declare_queue(
+                    queue,
+                    durable=True,
+                    arguments=task_queue_arguments(queue)
+                )
+                # Отдельная очередь на каждую попытку: у всех сообщений очереди
+                # одинаковый TTL, поэтому короткие задержки не ждут длинных
+                for attempt in range(1, settings.task_max_retries + 1):
+                    await channel.declare_queue(
+                        retry_queue(queue, attempt),
+                        durable=True,
+                        arguments=retry_queue_arguments(queue)
+                    )
+            await channel.declare_queue(DEAD_LETTER_QUEUE, durable=True)
+
+        self._started = True
+
+    async def close(self):
+        """Закрытие каналов и соединений"""
+        if not self._started:
+            return
+
+        self._started = False
+        if self._consumer_connection is not None:
+            await self._consumer_connection.close()
+            self._consumer_connection = None
+        await self._channel_pool.close()
+        await self._connection_pool.close()
+
+    async def publish_many(self, tasks: list[tuple[int, TaskPriority, str]]):
+        """Публикация пакета задач через один канал.
+
+        Сообщения отправляются без ожидания друг друга, подтверждения
+        брокера (publisher confirms) собираются одним ожиданием.
+        """
+        await self._publish("task", [
+            (route(priority, task_type), _task_message(task_id, priority))
+            for task_id, priority, task_type in tasks
+        ])
+
+    async def publish_retry(
+        self,
+        task_id: int,
+        priority: TaskPriority,
+        attempt: int,
+        task_type: str = DEFAULT_TASK_TYPE
+    ):
+        """Отложенный повтор задачи.
+
+        Сообщение лежит в очереди повтора с TTL, равным задержке попытки,
+        а по истечении TTL брокер перекладывает его в очередь задачи.
+        Потребитель очереди задач в ожидании не участвует.
+        """
+        message = _task_message(
+            task_id,
+            priority,
+            expiration=retry_delay_ms(attempt) / 1000,
+            headers={"x-retry-count": attempt}
+        )
+        await self._publish(
+            "retry", [(retry_queue(route(priority, task_type), attempt), message)]
+        )
+
+    async def publish_dead(self, body: bytes, reason: str):
+        """Перенос необрабатываемого сообщения в очередь dead letter"""
+        message = aio_pika.Message(
+            body=body,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            headers={"x-death-reason": reason}
+        )
+        await self._publish("dead", [(DEAD_LETTER_QUEUE, message)])
+
+    async def _publish(self, kind: str, messages: list[tuple[str, aio_pika.Message]]):
+        if not self._started:
+            raise RuntimeError("Publisher is not started")
+
+        started = time.perf_counter()
+        try:
+            async with self._channel_pool.acquire() as channel:
+                await asyncio.gather(*(
+                    channel.default_exchange.publish(message, routing_key=routing_key)
+                    for routing_key, message in messages
+                ))
+        except Exception as e:
+            self._failed += len(messages)
+            self._last_error = str(e)
+            TASK_PUBLISH_FAILURES.labels(kind).inc(len(messages))
+            raise
+        finally:
+            TASK_PUBLISH_DURATION.labels(kind).observe(time.perf_counter() - started)
+
+        self._published += len(messages)
+        self._last_publish_at = time.time()
+
+    async def consume(
+        self,
+        queue: str,
+        prefetch: int
+    ) -> AsyncIterator[AbstractIncomingMessage]:
+        """Сообщения очереди через отдельный канал потребителя.
+
+        Брокер отдает в канал не больше prefetch неподтвержденных сообщений.
+        Канал остается открытым до close, чтобы выполняющиеся задачи могли
+        отправить ack после остановки чтения.
+        """
+        async with self._consumer_lock:
+            if self._consumer_connection is None:
+                self._consumer_connection = await aio_pika.connect_robust(self.url)
+        channel = await self._consumer_connection.channel()
+        await channel.set_qos(prefetch_count=prefetch)
+        declared = await channel.declare_queue(
+            queue,
+            durable=True,
+            arguments=task_queue_arguments(queue)
+        )
+        async for message in declared:
+            yield message
+
+    def health(self) -> dict:
+        """Состояние издателя для health check"""
+        return {
+            "status": "healthy" if self._started else "stopped",
+            "broker": BrokerBackend.RABBITMQ.value,
+            "published": self._published,
+            "failed": self._failed,
+            "last_error": self._last_error,
+            "last_publish_at": self._last_publish_at,
+        }
+
+
+def create_broker(backend: Optional[str] = None) -> Broker:
+    """Брокер по настройке BROKER"""
+    if BrokerBackend(backend or settings.broker) == BrokerBackend.MEMORY:
+        return MemoryBroker()
+    return TaskPublisher()
+
+
+publisher = create_broker()
@@ -0,0 +1,116 @@
+import gzip
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.core.config import settings
+from src.core.database import AsyncSessionLocal
+from src.models.task import TaskResult
+
+IDENTITY = "identity"
+GZIP = "gzip"
+
+
+@dataclass
+class StoredResult:
+    """Результат задачи, подготовленный для таблицы task_results"""
+    content: bytes
+    encoding: str
+    size: int
+
+
+def pack_result(result: str) -> StoredResult:
+    """Кодирование и сжатие большого результата.
+
+    Сжатие занимает процессор, поэтому воркер вызывает функцию в потоке.
+    Несжимаемый результат хранится как есть.
+    """
+    raw = result.encode()
+    if settings.task_result_compression:
+        compressed = gzip.compress(raw, compresslevel=6)
+        if len(compressed) < len(raw):
+            return StoredResult(compressed, GZIP, len(raw))
+    return StoredResult(raw, IDENTITY, len(raw))
+
+
+@dataclass
+class ResultInfo:
+    """Версия результата в task_results, которую отдает поток"""
+    encoding: str
+    # Размер хранимого содержимого и исходный размер, в байтах
+    length: int
+    size: int
+    created_at: datetime
+
+
+class ResultChangedError(Exception):
+    """Результат перезаписан, пока отдавался по частям"""
+
+
+class ResultReader:
+    """Чтение большого результата по частям без загрузки целиком.
+
+    Части читаются через substring, поэтому в памяти процесса API и в
+    ответе базы одновременно находится не больше chunk_size байт. Каждая
+    часть читается в своей короткой сессии: медленный клиент не держит
+    соединение и транзакцию на все время ответа. Часть читается только из
+    той версии результата, которую вернул get_info.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        chunk_size: Optional[int] = None
+    ):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size or settings.task_result_chunk_size
+
+    async def get_info(self, task_id: int) -> Optional[ResultInfo]:
+        """Кодировка, размеры и время записи результата"""
+        query = select(
+            TaskResult.encoding,
+            func.length(TaskResult.content),
+            TaskResult.size,
+            TaskResult.created_at
+        ).where(TaskResult.task_id == task_id)
+        async with self.session_factory() as db:
+            row = (await db.execute(query)).one_or_none()
+        return ResultInfo(*row) if row is not None else None
+
+    async def iter_content(self, task_id: int, info: ResultInfo) -> AsyncIterator[bytes]:
+        """Хранимое содержимое по частям"""
+        for offset in range(0, info.length, self.chunk_size):
+            query = select(
+                func.substr(TaskResult.content, offset + 1, self.chunk_size)
+            ).where(
+                TaskResult.task_id == task_id,
+                TaskResult.created_at == info.created_at,
+                TaskResult.size == info.size,
+                func.length(TaskResult.content) == info.length
+            )
+            async with self.session_factory() as db:
+                chunk = (await db.execute(query)).scalar_one_or_none()
+            if chunk is None:
+                # Части разных версий нельзя склеивать в один ответ
+                raise ResultChangedError(f"Result of task {task_id} has changed")
+            yield bytes(chunk)
+
+    async def iter_decoded(self, task_id: int, info: ResultInfo) -> AsyncIterator[bytes]:
+        """Содержимое по частям с распаковкой gzip на лету"""
+        if info.encoding == IDENTITY:
+            async for chunk in self.iter_content(task_id, info):
+                yield chunk
+            return
+
+        decompressor = zlib.decompressobj(wbits=31)
+        async for chunk in self.iter_content(task_id, info):
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+        tail = decompressor.flush()
+        if tail:
+            yield tail
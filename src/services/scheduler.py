@@ -0,0 +1,52 @@
+import asyncio
+from collections import deque
+from typing import Any, Optional
+
+
+class WeightedScheduler:
+    """Выбор следующего сообщения из нескольких очередей по весам.
+
+    Сообщения каждой очереди буферизуются локально, следующее выбирается
+    плавным взвешенным round-robin среди непустых буферов: при постоянной
+    нагрузке очереди получают слоты пропорционально весам, а простаивающая
+    очередь не забирает слоты у остальных.
+    """
+
+    def __init__(self, weights: dict[str, int]):
+        if any(weight < 1 for weight in weights.values()):
+            raise ValueError("queue weights must be positive")
+        self.weights = weights
+        self._buffers: dict[str, deque] = {queue: deque() for queue in weights}
+        self._current: dict[str, int] = {queue: 0 for queue in weights}
+        self._open = set(weights)
+        self._available = asyncio.Event()
+
+    def put(self, queue: str, item: Any):
+        """Сообщение из очереди queue"""
+        self._buffers[queue].append(item)
+        self._available.set()
+
+    def close(self, queue: str):
+        """Очередь больше не будет присылать сообщения"""
+        self._open.discard(queue)
+        self._available.set()
+
+    async def get(self) -> Optional[Any]:
+        """Следующее сообщение; None, когда все очереди закрыты и пусты"""
+        while True:
+            ready = [queue for queue, buffer in self._buffers.items() if buffer]
+            if ready:
+                return self._buffers[self._pick(ready)].popleft()
+            if not self._open:
+                return None
+            self._available.clear()
+            await self._available.wait()
+
+    def _pick(self, ready: list[str]) -> str:
+        total = 0
+        for queue in ready:
+            self._current[queue] += self.weights[queue]
+            total += self.weights[queue]
+        chosen = max(ready, key=self._current.__getitem__)
+        self._current[chosen] -= total
+        return chosen
@@ -0,0 +1,129 @@
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from src.core.config import settings
+from src.models.task import TERMINAL_STATUSES, TaskStatus
+from src.services.notifications import (
+    TASK_STATUS_CHANNEL, NotificationListener, parse_status_changes
+)
+
+# Сигнал ожидающему перечитать статус из базы
+_RECHECK = None
+
+
+class TaskStatusHub:
+    """Раздача переходов статусов клиентам, ожидающим задачи.
+
+    Все ожидающие в процессе API питаются от одного слушателя канала
+    task_status, поэтому ожидание не стоит запросов к базе. Пока слушатель
+    не подключен, ожидающие перечитывают статус раз в recheck_seconds,
+    после переподключения - сразу, так как уведомления могли потеряться.
+    """
+
+    def __init__(self, recheck_seconds: Optional[float] = None):
+        self.recheck_seconds = recheck_seconds or settings.task_wait_recheck_seconds
+        self._watchers: dict[int, set[asyncio.Queue]] = defaultdict(set)
+        self._listener: Optional[NotificationListener] = None
+
+    def attach(self, listener: NotificationListener):
+        """Получение переходов от слушателя уведомлений"""
+        if self._listener is listener:
+            return
+        self._listener = listener
+        listener.subscribe(TASK_STATUS_CHANNEL, self._on_status_changes)
+        listener.on_connect(self._on_connect)
+
+    @asynccontextmanager
+    async def watch(self, task_id: int) -> AsyncIterator[asyncio.Queue]:
+        """Очередь переходов задачи на время ожидания"""
+        updates: asyncio.Queue = asyncio.Queue()
+        self._watchers[task_id].add(updates)
+        try:
+            yield updates
+        finally:
+            watchers = self._watchers[task_id]
+            watchers.discard(updates)
+            if not watchers:
+                del self._watchers[task_id]
+
+    async def follow(
+        self,
+        task_id: int,
+        load_status: Callable[[], Awaitable[Optional[TaskStatus]]],
+        timeout: Optional[float] = None,
+        keepalive: Optional[float] = None
+    ) -> AsyncIterator[Optional[TaskStatus]]:
+        """Текущий статус задачи и его изменения до завершенного статуса.
+
+        load_status читает статус из базы и должен сразу возвращать
+        соединение в пул. Ничего не отдает, если задачи нет. При заданном
+        keepalive отдает None после keepalive секунд без изменений.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+
+        # Подписываемся до чтения, чтобы не пропустить переход между ними
+        async with self.watch(task_id) as updates:
+            status = await load_status()
+            if status is None:
+                return
+            yield status
+
+            while status not in TERMINAL_STATUSES:
+                wait = [keepalive]
+                if deadline is not None:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        return
+                    wait.append(remaining)
+                if not self.listening:
+                    wait.append(self.recheck_seconds)
+                wait = [value for value in wait if value is not None]
+
+                try:
+                    update = await asyncio.wait_for(
+                        updates.get(), min(wait) if wait else None
+                    )
+                except asyncio.TimeoutError:
+                    if deadline is not None and loop.time() >= deadline:
+                        return
+                    if self.listening:
+                        # Истек только keepalive
+                        yield None
+                        continue
+                    update = _RECHECK
+
+                if update is _RECHECK:
+                    update = await load_status()
+                    if update is None:
+                        return
+                if update != status:
+                    status = update
+                    yield status
+
+    @property
+    def listening(self) -> bool:
+        """Приходят ли сейчас уведомления о переходах"""
+        return self._listener is not None and self._listener.connected
+
+    def health(self) -> dict:
+        """Состояние для health check"""
+        return {
+            "tasks": len(self._watchers),
+            "waiters": sum(len(watchers) for watchers in self._watchers.values()),
+        }
+
+    def _on_status_changes(self, payload: str):
+        for task_id, status in parse_status_changes(payload):
+            for updates in self._watchers.get(task_id, ()):
+                updates.put_nowait(status)
+
+    def _on_connect(self):
+        for watchers in self._watchers.values():
+            for updates in watchers:
+                updates.put_nowait(_RECHECK)
+
+
+task_status_hub = TaskStatusHub()
@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.core.config import settings
+from src.models.task import TaskStatus
+from src.services.results import StoredResult
+from src.services.task_service import StatusUpdate, TaskService
+
+
+class StatusSink:
+    """Пакетная запись переходов статусов задач.
+
+    Переходы от всех выполняющихся задач копятся в памяти и сбрасываются
+    одной транзакцией раз в несколько миллисекунд или по достижении размера
+    пакета. Пакеты пишутся строго последовательно, поэтому порядок переходов
+    каждой задачи сохраняется. Future, возвращаемый из record, завершается
+    только после commit, что позволяет подтверждать сообщение после фиксации
+    итогового статуса.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        max_batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[int] = None
+    ):
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size or settings.status_batch_size
+        self.flush_interval = (
+            flush_interval_ms or settings.status_flush_interval_ms
+        ) / 1000
+        self._pending: list[tuple[StatusUpdate, asyncio.Future]] = []
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def start(self):
+        """Запуск фонового сброса пакетов"""
+        if self._runner is None:
+            self._closed = False
+            self._runner = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Остановка со сбросом всех накопленных переходов"""
+        self._closed = True
+        self._wakeup.set()
+        self._full.set()
+        if self._runner is not None:
+            await self._runner
+            self._runner = None
+        while self._pending:
+            await self._flush()
+
+    def record(
+        self,
+        task_id: int,
+        status: TaskStatus,
+        result: Optional[str] = None,
+        error_info: Optional[str] = None,
+        retry_count: Optional[int] = None,
+        stored_result: Optional[StoredResult] = None,
+        scheduled_at: Optional[datetime] = None,
+        created_at: Optional[datetime] = None,
+        claim_token: Optional[str] = None
+    ) -> asyncio.Future:
+        """Постановка перехода в очередь на запись.
+
+        Возвращает future с признаком того, что переход применен к задаче.
+        Ожидать его нужно только там, где требуется гарантия записи.
+        """
+        future = asyncio.get_running_loop().create_future()
+        # Ошибку записи получает тот, кто ждет future, остальные ее не теряют
+        future.add_done_callback(_retrieve_exception)
+        self._pending.append((
+            StatusUpdate(
+                task_id,
+                status,
+                result=result,
+                error_info=error_info,
+                retry_count=retry_count,
+                stored_result=stored_result,
+                scheduled_at=scheduled_at,
+                created_at=created_at,
+                claim_token=claim_token
+            ),
+            future
+        ))
+        self._wakeup.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        return future
+
+    async def _run(self):
+        while not self._closed:
+            await self._wakeup.wait()
+            # Даем пакету накопиться, пока не истек интервал или он не заполнен
+            if len(self._pending) < self.max_batch_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+            await self._flush()
+            if not self._pending:
+                self._wakeup.clear()
+
+    async def _flush(self):
+        batch = self._pending[:self.max_batch_size]
+        del self._pending[:self.max_batch_size]
+        if not batch:
+            return
+
+        try:
+            async with self.session_factory() as db:
+                applied = await TaskService(db).apply_status_updates(
+                    [status_update for status_update, _ in batch]
+                )
+                await db.commit()
+        except Exception as e:
+            print(f"Error flushing status updates: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), is_applied in zip(batch, applied):
+            if not future.done():
+                future.set_result(is_applied)
+
+
+def _retrieve_exception(future: asyncio.Future):
+    if not future.cancelled():
+        future.exception()
@@ -0,0 +1,151 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from src.core.config import settings
+from src.models.task import TERMINAL_STATUSES, TaskStatus
+from src.services.notifications import (
+    TASK_STATUS_CHANNEL, NotificationListener, parse_status_changes
+)
+
+
+class TaskCache:
+    """Ограниченный LRU/TTL кэш чтений задач в процессе API.
+
+    Записи инвалидируются уведомлениями канала task_status. Задачи в
+    завершенных статусах больше не меняются и хранятся без TTL, пока их не
+    вытеснит LRU. Активные задачи кэшируются на ttl_seconds и только пока
+    слушатель уведомлений подключен: без него инвалидация не дойдет.
+    """
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        ttl_seconds: Optional[float] = None
+    ):
+        self.max_size = max_size if max_size is not None else settings.task_cache_size
+        self.ttl = ttl_seconds if ttl_seconds is not None else settings.task_cache_ttl_seconds
+        # (task_id, view) -> (value, expires_at или None для бессрочных)
+        self._entries: OrderedDict[tuple[int, Hashable], tuple[Any, Optional[float]]] = OrderedDict()
+        self._views: dict[int, set] = {}
+        self._listener: Optional[NotificationListener] = None
+        # Счетчик инвалидаций и номер последней инвалидации каждой задачи:
+        # значение, прочитанное до инвалидации своей задачи, в кэш не
+        # попадает, а инвалидации других задач заполнению не мешают
+        self._epoch = 0
+        self._versions: OrderedDict[int, int] = OrderedDict()
+        # Номер самой поздней забытой инвалидации: номера задач хранятся
+        # не больше max_size, чтения, начатые до забытой, отклоняются
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+
+    def attach(self, listener: NotificationListener):
+        """Инвалидация по уведомлениям слушателя"""
+        if self._listener is listener:
+            return
+        self._listener = listener
+        listener.subscribe(TASK_STATUS_CHANNEL, self._on_status_changes)
+        # Пока соединения не было, уведомления могли потеряться
+        listener.on_connect(self.clear)
+
+    @property
+    def epoch(self) -> int:
+        """Метка, которую нужно получить до чтения из базы и передать в put"""
+        return self._epoch
+
+    def get(self, task_id: int, view: Hashable) -> Optional[Any]:
+        """Значение из кэша или None"""
+        key = (task_id, view)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = entry
+        if expires_at is not None and (
+            expires_at <= time.monotonic() or not self._listening()
+        ):
+            self._drop(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(
+        self,
+        task_id: int,
+        view: Hashable,
+        value: Any,
+        status: TaskStatus,
+        epoch: int
+    ):
+        """Сохранение значения, прочитанного из базы после получения epoch"""
+        if self.max_size <= 0:
+            return
+        # Задача изменилась или удалена, пока значение читалось
+        if epoch < self._versions.get(task_id, self._floor):
+            return
+
+        if status in TERMINAL_STATUSES:
+            expires_at = None
+        else:
+            # Инвалидация не дойдет без слушателя
+            if not self._listening() or self.ttl <= 0:
+                return
+            expires_at = time.monotonic() + self.ttl
+
+        key = (task_id, view)
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        self._views.setdefault(task_id, set()).add(view)
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, task_id: int):
+        """Удаление всех представлений задачи"""
+        self._epoch += 1
+        self._versions[task_id] = self._epoch
+        self._versions.move_to_end(task_id)
+        while len(self._versions) > max(self.max_size, 1):
+            _, self._floor = self._versions.popitem(last=False)
+        for view in self._views.pop(task_id, ()):
+            self._entries.pop((task_id, view), None)
+
+    def clear(self):
+        """Полная очистка кэша"""
+        self._epoch += 1
+        self._floor = self._epoch
+        self._versions.clear()
+        self._entries.clear()
+        self._views.clear()
+
+    def health(self) -> dict:
+        """Состояние кэша для health check"""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _listening(self) -> bool:
+        return self._listener is not None and self._listener.connected
+
+    def _on_status_changes(self, payload: str):
+        for task_id, _ in parse_status_changes(payload):
+            self.invalidate(task_id)
+
+    def _drop(self, key: tuple[int, Hashable]):
+        self._entries.pop(key, None)
+        task_id, view = key
+        views = self._views.get(task_id)
+        if views is not None:
+            views.discard(view)
+            if not views:
+                del self._views[task_id]
+
+
+task_cache = TaskCache()
@@ -1,14 +1,158 @@
-from datetime import datetime
-from typing import Optional, Tuple
+import base64
+import binascii
+import json
+import random
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Iterable, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, and_
+from sqlalchemy import (
+    Select, and_, bindparam, case, insert, or_, select, update, text, tuple_
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
 from sqlalchemy.sql import func
 
-from src.models.task import Task as TaskModel, TaskStatus, TaskPriority
-from src.api.v1.schemas import TaskCreate
-import aio_pika
-import json
 from src.core.config import settings
+from src.core.database import utcnow
+from src.models.task import (
+    ACTIVE_STATUSES, ALLOWED_TRANSITIONS, Task as TaskModel, TaskCounter,
+    TaskOutbox, TaskResult, TaskStatus, TaskPriority
+)
+from src.api.v1.schemas import TaskCreate, TotalMode
+from src.services.broker import PRIORITY_MAP
+from src.services.notifications import (
+    TASK_CANCELLED_CHANNEL, TASK_CREATED_CHANNEL, notify, notify_status_changes
+)
+from src.services.outbox import outbox_relay
+from src.services.results import StoredResult, pack_result
+
+
+# Колонки, без которых не работают курсор и идентификация объекта
+KEY_FIELDS = ("id", "created_at")
+
+
+class DispatchMode(str, Enum):
+    # Созданные задачи уходят воркерам через outbox и брокер
+    BROKER = "broker"
+    # Воркеры сами забирают задачи из tasks через FOR UPDATE SKIP LOCKED
+    DATABASE = "database"
+
+
+def dispatch_mode() -> DispatchMode:
+    """Режим доставки задач воркерам из TASK_DISPATCH_MODE"""
+    return DispatchMode(settings.task_dispatch_mode)
+
+
+def claim_lease(timeout_seconds: Optional[int]) -> timedelta:
+    """Срок захвата задачи: таймаут выполнения, время на отмену и запас"""
+    return timedelta(seconds=(
+        (timeout_seconds or settings.task_timeout_seconds)
+        + settings.task_cancel_grace_seconds
+        + settings.task_claim_lease_grace_seconds
+    ))
+
+
+class InvalidFieldsError(ValueError):
+    """Запрошены поля, которых нет у задачи"""
+
+
+def projection(fields: Iterable[str]):
+    """Загрузка только перечисленных колонок задачи.
+    
+    Обращение к остальным колонкам загруженного объекта выбрасывает
+    исключение вместо незаметного дополнительного запроса.
+    """
+    columns = []
+    for name in dict.fromkeys((*KEY_FIELDS, *fields)):
+        column = TaskModel.__table__.columns.get(name)
+        if column is None:
+            raise InvalidFieldsError(f"Unknown field: {name}")
+        columns.append(getattr(TaskModel, name))
+    return load_only(*columns, raiseload=True)
+
+
+def encode_cursor(task: TaskModel) -> str:
+    """Непрозрачный курсор на позицию задачи в списке"""
+    raw = json.dumps([task.created_at.isoformat(), task.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+class InvalidCursorError(ValueError):
+    """Курсор пагинации не удалось разобрать"""
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Разбор курсора, выданного encode_cursor"""
+    try:
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(task_id)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+
+
+def next_cursor(tasks: list[TaskModel], size: int) -> Optional[str]:
+    """Курсор следующей страницы или None, если страница последняя"""
+    if len(tasks) < size:
+        return None
+    return encode_cursor(tasks[-1])
+
+
+# Ключ строки bulk UPDATE с created_at задачи: условие на ключ
+# секционирования оставляет в плане только секцию задачи
+ROW_CREATED_AT = "task_created_at"
+
+
+@dataclass
+class StatusUpdate:
+    """Переход задачи в новый статус"""
+    task_id: int
+    status: TaskStatus
+    result: Optional[str] = None
+    error_info: Optional[str] = None
+    retry_count: Optional[int] = None
+    # Время повтора в режиме TASK_DISPATCH_MODE=database
+    scheduled_at: Optional[datetime] = None
+    # Большой результат, подготовленный для task_results вместо result
+    stored_result: Optional[StoredResult] = None
+    # created_at задачи, если известен: чтение строки идет только по ее секции
+    created_at: Optional[datetime] = None
+    # Метка захвата воркера: переход не применяется, если задачу уже
+    # перехватил другой воркер
+    claim_token: Optional[str] = None
+    # Время фиксируется в момент перехода, а не в момент записи в БД
+    timestamp: datetime = field(default_factory=datetime.utcnow)
+    
+    def values(self) -> dict:
+        """Значения колонок для UPDATE"""
+        update_data = {"status": self.status}
+        
+        if self.status == TaskStatus.IN_PROGRESS:
+            update_data["started_at"] = self.timestamp
+        elif self.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
+            update_data["completed_at"] = self.timestamp
+        
+        if self.stored_result is not None:
+            update_data["result"] = None
+            update_data["result_size"] = self.stored_result.size
+            update_data["result_external"] = True
+        elif self.result:
+            update_data["result"] = self.result
+            update_data["result_size"] = len(self.result.encode())
+        if self.error_info:
+            update_data["error_info"] = self.error_info
+        if self.retry_count is not None:
+            update_data["retry_count"] = self.retry_count
+        if self.scheduled_at is not None:
+            update_data["scheduled_at"] = self.scheduled_at
+        
+        return update_data
 
 
 class TaskService:
@@ -16,171 +160,266 @@ class TaskService:
         self.db = db
     
     async def create_task(self, task_data: TaskCreate) -> TaskModel:
-        """Создание задачи и отправка в очередь"""
+        """Создание задачи и постановка в outbox для отправки в очередь"""
         task = TaskModel(
             name=task_data.name,
             description=task_data.description,
             priority=task_data.priority,
+            timeout_seconds=task_data.timeout_seconds,
+            task_type=task_data.task_type,
+            payload=task_data.payload,
             status=TaskStatus.NEW
         )
         
         self.db.add(task)
+        await self.db.flush()
+        await self._enqueue([task])
+        await self.adjust_counters({(TaskStatus.NEW, task.priority): 1})
         await self.db.commit()
         await self.db.refresh(task)
         
-        # Отправка задачи в очередь
-        await self._send_to_queue(task.id, task.priority)
+        outbox_relay.wakeup()
         
         return task
     
-    async def get_tasks(
-        self,
-        status: Optional[TaskStatus] = None,
-        priority: Optional[str] = None,
-        page: int = 1,
-        size: int = 10
-    ) -> Tuple[list[TaskModel], int]:
-        """Получение задач с фильтрацией и пагинацией"""
-        query = select(TaskModel)
-        
-        if status:
-            query = query.where(TaskModel.status == status)
-        if priority:
-            query = query.where(TaskModel.priority == priority)
-        
-        # Подсчет общего количества
-        count_query = select(func.count()).select_from(TaskModel)
-        if status:
-            count_query = count_query.where(TaskModel.status == status)
-        if priority:
-            count_query = count_query.where(TaskModel.priority == priority)
+    async def create_tasks(self, tasks_data: list[TaskCreate]) -> list[TaskModel]:
+        """Пакетное создание задач одним INSERT ... RETURNING"""
+        rows = [
+            {
+                "name": task_data.name,
+                "description": task_data.description,
+                "priority": task_data.priority,
+                "timeout_seconds": task_data.timeout_seconds,
+                "task_type": task_data.task_type,
+                "payload": task_data.payload,
+                "status": TaskStatus.NEW,
+            }
+            for task_data in tasks_data
+        ]
+        result = await self.db.scalars(
+            insert(TaskModel).returning(TaskModel, sort_by_parameter_order=True),
+            rows
+        )
+        tasks = result.all()
         
-        total = (await self.db.execute(count_query)).scalar()
+        deltas: dict[tuple[TaskStatus, TaskPriority], int] = defaultdict(int)
+        for task in tasks:
+            deltas[(TaskStatus.NEW, task.priority)] += 1
+        await self._enqueue(tasks)
+        await self.adjust_counters(deltas)
+        await self.db.commit()
         
-        # Пагинация
-        offset = (page - 1) * size
-        query = query.offset(offset).limit(size).order_by(TaskModel.created_at.desc())
+        outbox_relay.wakeup()
         
-        result = await self.db.execute(query)
-        tasks = result.scalars().all()
-        
-        return tasks, total
+        return tasks
     
-    async def get_task(self, task_id: int) -> Optional[TaskModel]:
-        """Получение задачи по ID"""
-        query = select(TaskModel).where(TaskModel.id == task_id)
-        result = await self.db.execute(query)
-        return result.scalar_one_or_none()
+    async def _enqueue(self, tasks: list[TaskModel]):
+        """Постановка созданных задач в очередь в текущей транзакции"""
+        if dispatch_mode() == DispatchMode.DATABASE:
+            # Воркеры забирают задачи из tasks сами, NOTIFY после commit
+            # только будит ждущих
+            await notify(self.db, TASK_CREATED_CHANNEL, "")
+            return
+        # Сообщения для очереди фиксируются в той же транзакции, что и задачи
+        await self.db.execute(
+            insert(TaskOutbox),
+            [
+                {
+                    "task_id": task.id,
+                    "priority": task.priority,
+                    "task_type": task.task_type,
+                }
+                for task in tasks
+            ]
+        )
     
-    async def cancel_task(self, task_id: int) -> bool:
-        """Отмена задачи"""
-        query = select(TaskModel).where(
-            and_(
-                TaskModel.id == task_id,
-                TaskModel.status.in_([TaskStatus.NEW, TaskStatus.PENDING])
+    async def claim_tasks(self, limit: int) -> list[TaskModel]:
+        """Захват воркером до limit готовых к выполнению задач.
+        
+        Задачи выбираются в порядке приоритета и времени создания через
+        FOR UPDATE SKIP LOCKED: параллельные воркеры пропускают строки друг
+        друга, а не ждут их. В той же транзакции задачи переходят в
+        IN_PROGRESS, а scheduled_at становится сроком захвата - после него
+        задачу остановившегося воркера заберет другой. Готовы задачи NEW и
+        задачи, у которых наступил scheduled_at (повтор или истекший захват).
+        Перехват по истекшему сроку считается повтором и увеличивает
+        retry_count, а новая claim_token отсекает запись статусов прежним
+        воркером.
+        
+        Возвращает задачи с колонками, нужными воркеру для выполнения.
+        """
+        now = datetime.now(timezone.utc)
+        postgresql = self.db.get_bind().dialect.name == "postgresql"
+        if postgresql:
+            # Значения enum упорядочены LOW < MEDIUM < HIGH, как в индексе
+            # ix_tasks_active_priority_created_at
+            priority_order = TaskModel.priority.desc()
+        else:
+            priority_order = case(PRIORITY_MAP, value=TaskModel.priority).desc()
+        ready = (
+            TaskModel.status.in_(ACTIVE_STATUSES),
+            or_(TaskModel.status == TaskStatus.NEW, TaskModel.scheduled_at <= now)
+        )
+        claimable = (
+            select(TaskModel.id, TaskModel.created_at, TaskModel.status)
+            .where(*ready)
+            .order_by(priority_order, TaskModel.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        claim_token = uuid.uuid4().hex
+        claim = (
+            update(TaskModel)
+            .values(
+                status=TaskStatus.IN_PROGRESS,
+                started_at=now,
+                scheduled_at=now + claim_lease(None),
+                claim_token=claim_token,
+                retry_count=TaskModel.retry_count + case(
+                    (TaskModel.status == TaskStatus.IN_PROGRESS, 1), else_=0
+                )
             )
+            .execution_options(synchronize_session=False)
         )
-        result = await self.db.execute(query)
-        task = result.scalar_one_or_none()
-        
-        if task:
-            task.status = TaskStatus.CANCELLED
-            task.completed_at = datetime.utcnow()
+        returning = (
+            TaskModel.id,
+            TaskModel.priority,
+            TaskModel.task_type,
+            TaskModel.payload,
+            TaskModel.timeout_seconds,
+            TaskModel.retry_count,
+            TaskModel.created_at,
+        )
+        if postgresql:
+            # Прежний статус нужен для счетчиков, поэтому UPDATE ... FROM, а
+            # не WHERE id IN (...); created_at ограничивает UPDATE секциями задач
+            claimable = claimable.cte("claimable")
+            result = await self.db.execute(
+                claim.where(
+                    TaskModel.id == claimable.c.id,
+                    TaskModel.created_at == claimable.c.created_at
+                )
+                .returning(*returning, claimable.c.status.label("previous_status"))
+            )
+            rows = result.all()
+            previous_statuses = {row.id: row.previous_status for row in rows}
+        else:
+            # SQLite не разрешает таблицы из FROM в RETURNING и не знает
+            # SKIP LOCKED: прежние статусы читаются заранее, а UPDATE
+            # повторяет условие готовности на случай конкурента
+            previous_statuses = {
+                task_id: status
+                for task_id, _, status in await self.db.execute(claimable)
+            }
+            result = await self.db.execute(
+                claim.where(TaskModel.id.in_(previous_statuses), *ready)
+                .returning(*returning)
+            )
+            rows = result.all()
+        if not rows:
             await self.db.commit()
-            return True
+            return []
         
-        return False
-    
-    async def update_task_status(
-        self,
-        task_id: int,
-        status: TaskStatus,
-        result: Optional[str] = None,
-        error_info: Optional[str] = None
-    ) -> bool:
-        """Обновление статуса задачи"""
-        update_data = {"status": status}
-        
-        if status == TaskStatus.IN_PROGRESS:
-            update_data["started_at"] = datetime.utcnow()
-        elif status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
-            update_data["completed_at"] = datetime.utcnow()
+        tasks = []
+        leases = []
+        deltas: dict[tuple[TaskStatus, TaskPriority], int] = defaultdict(int)
+        for row in rows:
+            tasks.append(TaskModel(
+                id=row.id,
+                status=TaskStatus.IN_PROGRESS,
+                priority=row.priority,
+                task_type=row.task_type,
+                payload=row.payload,
+                timeout_seconds=row.timeout_seconds,
+                retry_count=row.retry_count,
+                created_at=row.created_at,
+                started_at=now,
+                scheduled_at=now + claim_lease(row.timeout_seconds),
+                claim_token=claim_token
+            ))
+            if row.timeout_seconds:
+                # Задаче с собственным таймаутом нужен свой срок захвата
+                leases.append({
+                    "id": row.id,
+                    ROW_CREATED_AT: row.created_at,
+                    "scheduled_at": now + claim_lease(row.timeout_seconds),
+                })
+            deltas[(previous_statuses[row.id], row.priority)] -= 1
+            deltas[(TaskStatus.IN_PROGRESS, row.priority)] += 1
         
-        if result:
-            update_data["result"] = result
-        if error_info:
-            update_data["error_info"] = error_info
-        
-        stmt = (
-            update(TaskModel)
-            .where(TaskModel.id == task_id)
-            .values(**update_data)
+        if leases:
+            await self._update_rows(leases)
+        await self.adjust_counters(deltas)
+        await notify_status_changes(
+            self.db, [(task.id, TaskStatus.IN_PROGRESS) for task in tasks]
         )
-        result = await self.db.execute(stmt)
         await self.db.commit()
-        
-        return result.rowcount > 0
+        return tasks
     
-    async def _send_to_queue(self, task_id: int, priority: TaskPriority):
-        """Отправка задачи в очередь RabbitMQ"""
-        connection = await aio_pika.connect_robust(settings.rabbitmq_url)
-        async with connection:
-            channel = await connection.channel()
-            
-            # Создаем очередь с приоритетами
-            await channel.declare_queue(
-                "task_queue",
-                durable=True,
-                arguments={"x-max-priority": 10}
+    async def start_task(self, task_id: int) -> Optional[TaskModel]:
+        """Захват задачи, доставленной брокером (TASK_DISPATCH_MODE=broker).
+        
+        Outbox и брокер доставляют сообщение хотя бы один раз, и одну задачу
+        могут получить два воркера. Как в claim_tasks, задача переходит в
+        IN_PROGRESS с новой claim_token и сроком захвата в scheduled_at, но
+        только если она еще не выполняется или срок прежнего захвата истек
+        (воркер остановился, и брокер вернул его сообщение). Перехват
+        увеличивает retry_count.
+        
+        Возвращает задачу с колонками, нужными воркеру, или None, если задача
+        завершена, отменена или уже выполняется.
+        """
+        now = datetime.now(timezone.utc)
+        row = (await self.db.execute(
+            select(
+                TaskModel.id, TaskModel.status, TaskModel.priority,
+                TaskModel.task_type, TaskModel.payload, TaskModel.timeout_seconds,
+                TaskModel.retry_count, TaskModel.created_at
             )
-            
-            message_body = json.dumps({"task_id": task_id})
-            priority_map = {
-                TaskPriority.LOW: 1,
-                TaskPriority.MEDIUM: 5,
-                TaskPriority.HIGH: 10
-            }
-            
-            await channel.default_exchange.publish(
-                aio_pika.Message(
-                    body=message_body.encode(),
-                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
-                    priority=priority_map[priority]
-                ),
-                routing_key="task_queue"
-            )from datetime import datetime
-from typing import Optional, Tuple
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, and_
-from sqlalchemy.sql import func
-
-from src.models.task import Task as TaskModel, TaskStatus, TaskPriority
-from src.api.v1.schemas import TaskCreate
-import aio_pika
-import json
-from src.core.config import settings
-
-
-class TaskService:
-    def __init__(self, db: AsyncSession):
-        self.db = db
-    
-    async def create_task(self, task_data: TaskCreate) -> TaskModel:
-        """Создание задачи и отправка в очередь"""
+            .where(
+                TaskModel.id == task_id,
+                TaskModel.status.in_(ACTIVE_STATUSES),
+                or_(
+                    TaskModel.status != TaskStatus.IN_PROGRESS,
+                    TaskModel.scheduled_at.is_(None),
+                    TaskModel.scheduled_at <= now
+                )
+            )
+            .with_for_update()
+        )).one_or_none()
+        if row is None:
+            await self.db.commit()
+            return None
+        
         task = TaskModel(
-            name=task_data.name,
-            description=task_data.description,
-            priority=task_data.priority,
-            status=TaskStatus.NEW
+            id=row.id,
+            status=TaskStatus.IN_PROGRESS,
+            priority=row.priority,
+            task_type=row.task_type,
+            payload=row.payload,
+            timeout_seconds=row.timeout_seconds,
+            retry_count=row.retry_count + (row.status == TaskStatus.IN_PROGRESS),
+            created_at=row.created_at,
+            started_at=now,
+            scheduled_at=now + claim_lease(row.timeout_seconds),
+            claim_token=uuid.uuid4().hex
         )
-        
-        self.db.add(task)
+        await self._update_rows([{
+            "id": task.id,
+            ROW_CREATED_AT: task.created_at,
+            "status": task.status,
+            "started_at": task.started_at,
+            "scheduled_at": task.scheduled_at,
+            "claim_token": task.claim_token,
+            "retry_count": task.retry_count,
+        }])
+        if row.status != TaskStatus.IN_PROGRESS:
+            await self.adjust_counters({
+                (row.status, row.priority): -1,
+                (TaskStatus.IN_PROGRESS, row.priority): 1,
+            })
+        await notify_status_changes(self.db, [(task.id, TaskStatus.IN_PROGRESS)])
         await self.db.commit()
-        await self.db.refresh(task)
-        
-        # Отправка задачи в очередь
-        await self._send_to_queue(task.id, task.priority)
-        
         return task
     
     async def get_tasks(
@@ -188,58 +427,137 @@ class TaskService:
         status: Optional[TaskStatus] = None,
         priority: Optional[str] = None,
         page: int = 1,
-        size: int = 10
-    ) -> Tuple[list[TaskModel], int]:
-        """Получение задач с фильтрацией и пагинацией"""
-        query = select(TaskModel)
+        size: int = 10,
+        cursor: Optional[str] = None,
+        total_mode: TotalMode = TotalMode.EXACT,
+        fields: Optional[Iterable[str]] = None
+    ) -> Tuple[list[TaskModel], Optional[int]]:
+        """Получение задач с фильтрацией и пагинацией.
         
-        if status:
-            query = query.where(TaskModel.status == status)
-        if priority:
-            query = query.where(TaskModel.priority == priority)
+        Если передан cursor, страница выбирается по ключу (created_at, id)
+        после курсора, а page игнорируется. total_mode определяет, чем
+        считается общее количество: точным COUNT(*), оценкой планировщика
+        или не считается вовсе (total = None). fields ограничивает
+        загружаемые колонки, чтобы не читать большие result и error_info.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        columns = projection(fields) if fields is not None else None
         
         # Подсчет общего количества
-        count_query = select(func.count()).select_from(TaskModel)
-        if status:
-            count_query = count_query.where(TaskModel.status == status)
-        if priority:
-            count_query = count_query.where(TaskModel.priority == priority)
-        
-        total = (await self.db.execute(count_query)).scalar()
+        if total_mode == TotalMode.EXACT:
+            total = await self._count_tasks(status, priority)
+        elif total_mode == TotalMode.ESTIMATE:
+            total = await self._estimate_tasks(status, priority)
+        else:
+            total = None
         
         # Пагинация
-        offset = (page - 1) * size
-        query = query.offset(offset).limit(size).order_by(TaskModel.created_at.desc())
+        query = self.list_query(status, priority)
+        if columns is not None:
+            query = query.options(columns)
+        if after:
+            query = query.where(
+                tuple_(TaskModel.created_at, TaskModel.id) < tuple_(*after)
+            )
+        else:
+            query = query.offset((page - 1) * size)
+        query = query.limit(size)
         
         result = await self.db.execute(query)
         tasks = result.scalars().all()
         
         return tasks, total
     
-    async def get_task(self, task_id: int) -> Optional[TaskModel]:
-        """Получение задачи по ID"""
+    async def _count_tasks(
+        self,
+        status: Optional[TaskStatus] = None,
+        priority: Optional[str] = None
+    ) -> int:
+        """Точное количество задач"""
+        count_query = self._apply_filters(
+            select(func.count()).select_from(TaskModel), status, priority
+        )
+        return (await self.db.execute(count_query)).scalar()
+    
+    async def _estimate_tasks(
+        self,
+        status: Optional[TaskStatus] = None,
+        priority: Optional[str] = None
+    ) -> int:
+        """Оценка количества задач по статистике планировщика PostgreSQL.
+        
+        EXPLAIN не выполняет запрос, поэтому стоимость не зависит от
+        размера таблицы. На других СУБД считается точное значение.
+        """
+        dialect = self.db.get_bind().dialect
+        if dialect.name != "postgresql":
+            return await self._count_tasks(status, priority)
+        
+        query = self._apply_filters(select(TaskModel.id), status, priority)
+        sql = query.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+        plan = (await self.db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    
+    def list_query(
+        self,
+        status: Optional[TaskStatus] = None,
+        priority: Optional[str] = None
+    ) -> Select:
+        """Запрос списка задач; порядок совпадает с индексами (..., created_at, id)"""
+        query = self._apply_filters(select(TaskModel), status, priority)
+        return query.order_by(TaskModel.created_at.desc(), TaskModel.id.desc())
+    
+    @staticmethod
+    def _apply_filters(
+        query: Select,
+        status: Optional[TaskStatus] = None,
+        priority: Optional[str] = None
+    ) -> Select:
+        if status:
+            query = query.where(TaskModel.status == status)
+        if priority:
+            query = query.where(TaskModel.priority == priority)
+        return query
+    
+    async def get_task(
+        self,
+        task_id: int,
+        fields: Optional[Iterable[str]] = None
+    ) -> Optional[TaskModel]:
+        """Получение задачи по ID, при заданных fields - только этих колонок"""
         query = select(TaskModel).where(TaskModel.id == task_id)
+        if fields is not None:
+            query = query.options(projection(fields))
         result = await self.db.execute(query)
         return result.scalar_one_or_none()
     
-    async def cancel_task(self, task_id: int) -> bool:
-        """Отмена задачи"""
-        query = select(TaskModel).where(
-            and_(
-                TaskModel.id == task_id,
-                TaskModel.status.in_([TaskStatus.NEW, TaskStatus.PENDING])
-            )
+    async def get_task_status(self, task_id: int) -> Optional[TaskStatus]:
+        """Статус задачи без загрузки остальных колонок"""
+        result = await self.db.execute(
+            select(TaskModel.status).where(TaskModel.id == task_id)
         )
-        result = await self.db.execute(query)
-        task = result.scalar_one_or_none()
+        return result.scalar_one_or_none()
+    
+    async def cancel_task(self, task_id: int) -> bool:
+        """Отмена задачи, в том числе уже выполняющейся.
         
-        if task:
-            task.status = TaskStatus.CANCELLED
-            task.completed_at = datetime.utcnow()
-            await self.db.commit()
-            return True
+        Воркеры получают уведомление об отмене через канал
+        task_cancelled и прерывают выполнение задачи.
+        """
+        applied = await self.apply_status_updates([
+            StatusUpdate(
+                task_id, TaskStatus.CANCELLED, error_info="Task cancelled by user"
+            )
+        ])
+        if not applied[0]:
+            return False
         
-        return False
+        # Уведомление доставляется слушателям только после commit
+        await notify(self.db, TASK_CANCELLED_CHANNEL, str(task_id))
+        await self.db.commit()
+        return True
     
     async def update_task_status(
         self,
@@ -249,53 +567,195 @@ class TaskService:
         error_info: Optional[str] = None
     ) -> bool:
         """Обновление статуса задачи"""
-        update_data = {"status": status}
+        applied = await self.apply_status_updates([
+            StatusUpdate(task_id, status, result=result, error_info=error_info)
+        ])
+        await self.db.commit()
         
-        if status == TaskStatus.IN_PROGRESS:
-            update_data["started_at"] = datetime.utcnow()
-        elif status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
-            update_data["completed_at"] = datetime.utcnow()
+        return applied[0]
+    
+    async def apply_status_updates(self, updates: list["StatusUpdate"]) -> list[bool]:
+        """Применение пакета переходов статусов в текущей транзакции.
         
-        if result:
-            update_data["result"] = result
-        if error_info:
-            update_data["error_info"] = error_info
+        Переходы одной задачи применяются в порядке поступления, недопустимые
+        (например, завершение уже отмененной задачи) пропускаются. Применимые
+        переходы задачи сливаются в одну строку, все строки записываются одним
+        bulk UPDATE по первичному ключу (id, created_at). Commit остается за вызывающим кодом.
         
-        stmt = (
-            update(TaskModel)
-            .where(TaskModel.id == task_id)
-            .values(**update_data)
+        Возвращает для каждого перехода признак того, что он применен.
+        """
+        task_ids = sorted({status_update.task_id for status_update in updates})
+        if not task_ids:
+            return []
+        
+        # Задачи с известным created_at ищутся только в своих секциях
+        created = {
+            status_update.task_id: status_update.created_at
+            for status_update in updates
+            if status_update.created_at is not None
+        }
+        unpinned = [task_id for task_id in task_ids if task_id not in created]
+        conditions = []
+        if created:
+            conditions.append(and_(
+                TaskModel.id.in_(sorted(created)),
+                TaskModel.created_at.in_(set(created.values()))
+            ))
+        if unpinned:
+            conditions.append(TaskModel.id.in_(unpinned))
+        
+        # Блокируем строки до конца транзакции в едином порядке, чтобы
+        # конкурентные обновления тех же задач применялись в порядке фиксации
+        query = (
+            select(
+                TaskModel.id, TaskModel.status, TaskModel.priority,
+                TaskModel.created_at, TaskModel.claim_token
+            )
+            .where(or_(*conditions))
+            .order_by(TaskModel.id)
+            .with_for_update()
         )
-        result = await self.db.execute(stmt)
-        await self.db.commit()
+        locked = (await self.db.execute(query)).all()
+        existing = {row.id: (row.status, row.priority, row.created_at) for row in locked}
+        claim_tokens = {row.id: row.claim_token for row in locked}
         
-        return result.rowcount > 0
-    
-    async def _send_to_queue(self, task_id: int, priority: TaskPriority):
-        """Отправка задачи в очередь RabbitMQ"""
-        connection = await aio_pika.connect_robust(settings.rabbitmq_url)
-        async with connection:
-            channel = await connection.channel()
-            
-            # Создаем очередь с приоритетами
-            await channel.declare_queue(
-                "task_queue",
-                durable=True,
-                arguments={"x-max-priority": 10}
+        current = {task_id: status for task_id, (status, _, _) in existing.items()}
+        rows: dict[int, dict] = {}
+        stored_results: dict[int, StoredResult] = {}
+        applied = []
+        for status_update in updates:
+            task_id = status_update.task_id
+            if (
+                task_id not in current
+                or current[task_id] not in ALLOWED_TRANSITIONS[status_update.status]
+                or (
+                    status_update.claim_token is not None
+                    and status_update.claim_token != claim_tokens[task_id]
+                )
+            ):
+                applied.append(False)
+                continue
+            if (
+                status_update.result is not None
+                and len(status_update.result) > settings.task_result_inline_limit
+            ):
+                # Воркер готовит большие результаты заранее; здесь остаются
+                # только обновления из других источников
+                status_update.stored_result = pack_result(status_update.result)
+            if status_update.stored_result is not None:
+                stored_results[task_id] = status_update.stored_result
+            rows.setdefault(
+                task_id, {"id": task_id, ROW_CREATED_AT: existing[task_id][2]}
+            ).update(status_update.values())
+            current[task_id] = status_update.status
+            applied.append(True)
+        
+        deltas: dict[tuple[TaskStatus, TaskPriority], int] = defaultdict(int)
+        for task_id in rows:
+            old_status, priority, _ = existing[task_id]
+            deltas[(old_status, priority)] -= 1
+            deltas[(current[task_id], priority)] += 1
+        
+        if rows:
+            await self._update_rows(list(rows.values()))
+            await self.adjust_counters(deltas)
+            await self._store_results(stored_results)
+            # Кэши чтений в процессах API узнают о переходах после commit
+            await notify_status_changes(
+                self.db, [(task_id, current[task_id]) for task_id in rows]
             )
-            
-            message_body = json.dumps({"task_id": task_id})
-            priority_map = {
-                TaskPriority.LOW: 1,
-                TaskPriority.MEDIUM: 5,
-                TaskPriority.HIGH: 10
+        
+        return applied
+    
+    async def _update_rows(self, rows: list[dict]):
+        """Bulk UPDATE строк задач по (id, created_at).
+        
+        Условие только по id проверяет все секции tasks; created_at из
+        ROW_CREATED_AT оставляет одну. С дополнительным условием SQLAlchemy
+        не обновляет загруженные в сессию объекты, это делается здесь.
+        """
+        await self.db.execute(
+            update(TaskModel)
+            .where(TaskModel.created_at == bindparam(ROW_CREATED_AT))
+            .execution_options(synchronize_session=None),
+            rows
+        )
+        for row in rows:
+            task = self.db.identity_map.get(identity_key(TaskModel, row["id"]))
+            if task is None:
+                continue
+            for key, value in row.items():
+                if key not in ("id", ROW_CREATED_AT):
+                    set_committed_value(task, key, value)
+    
+    async def _store_results(self, stored_results: dict[int, StoredResult]):
+        """Запись больших результатов в task_results"""
+        if not stored_results:
+            return
+        values = [
+            {
+                "task_id": task_id,
+                "content": stored.content,
+                "encoding": stored.encoding,
+                "size": stored.size,
+            }
+            for task_id, stored in sorted(stored_results.items())
+        ]
+        if self.db.get_bind().dialect.name == "sqlite":
+            stmt = sqlite_insert(TaskResult)
+        else:
+            stmt = pg_insert(TaskResult)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TaskResult.task_id],
+            set_={
+                "content": stmt.excluded.content,
+                "encoding": stmt.excluded.encoding,
+                "size": stmt.excluded.size,
+                # Новая версия: поток, начатый по старой, ее не смешает
+                "created_at": utcnow(),
+            }
+        )
+        await self.db.execute(stmt, values)
+    
+    async def adjust_counters(
+        self, deltas: dict[tuple[TaskStatus, TaskPriority], int]
+    ):
+        """Изменение счетчиков задач в текущей транзакции"""
+        values = [
+            {
+                "status": status,
+                "priority": priority,
+                "shard": random.randrange(settings.task_counter_shards),
+                "count": delta,
             }
-            
-            await channel.default_exchange.publish(
-                aio_pika.Message(
-                    body=message_body.encode(),
-                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
-                    priority=priority_map[priority]
-                ),
-                routing_key="task_queue"
+            # Единый порядок строк исключает взаимные блокировки транзакций
+            for (status, priority), delta in sorted(deltas.items())
+            if delta and status is not None and priority is not None
+        ]
+        if not values:
+            return
+        
+        if self.db.get_bind().dialect.name == "sqlite":
+            stmt = sqlite_insert(TaskCounter).values(values)
+        else:
+            stmt = pg_insert(TaskCounter).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TaskCounter.status, TaskCounter.priority, TaskCounter.shard],
+            set_={"count": TaskCounter.count + stmt.excluded.count}
+        )
+        await self.db.execute(stmt)
+    
+    async def get_stats(self) -> list[tuple[TaskStatus, TaskPriority, int]]:
+        """Количество задач по статусу и приоритету из счетчиков"""
+        query = (
+            select(
+                TaskCounter.status,
+                TaskCounter.priority,
+                func.sum(TaskCounter.count)
             )
+            .group_by(TaskCounter.status, TaskCounter.priority)
+            .having(func.sum(TaskCounter.count) != 0)
+            .order_by(TaskCounter.status, TaskCounter.priority)
+        )
+        result = await self.db.execute(query)
+        return [(status, priority, int(count)) for status, priority, count in result]
@@ -1,91 +1,643 @@
 import asyncio
+import contextlib
 import json
-import aio_pika
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+from prometheus_client import start_http_server
 
 from src.core.config import settings
-from src.models.task import TaskStatus
-from src.services.task_service import TaskService
-import random
+from src.core.database import AsyncSessionLocal, close_db, engine
+from src.core.metrics import (
+    TASK_EXECUTION, TASK_FAILURES, TASK_QUEUE_WAIT, TASKS_DEFERRED,
+    TASKS_IN_FLIGHT, UNKNOWN_TASK_TYPE, instrument_engine
+)
+from src.models.task import Task, TaskStatus
+from src.services.broker import (
+    BrokerMessage, MemoryBroker, retry_delay_ms, task_queues
+)
+from src.services.executors import ExecutionBackend, TaskExecutor, TaskTimeoutError
+from src.services.handlers import (
+    HandlerRegistry, InvalidTaskError, TaskExecutionError, TaskHandler, registry
+)
+from src.services.notifications import (
+    TASK_CANCELLED_CHANNEL, TASK_CREATED_CHANNEL, NotificationListener
+)
+from src.services.publisher import publisher
+from src.services.results import pack_result
+from src.services.scheduler import WeightedScheduler
+from src.services.status_sink import StatusSink
+from src.services.task_service import (
+    DispatchMode, TaskService, claim_lease, dispatch_mode
+)
+
+
+# Сколько последних отмененных задач помнит воркер
+CANCELLED_IDS_LIMIT = 10000
+
+
+class TaskCancelledError(Exception):
+    """Задача отменена пользователем во время выполнения"""
+
+
+def _serialize_result(result: Any) -> Optional[str]:
+    """Результат обработчика в виде текста для колонки result"""
+    if result is None or isinstance(result, str):
+        return result
+    return json.dumps(result, default=str)
+
+
+def _queue_wait(created_at: Optional[datetime]) -> float:
+    """Секунды от создания задачи до текущего момента"""
+    if created_at is None:
+        return 0.0
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return max((datetime.now(timezone.utc) - created_at).total_seconds(), 0.0)
+
+
+class WorkerSlot:
+    """Занятый задачей слот воркера, который можно временно вернуть"""
+    
+    def __init__(self, semaphore: asyncio.Semaphore):
+        self._semaphore = semaphore
+        self.held = True
+    
+    def release(self):
+        if self.held:
+            self.held = False
+            self._semaphore.release()
+    
+    async def acquire(self):
+        await self._semaphore.acquire()
+        self.held = True
 
 
 class TaskWorker:
-    def __init__(self):
-        self.db_engine = create_async_engine(settings.database_url)
-        self.async_session = async_sessionmaker(
-            self.db_engine, expire_on_commit=False
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        handlers: Optional[HandlerRegistry] = None,
+        embedded: bool = False
+    ):
+        # Общий движок процесса; размер пула считается от WORKERS_NUM
+        self.async_session = AsyncSessionLocal
+        # Количество одновременно выполняемых задач в одном процессе воркера
+        self.concurrency = concurrency or settings.workers_num
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._in_flight: set[asyncio.Task] = set()
+        self.handlers = handlers or registry
+        # Бэкенды из TASK_EXECUTORS переопределяют объявленные обработчиками
+        self.executor = TaskExecutor(backends={
+            **self.handlers.backends(),
+            **{
+                task_type: ExecutionBackend(backend)
+                for task_type, backend in settings.task_executors.items()
+            },
+        })
+        # Лимиты параллелизма по типам задач и число задач, ждущих слот типа
+        self._type_slots: dict[str, asyncio.Semaphore] = {}
+        self._type_waiting: dict[str, int] = defaultdict(int)
+        self.status_sink = StatusSink(self.async_session)
+        # Повторы и dead letter публикуются через пул каналов издателя
+        self.publisher = publisher
+        # Выполняющиеся задачи по id, чтобы прервать их при отмене
+        self._running: dict[int, asyncio.Future] = {}
+        self._cancelled: OrderedDict[int, None] = OrderedDict()
+        self.listener = NotificationListener()
+        self.listener.subscribe(TASK_CANCELLED_CHANNEL, self._on_cancelled)
+        self.dispatch_mode = dispatch_mode()
+        # Воркер внутри процесса API: брокер и пул соединений запускает и
+        # закрывает lifespan приложения, а не воркер
+        self.embedded = embedded
+        self._stopping = asyncio.Event()
+        # Новые задачи в режиме database будят цикл захвата; после
+        # переподключения слушателя таблица проверяется сразу
+        self._claim_wakeup = asyncio.Event()
+        if self.dispatch_mode == DispatchMode.DATABASE:
+            self.listener.subscribe(
+                TASK_CREATED_CHANNEL, lambda payload: self._claim_wakeup.set()
+            )
+            self.listener.on_connect(self._claim_wakeup.set)
+    
+    def _on_cancelled(self, payload: str):
+        """Уведомление об отмене задачи через DELETE /tasks/{id}"""
+        try:
+            task_id = int(payload)
+        except ValueError:
+            return
+        self._cancelled[task_id] = None
+        self._cancelled.move_to_end(task_id)
+        while len(self._cancelled) > CANCELLED_IDS_LIMIT:
+            self._cancelled.popitem(last=False)
+        
+        running = self._running.get(task_id)
+        if running is not None:
+            running.cancel()
+    
+    @contextlib.asynccontextmanager
+    async def _type_slot(
+        self, handler: TaskHandler, worker_slot: Optional["WorkerSlot"] = None
+    ):
+        """Слот выполнения типа задачи, если для типа задан лимит.
+        
+        Пока слоты типа заняты, задача ждет, вернув слот воркера: иначе
+        очередь медленного типа заняла бы все слоты и остановила остальные
+        типы. Слот воркера берется снова, когда освободился слот типа.
+        Сколько задач может ждать, ограничивает _type_saturated.
+        """
+        if handler.concurrency is None:
+            yield
+            return
+        type_slot = self._type_slot_of(handler)
+        
+        self._type_waiting[handler.task_type] += 1
+        try:
+            if worker_slot is not None and type_slot.locked():
+                worker_slot.release()
+                await type_slot.acquire()
+                try:
+                    await worker_slot.acquire()
+                except BaseException:
+                    type_slot.release()
+                    raise
+            else:
+                await type_slot.acquire()
+        finally:
+            self._type_waiting[handler.task_type] -= 1
+        try:
+            yield
+        finally:
+            type_slot.release()
+    
+    def _type_slot_of(self, handler: TaskHandler) -> asyncio.Semaphore:
+        if handler.task_type not in self._type_slots:
+            self._type_slots[handler.task_type] = asyncio.Semaphore(
+                handler.concurrency
+            )
+        return self._type_slots[handler.task_type]
+    
+    def _type_saturated(self, handler: TaskHandler) -> bool:
+        """Слоты типа заняты, и слот уже ждут столько задач, сколько их
+        выполняется: следующую задачу типа нужно отложить.
+        
+        Ждущая задача держит неподтвержденное сообщение или захват в tasks;
+        без предела задачи медленного типа выбрали бы весь prefetch, и
+        сообщения других типов из той же очереди не доходили бы до воркера.
+        """
+        if handler.concurrency is None:
+            return False
+        return (
+            self._type_slot_of(handler).locked()
+            and self._type_waiting[handler.task_type] >= handler.concurrency
+        )
+    
+    async def _execute(
+        self, task_id: int, handler: TaskHandler, argument: Any, timeout: float
+    ):
+        """Выполнение обработчика с возможностью отмены по уведомлению"""
+        execution = asyncio.ensure_future(
+            self.executor.run(
+                handler.task_type, handler.func, argument, timeout=timeout
+            )
         )
+        self._running[task_id] = execution
+        try:
+            await asyncio.wait({execution})
+        except asyncio.CancelledError:
+            execution.cancel()
+            raise
+        finally:
+            self._running.pop(task_id, None)
+        
+        if execution.cancelled():
+            raise TaskCancelledError(task_id)
+        return execution.result()
     
-    async def process_task(self, task_id: int):
-        """Обработка задачи (имитация длительной операции)"""
+    async def process_task(
+        self, task_id: int, worker_slot: Optional[WorkerSlot] = None
+    ):
+        """Обработка задачи на бэкенде выполнения ее типа.
+        
+        Задача захватывается так же, как в режиме database: повторно
+        доставленное сообщение о задаче, которую уже выполняет другой воркер,
+        подтверждается без выполнения.
+        """
         async with self.async_session() as db:
             task_service = TaskService(db)
+            task = await task_service.start_task(task_id)
+            running = None
+            if task is None:
+                running = await task_service.get_task(
+                    task_id, fields=("status", "priority", "task_type")
+                )
+        if task is not None:
+            await self._run_task(task, task.claim_token, worker_slot)
+        elif running is not None and running.status == TaskStatus.IN_PROGRESS:
+            # Сообщение остановившегося воркера брокер возвращает раньше, чем
+            # истекает срок захвата: отложенная копия проверит задачу снова,
+            # и после срока ее заберет живой воркер. Завершенная к тому
+            # времени задача не выполняется
+            await self.publisher.publish_retry(
+                task_id, running.priority, settings.task_max_retries,
+                running.task_type
+            )
+    
+    async def _run_task(
+        self,
+        task: Task,
+        claim_token: str,
+        worker_slot: Optional[WorkerSlot] = None
+    ):
+        """Выполнение захваченной задачи.
+        
+        Задача уже в IN_PROGRESS; ее статусы записываются только пока захват
+        с claim_token не перехвачен.
+        """
+        task_id = task.id
+        timeout = task.timeout_seconds or settings.task_timeout_seconds
+        
+        if task.retry_count > settings.task_max_retries:
+            # Каждый перехват по истекшему сроку - попытка: задача,
+            # роняющая воркер, не захватывается бесконечно
+            await self._fail(
+                task,
+                f"Task {task_id} claim lease expired after "
+                f"{settings.task_max_retries} retries",
+                claim_token
+            )
+            return
+        
+        handler = None
+        try:
+            handler = self.handlers.get(task.task_type)
+            argument = handler.parse_payload(task.payload)
+        except InvalidTaskError as e:
+            # Повтор не поможет: задача сразу уходит в dead letter
+            label = handler.task_type if handler is not None else UNKNOWN_TASK_TYPE
+            TASK_FAILURES.labels(label, "invalid").inc()
+            await self._fail(task, str(e), claim_token)
+            return
+        
+        if self._type_saturated(handler):
+            await self._defer(task, handler, claim_token)
+            return
+        
+        started = time.perf_counter()
+        try:
+            # Медленный тип не занимает больше своего лимита слотов
+            async with self._type_slot(handler, worker_slot):
+                if not await self._renew_lease(task, claim_token):
+                    # Пока задача ждала слот своего типа, срок захвата истек
+                    # и ее забрал другой воркер, либо ее отменили
+                    return
+                TASK_QUEUE_WAIT.labels(handler.task_type).observe(
+                    _queue_wait(task.created_at)
+                )
+                started = time.perf_counter()
+                with TASKS_IN_FLIGHT.labels(handler.task_type).track_inprogress():
+                    result = await self._execute(task_id, handler, argument, timeout)
+        except TaskCancelledError:
+            # Статус CANCELLED уже записан в базу обработчиком DELETE
+            self._observe_execution(handler, "cancelled", started)
+            return
+        except TaskTimeoutError as e:
+            # Зависшая задача скорее всего зависнет снова и займет слот еще
+            # на таймаут: повтор не выполняется
+            self._observe_execution(handler, "failed", started)
+            TASK_FAILURES.labels(handler.task_type, "timeout").inc()
+            await self._fail(task, f"Task {task_id} {e}", claim_token)
+            return
+        except TaskExecutionError as e:
+            error_info = str(e)
+            reason = "error"
+        except Exception as e:
+            error_info = f"Task {task_id} failed: {str(e)}"
+            reason = "exception"
+        else:
+            self._observe_execution(handler, "completed", started)
+            result = _serialize_result(result)
+            stored_result = None
+            if result is not None and len(result) > settings.task_result_inline_limit:
+                # Большой результат сжимается вне event loop и пишется
+                # в task_results, а не в строку задачи
+                stored_result = await asyncio.to_thread(pack_result, result)
+                result = None
+            # Сообщение подтверждается только после записи итогового статуса
+            await self.status_sink.record(
+                task_id,
+                TaskStatus.COMPLETED,
+                result=result,
+                stored_result=stored_result,
+                created_at=task.created_at,
+                claim_token=claim_token
+            )
+            return
+        
+        self._observe_execution(handler, "failed", started)
+        TASK_FAILURES.labels(handler.task_type, reason).inc()
+        await self._retry_or_fail(task, error_info, claim_token)
+    
+    @staticmethod
+    def _observe_execution(handler: TaskHandler, outcome: str, started: float):
+        TASK_EXECUTION.labels(handler.task_type, outcome).observe(
+            time.perf_counter() - started
+        )
+    
+    async def _renew_lease(self, task: Task, claim_token: str) -> bool:
+        """Продление срока захвата перед выполнением.
+        
+        Срок отсчитывается от захвата, а задача могла ждать слот своего типа.
+        Если прошло больше половины запаса, срок продлевается на полное время
+        выполнения; False, если захват уже перехвачен или задача отменена.
+        """
+        now = datetime.now(timezone.utc)
+        grace = timedelta(seconds=settings.task_claim_lease_grace_seconds)
+        if now - task.started_at < grace / 2:
+            return True
+        return await self.status_sink.record(
+            task.id,
+            TaskStatus.IN_PROGRESS,
+            scheduled_at=now + claim_lease(task.timeout_seconds),
+            created_at=task.created_at,
+            claim_token=claim_token
+        )
+    
+    async def _defer(
+        self, task: Task, handler: TaskHandler, claim_token: Optional[str] = None
+    ):
+        """Возврат задачи насыщенного типа в очередь без траты попытки.
+        
+        Задача возвращается в PENDING со scheduled_at; в режиме broker
+        сообщение подтверждается после публикации отложенной копии.
+        """
+        TASKS_DEFERRED.labels(handler.task_type).inc()
+        delay = timedelta(milliseconds=settings.task_retry_base_delay_ms)
+        applied = await self.status_sink.record(
+            task.id,
+            TaskStatus.PENDING,
+            scheduled_at=datetime.now(timezone.utc) + delay,
+            created_at=task.created_at,
+            claim_token=claim_token
+        )
+        if applied and self.dispatch_mode == DispatchMode.BROKER:
+            # Задержка первой попытки; retry_count задачи не меняется
+            await self.publisher.publish_retry(
+                task.id, task.priority, 1, task.task_type
+            )
+    
+    async def _retry_or_fail(
+        self, task: Task, error_info: str, claim_token: Optional[str] = None
+    ):
+        """Отложенный повтор упавшей задачи или FAILED после всех попыток"""
+        if task.retry_count < settings.task_max_retries:
+            attempt = task.retry_count + 1
+            if self.dispatch_mode == DispatchMode.DATABASE:
+                # Задачу снова заберет цикл захвата, когда наступит scheduled_at
+                await self.status_sink.record(
+                    task.id,
+                    TaskStatus.PENDING,
+                    error_info=error_info,
+                    retry_count=attempt,
+                    scheduled_at=datetime.now(timezone.utc) + timedelta(
+                        milliseconds=retry_delay_ms(attempt)
+                    ),
+                    created_at=task.created_at,
+                    claim_token=claim_token
+                )
+                return
+            applied = await self.status_sink.record(
+                task.id,
+                TaskStatus.PENDING,
+                error_info=error_info,
+                retry_count=attempt,
+                created_at=task.created_at,
+                claim_token=claim_token
+            )
+            # Отмененную или перехваченную задачу не повторяем
+            if applied:
+                await self.publisher.publish_retry(
+                    task.id, task.priority, attempt, task.task_type
+                )
+            return
+        
+        await self._fail(task, error_info, claim_token)
+    
+    async def _fail(
+        self, task: Task, error_info: str, claim_token: Optional[str] = None
+    ):
+        """Статус FAILED и копия сообщения в dead letter"""
+        applied = await self.status_sink.record(
+            task.id,
+            TaskStatus.FAILED,
+            error_info=error_info,
+            created_at=task.created_at,
+            claim_token=claim_token
+        )
+        # В режиме database задачи FAILED в tasks и есть dead letter
+        if applied and self.dispatch_mode == DispatchMode.BROKER:
+            await self.publisher.publish_dead(
+                json.dumps({"task_id": task.id}).encode(), error_info
+            )
+    
+    async def handle_message(
+        self, message: BrokerMessage, worker_slot: Optional[WorkerSlot] = None
+    ):
+        """Обработка одного сообщения; ack отправляется по завершении задачи"""
+        # Если итоговый статус не записан, сообщение возвращается в очередь
+        async with message.process(requeue=True):
+            try:
+                task_data = json.loads(message.body.decode())
+                task_id = task_data["task_id"]
+            except (ValueError, KeyError) as e:
+                # Битое сообщение не повторяется, а уходит в dead letter
+                print(f"Error processing message: {e}")
+                TASK_FAILURES.labels(UNKNOWN_TASK_TYPE, "bad_message").inc()
+                await self.publisher.publish_dead(message.body, str(e))
+                return
             
-            # Обновляем статус на IN_PROGRESS
-            await task_service.update_task_status(task_id, TaskStatus.IN_PROGRESS)
+            if task_id in self._cancelled:
+                return
             
+            # Обрабатываем задачу
             try:
-                # Имитация обработки задачи
-                await asyncio.sleep(random.uniform(1, 5))
-                
-                # 90% успеха, 10% ошибки для демонстрации
-                if random.random() < 0.9:
-                    result = f"Task {task_id} completed successfully"
-                    await task_service.update_task_status(
-                        task_id,
-                        TaskStatus.COMPLETED,
-                        result=result
-                    )
-                else:
-                    error_info = f"Task {task_id} failed due to random error"
-                    await task_service.update_task_status(
-                        task_id,
-                        TaskStatus.FAILED,
-                        error_info=error_info
-                    )
-                    
-            except Exception as e:
-                error_info = f"Task {task_id} failed: {str(e)}"
-                await task_service.update_task_status(
-                    task_id,
-                    TaskStatus.FAILED,
-                    error_info=error_info
-                )
+                await self.process_task(task_id, worker_slot)
+            except Exception:
+                # Сообщение возвращается в очередь не сразу: иначе при
+                # недоступной базе или брокере (в том числе когда PENDING уже
+                # записан, а повтор не опубликован) доставка крутится вхолостую
+                await asyncio.sleep(settings.task_retry_base_delay_ms / 1000)
+                raise
+    
+    async def _run_message(self, message: BrokerMessage):
+        # Слот воркера занят циклом потребления до запуска задачи
+        worker_slot = WorkerSlot(self._semaphore)
+        try:
+            await self.handle_message(message, worker_slot)
+        except Exception as e:
+            print(f"Error processing message: {e}")
+        finally:
+            worker_slot.release()
     
     async def consume_tasks(self):
-        """Потребление задач из очереди"""
-        connection = await aio_pika.connect_robust(settings.rabbitmq_url)
+        """Потребление задач из очередей с ограниченным параллелизмом.
         
-        async with connection:
-            channel = await connection.channel()
-            await channel.set_qos(prefetch_count=1)
-            
-            queue = await channel.declare_queue(
-                "task_queue",
-                durable=True,
-                arguments={"x-max-priority": 10}
-            )
-            
-            async for message in queue:
-                async with message.process():
-                    try:
-                        task_data = json.loads(message.body.decode())
-                        task_id = task_data["task_id"]
-                        
-                        # Обновляем статус на PENDING перед обработкой
-                        async with self.async_session() as db:
-                            task_service = TaskService(db)
-                            await task_service.update_task_status(
-                                task_id, TaskStatus.PENDING
-                            )
-                        
-                        # Обрабатываем задачу
-                        await self.process_task(task_id)
-                        
-                    except Exception as e:
-                        print(f"Error processing message: {e}")
+        Каждая очередь читается отдельным потребителем брокера, свободный
+        слот получает следующее сообщение, выбранное по весам очередей.
+        """
+        queues = task_queues()
+        scheduler = WeightedScheduler(queues)
+        # Любая очередь может занять все слоты воркера, если остальные
+        # простаивают или заняты медленными типами: доля по весу ограничила бы
+        # быстрый тип, пока слоты свободны. Сверх слотов - запас на задачи,
+        # ждущие слот своего типа: их не больше лимита типа
+        prefetch = self.concurrency + sum(self.handlers.limits().values())
+        feeders = [
+            asyncio.create_task(self._feed(name, prefetch, scheduler))
+            for name in queues
+        ]
+        
+        # После stop() очереди закрываются, буферизованные сообщения
+        # дорабатываются, и цикл завершается
+        feeders.append(asyncio.create_task(self._close_on_stop(feeders)))
+        
+        try:
+            while True:
+                await self._semaphore.acquire()
+                message = await scheduler.get()
+                if message is None:
+                    self._semaphore.release()
+                    break
+                task = asyncio.create_task(self._run_message(message))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+        finally:
+            for feeder in feeders:
+                feeder.cancel()
+            # Дожидаемся выполняющихся задач, пока потребитель открыт для ack
+            await self.drain()
+    
+    async def _close_on_stop(self, feeders: list[asyncio.Task]):
+        await self._stopping.wait()
+        for feeder in feeders:
+            if feeder is not asyncio.current_task():
+                feeder.cancel()
+    
+    async def _feed(self, name: str, prefetch: int, scheduler: WeightedScheduler):
+        """Передача сообщений очереди планировщику"""
+        try:
+            async for message in self.publisher.consume(name, prefetch):
+                scheduler.put(name, message)
+        except Exception as e:
+            print(f"Error consuming queue {name}: {e}")
+        finally:
+            scheduler.close(name)
+    
+    async def claim_tasks(self):
+        """Захват задач из таблицы tasks (TASK_DISPATCH_MODE=database).
+        
+        Свободные слоты забирают готовые задачи одним запросом. Когда задачи
+        кончились, цикл ждет NOTIFY task_created или опрашивает таблицу раз
+        в TASK_CLAIM_POLL_INTERVAL_MS: так подхватываются отложенные повторы
+        и задачи воркеров, не уложившихся в срок захвата.
+        """
+        poll_interval = settings.task_claim_poll_interval_ms / 1000
+        try:
+            while not self._stopping.is_set():
+                await self._semaphore.acquire()
+                slots = 1
+                while slots < self.concurrency and not self._semaphore.locked():
+                    await self._semaphore.acquire()
+                    slots += 1
+                
+                # Уведомление, пришедшее во время захвата, не теряется
+                self._claim_wakeup.clear()
+                try:
+                    async with self.async_session() as db:
+                        tasks = await TaskService(db).claim_tasks(slots)
+                except Exception as e:
+                    print(f"Error claiming tasks: {e}")
+                    tasks = []
+                
+                for _ in range(slots - len(tasks)):
+                    self._semaphore.release()
+                for task in tasks:
+                    running = asyncio.create_task(self._run_claimed(task))
+                    self._in_flight.add(running)
+                    running.add_done_callback(self._in_flight.discard)
+                
+                if len(tasks) < slots:
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(
+                            self._claim_wakeup.wait(), poll_interval
+                        )
+        finally:
+            await self.drain()
+    
+    async def _run_claimed(self, task: Task):
+        # Слот воркера занят циклом захвата до запуска задачи
+        worker_slot = WorkerSlot(self._semaphore)
+        try:
+            # Отмененная после захвата задача уже в статусе CANCELLED
+            if task.id in self._cancelled:
+                return
+            await self._run_task(task, task.claim_token, worker_slot)
+        except Exception as e:
+            # Задачу заберет другой воркер, когда истечет срок захвата
+            print(f"Error processing task {task.id}: {e}")
+        finally:
+            worker_slot.release()
+    
+    def stop(self):
+        """Остановка run() без отмены.
+        
+        Новые задачи не берутся, выполняющиеся дорабатывают, после чего
+        run() закрывает ресурсы воркера и возвращается.
+        """
+        self._stopping.set()
+        self._claim_wakeup.set()
+    
+    async def drain(self):
+        """Ожидание завершения всех выполняющихся задач"""
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
     
     async def run(self):
         """Запуск воркера"""
-        print("Task worker started...")
-        await self.consume_tasks()
+        if (
+            self.dispatch_mode == DispatchMode.BROKER
+            and isinstance(self.publisher, MemoryBroker)
+            and not self.publisher.started
+        ):
+            # Очереди в памяти общие только с API того же процесса, который
+            # запускает брокер в lifespan: отдельный воркер молча простаивал бы
+            raise RuntimeError(
+                "BROKER=memory requires the worker to run inside the API process"
+            )
+        print(
+            f"Task worker started (concurrency={self.concurrency}, "
+            f"dispatch={self.dispatch_mode.value})..."
+        )
+        instrument_engine(engine)
+        if settings.worker_metrics_port:
+            # Метрики воркера забираются Prometheus с отдельного порта
+            start_http_server(settings.worker_metrics_port)
+        await self.status_sink.start()
+        # В режиме database брокер не нужен: задачи, повторы и dead letter
+        # живут в таблице tasks
+        if self.dispatch_mode == DispatchMode.BROKER and not self.embedded:
+            await self.publisher.start()
+        await self.listener.start()
+        try:
+            if self.dispatch_mode == DispatchMode.DATABASE:
+                await self.claim_tasks()
+            else:
+                await self.consume_tasks()
+        finally:
+            await self.listener.close()
+            await self.status_sink.close()
+            self.executor.shutdown()
+            if not self.embedded:
+                await self.publisher.close()
+                await close_db()
@@ -1,6 +1,9 @@
 import pytest
 import asyncio
-from typing import AsyncGenerator, Generator
+import contextlib
+from datetime import datetime, timezone
+from typing import AsyncGenerator, Callable, Dict, Generator
+from unittest.mock import AsyncMock, MagicMock, patch
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import NullPool
@@ -9,10 +12,13 @@ from src.main import app
 from src.core.database import get_db
 from src.models.task import Base
 from src.core.config import settings
+from src.models.task import Task
+from src.services.task_service import TaskService
+from src.services.worker import TaskWorker
 
 
 # Тестовая база данных
-TEST_DATABASE_URL = settings.async_database_url.replace("taskdb", "taskdb_test")
+TEST_DATABASE_URL = settings.database_url.replace("taskdb", "taskdb_test")
 
 # Асинхронный движок для тестов
 test_engine = create_async_engine(TEST_DATABASE_URL, poolclass=NullPool)
@@ -77,3 +83,68 @@ async def test_task(client: AsyncClient) -> dict:
     
     response = await client.post("/api/v1/tasks", json=task_data)
     return response.json()
+
+
+@pytest.fixture(scope="function")
+def session_factory() -> async_sessionmaker:
+    """Фикстура для фабрики сессий тестовой БД"""
+    return TestAsyncSessionLocal
+
+
+@pytest.fixture(scope="function")
+def no_session() -> Callable:
+    """Фикстура для фабрики сессий воркера, не обращающейся к БД"""
+    @contextlib.asynccontextmanager
+    async def session():
+        yield None
+    
+    return session
+
+
+@pytest.fixture(scope="function")
+def status_sink() -> MagicMock:
+    """Фикстура для записи статусов, сразу подтверждающей каждый переход"""
+    def record(*args, **kwargs):
+        applied = asyncio.get_running_loop().create_future()
+        applied.set_result(True)
+        return applied
+    
+    sink = MagicMock()
+    sink.record.side_effect = record
+    return sink
+
+
+@pytest.fixture(scope="function")
+def claimable_tasks() -> Generator[Dict[int, Task], None, None]:
+    """Фикстура для задач, которые воркер захватывает без БД"""
+    tasks: Dict[int, Task] = {}
+    
+    async def start_task(self, task_id):
+        task = tasks.get(task_id)
+        if task is not None:
+            task.claim_token = "claim"
+            task.started_at = datetime.now(timezone.utc)
+        return task
+    
+    with patch.object(TaskService, "start_task", start_task):
+        yield tasks
+
+
+@pytest.fixture(scope="function")
+def make_worker(
+    no_session: Callable, status_sink: MagicMock
+) -> Generator[Callable[..., TaskWorker], None, None]:
+    """Фикстура для создания воркеров без БД и брокера"""
+    workers = []
+    
+    def make(**kwargs) -> TaskWorker:
+        worker = TaskWorker(**kwargs)
+        worker.async_session = no_session
+        worker.status_sink = status_sink
+        worker.publisher = AsyncMock()
+        workers.append(worker)
+        return worker
+    
+    yield make
+    for worker in workers:
+        worker.executor.shutdown()
@@ -51,6 +51,24 @@ async def test_create_task():
     assert data["status"] == "NEW"
 
 
+@pytest.mark.asyncio
+async def test_create_task_with_unknown_type():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post(
+            "/api/v1/tasks/",
+            json={"name": "Test Task", "task_type": "missing"}
+        )
+        batch = await ac.post("/api/v1/tasks/batch", json={"tasks": [
+            {"name": "Task 0"},
+            {"name": "Task 1", "task_type": "missing"},
+        ]})
+    
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Unknown task type: missing"
+    # Пакет с неизвестным типом не создается частично
+    assert batch.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_get_tasks():
     async with AsyncClient(app=app, base_url="http://test") as ac:
@@ -67,3 +85,154 @@ async def test_get_tasks():
     data = response.json()
     assert len(data["tasks"]) == 1
     assert data["total"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_with_cursor():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for i in range(5):
+            await ac.post(
+                "/api/v1/tasks/",
+                json={"name": f"Task {i}", "priority": "LOW"}
+            )
+        
+        # Проходим весь список по next_cursor
+        seen = []
+        params = {"size": 2}
+        while True:
+            response = await ac.get("/api/v1/tasks/", params=params)
+            assert response.status_code == 200
+            data = response.json()
+            seen.extend(task["id"] for task in data["tasks"])
+            if not data["next_cursor"]:
+                break
+            params = {"size": 2, "cursor": data["next_cursor"]}
+    
+    assert len(seen) == 5
+    assert seen == sorted(set(seen), reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_with_invalid_cursor():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get("/api/v1/tasks/", params={"cursor": "not-a-cursor"})
+    
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_total_modes():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post(
+            "/api/v1/tasks/",
+            json={"name": "Test Task", "priority": "MEDIUM"}
+        )
+        
+        no_total = await ac.get("/api/v1/tasks/", params={"total_mode": "none"})
+        estimate = await ac.get("/api/v1/tasks/", params={"total_mode": "estimate"})
+    
+    assert no_total.status_code == 200
+    assert no_total.json()["total"] is None
+    assert len(no_total.json()["tasks"]) == 1
+    
+    assert estimate.status_code == 200
+    assert isinstance(estimate.json()["total"], int)
+
+
+@pytest.mark.asyncio
+async def test_get_task_stats():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for priority in ["HIGH", "HIGH", "LOW"]:
+            await ac.post(
+                "/api/v1/tasks/",
+                json={"name": "Test Task", "priority": priority}
+            )
+        created = await ac.post(
+            "/api/v1/tasks/",
+            json={"name": "Task to Cancel", "priority": "LOW"}
+        )
+        await ac.delete(f"/api/v1/tasks/{created.json()['id']}")
+        
+        response = await ac.get("/api/v1/tasks/stats")
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 4
+    assert data["by_status"]["NEW"] == 3
+    assert data["by_status"]["CANCELLED"] == 1
+    assert data["by_priority"]["HIGH"] == 2
+    assert data["by_priority"]["LOW"] == 2
+
+
+@pytest.mark.asyncio
+async def test_create_tasks_batch():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post(
+            "/api/v1/tasks/batch",
+            json={
+                "tasks": [
+                    {"name": f"Task {i}", "priority": "HIGH"} for i in range(3)
+                ]
+            }
+        )
+        
+        assert response.status_code == 201
+        ids = response.json()["ids"]
+        assert len(ids) == 3
+        assert ids == sorted(ids)
+        
+        task = await ac.get(f"/api/v1/tasks/{ids[0]}")
+    
+    assert task.json()["name"] == "Task 0"
+    assert task.json()["status"] == "NEW"
+
+
+@pytest.mark.asyncio
+async def test_create_tasks_batch_empty():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post("/api/v1/tasks/batch", json={"tasks": []})
+    
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_wait_task():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        created = await ac.post("/api/v1/tasks/", json={"name": "Waited Task"})
+        task_id = created.json()["id"]
+        
+        pending = await ac.get(f"/api/v1/tasks/{task_id}/wait?timeout=0.1")
+        await ac.delete(f"/api/v1/tasks/{task_id}")
+        done = await ac.get(f"/api/v1/tasks/{task_id}/wait?timeout=1")
+        missing = await ac.get("/api/v1/tasks/999999/wait?timeout=0.1")
+    
+    assert pending.json() == {"status": "NEW", "done": False}
+    assert done.json() == {"status": "CANCELLED", "done": True}
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_with_fields():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/api/v1/tasks/", json={"name": "Projected Task"})
+        
+        response = await ac.get("/api/v1/tasks/?fields=id,status")
+        invalid = await ac.get("/api/v1/tasks/?fields=id,secret")
+    
+    assert response.status_code == 200
+    task = response.json()["tasks"][0]
+    assert set(task) == {"id", "status"}
+    assert task["status"] == "NEW"
+    assert invalid.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_metrics_use_route_templates():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.get("/api/v1/tasks/999999")
+        response = await ac.get("/metrics")
+    
+    assert response.status_code == 200
+    assert 'route="/api/v1/tasks/{task_id}",status="404"' in response.text
+    assert "/api/v1/tasks/999999" not in response.text
+    assert "db_pool_checked_out" in response.text
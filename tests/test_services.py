@@ -1,12 +1,50 @@
 import pytest
-from datetime import datetime
-from unittest.mock import AsyncMock, patch
+import asyncio
+import contextlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from src.services.task_service import TaskService
-from src.models.task import Task, TaskStatus, TaskPriority
+from prometheus_client import REGISTRY
+from pydantic import BaseModel
+from sqlalchemy import delete, exc, func, insert, select, text, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from benchmarks.pipeline import CompletionTracker, compare, percentile
+from src.core.config import settings
+from src.core.database import Base, InstrumentedQueuePool, create_engine
+from src.services.broker import MemoryBroker, MemoryMessage, task_message_body
+from src.services.executors import (
+    ExecutionBackend, ProcessPoolRestartedError, TaskExecutor, TaskTimeoutError
+)
+from src.services.handlers import HandlerRegistry, TaskExecutionError
+from src.services.notifications import TASK_STATUS_CHANNEL, NotificationListener
+from src.services.outbox import OutboxRelay
+from src.services.partitions import PartitionMaintainer, missing_partitions
+from src.services.publisher import TASK_QUEUE, TaskPublisher
+from src.services.results import GZIP, ResultChangedError, ResultReader, pack_result
+from src.services.scheduler import WeightedScheduler
+from src.services.status_hub import TaskStatusHub
+from src.services.status_sink import StatusSink
+from src.services.task_cache import TaskCache
+from src.services.task_service import DispatchMode, StatusUpdate, TaskService
+from src.services.worker import TaskCancelledError, TaskWorker
+from src.models.task import Task, TaskOutbox, TaskResult, TaskStatus, TaskPriority
 from src.api.v1.schemas import TaskCreate, TaskUpdate
 
 
+def completed_ids(status_sink: MagicMock) -> set:
+    """id задач, для которых воркер записал COMPLETED"""
+    return {
+        call.args[0] for call in status_sink.record.call_args_list
+        if call.args[1] == TaskStatus.COMPLETED
+    }
+
+
 @pytest.mark.asyncio
 async def test_create_task(db_session):
     """Тест создания задачи"""
@@ -150,8 +188,6 @@ async def test_delete_task(db_session):
 @pytest.mark.asyncio
 async def test_worker_process_task():
     """Тест обработки задачи воркером"""
-    from src.services.worker import TaskWorker
-    
     # Мокаем зависимости
     with patch('src.services.worker.create_async_engine') as mock_engine, \
          patch('src.services.worker.sessionmaker') as mock_sessionmaker, \
@@ -172,3 +208,1258 @@ async def test_worker_process_task():
         
         # Проверяем вызовы
         assert mock_service_instance.update_task.call_count >= 2
+
+
+@pytest.mark.asyncio
+async def test_publisher_reuses_connection():
+    """Тест переиспользования соединения издателем"""
+    mock_channel = AsyncMock()
+    mock_connection = AsyncMock()
+    mock_connection.channel.return_value = mock_channel
+    # aio_pika.pool раскручивает functools.partial через атрибут func
+    mock_channel.close.func = None
+    mock_connection.close.func = None
+    
+    with patch('src.services.publisher.aio_pika.connect_robust',
+               AsyncMock(return_value=mock_connection)) as mock_connect:
+        publisher = TaskPublisher(
+            url="amqp://test", connection_pool_size=1, channel_pool_size=1
+        )
+        await publisher.start()
+        # Основная очередь, очереди повторов и dead letter
+        declared = mock_channel.declare_queue.call_count
+        
+        for task_id in range(5):
+            await publisher.publish(task_id, TaskPriority.HIGH)
+        
+        assert mock_connect.call_count == 1
+        assert mock_channel.declare_queue.call_count == declared
+        assert mock_channel.default_exchange.publish.call_count == 5
+        _, kwargs = mock_channel.default_exchange.publish.call_args
+        assert kwargs["routing_key"] == TASK_QUEUE
+        assert publisher.health()["published"] == 5
+        
+        await publisher.close()
+        assert publisher.health()["status"] == "stopped"
+
+
+class _FakeQueue:
+    """Очередь-заглушка, отдающая заранее заданные сообщения"""
+    
+    def __init__(self, messages):
+        self.messages = messages
+    
+    def __aiter__(self):
+        return self._iterate()
+    
+    async def _iterate(self):
+        for message in self.messages:
+            yield message
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_tasks_concurrently(make_worker):
+    """Тест параллельного выполнения задач воркером"""
+    messages = []
+    for task_id in range(6):
+        message = MagicMock()
+        message.body = json.dumps({"task_id": task_id}).encode()
+        messages.append(message)
+    
+    mock_channel = AsyncMock()
+    mock_channel.declare_queue.return_value = _FakeQueue(messages)
+    mock_connection = AsyncMock()
+    mock_connection.channel.return_value = mock_channel
+    
+    running = 0
+    max_running = 0
+    
+    async def fake_process(task_id, worker_slot=None):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+    
+    with patch('src.services.publisher.aio_pika.connect_robust',
+               AsyncMock(return_value=mock_connection)):
+        worker = make_worker(concurrency=3)
+        worker.publisher = TaskPublisher(url="amqp://test")
+        worker.process_task = fake_process
+        await worker.consume_tasks()
+    
+    mock_channel.set_qos.assert_called_once_with(prefetch_count=3)
+    assert max_running == 3
+    assert all(message.process.called for message in messages)
+
+
+@pytest.mark.asyncio
+async def test_failed_message_is_requeued_with_delay(make_worker):
+    """Тест паузы перед возвратом сообщения в очередь после сбоя"""
+    settled = []
+    message = MemoryMessage(task_message_body(1))
+    message._settle = lambda requeue: settled.append((requeue, time.monotonic()))
+    
+    worker = make_worker(concurrency=1)
+    worker.process_task = AsyncMock(side_effect=RuntimeError("database is down"))
+    
+    started = time.monotonic()
+    with patch('src.services.worker.settings.task_retry_base_delay_ms', 100):
+        with pytest.raises(RuntimeError):
+            await worker.handle_message(message)
+    
+    assert len(settled) == 1
+    requeue, settled_at = settled[0]
+    assert requeue
+    assert settled_at - started >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_saturated_task_type_does_not_starve_others(
+    make_worker, status_sink, claimable_tasks
+):
+    """Тест: задачи типа с занятым лимитом не занимают слоты воркера"""
+    handlers = HandlerRegistry()
+    release_slow = asyncio.Event()
+    
+    @handlers.register("slow", concurrency=1)
+    async def slow(payload):
+        await release_slow.wait()
+    
+    @handlers.register("fast")
+    async def fast(payload):
+        return None
+    
+    claimable_tasks.update({
+        task_id: Task(
+            id=task_id, status=TaskStatus.NEW, priority=TaskPriority.MEDIUM,
+            task_type=task_type, retry_count=0
+        )
+        for task_id, task_type in [(1, "slow"), (2, "slow"), (3, "fast")]
+    })
+    worker = make_worker(concurrency=2, handlers=handlers)
+    
+    async def dispatch(task_id):
+        # Как в consume_tasks: слот воркера берется до запуска сообщения
+        await asyncio.wait_for(worker._semaphore.acquire(), 1)
+        return asyncio.create_task(
+            worker._run_message(MemoryMessage(task_message_body(task_id)))
+        )
+    
+    runs = [await dispatch(1), await dispatch(2)]
+    await asyncio.sleep(0.05)
+    # Вторая медленная задача ждет слот типа, отдав слот воркера
+    runs.append(await dispatch(3))
+    for _ in range(50):
+        if 3 in completed_ids(status_sink):
+            break
+        await asyncio.sleep(0.01)
+    assert completed_ids(status_sink) == {3}
+    
+    release_slow.set()
+    await asyncio.gather(*runs)
+    
+    assert completed_ids(status_sink) == {1, 2, 3}
+
+
+@pytest.mark.asyncio
+async def test_saturated_task_type_is_deferred_from_shared_queue(
+    make_worker, status_sink, claimable_tasks
+):
+    """Тест: медленный тип в общей очереди не блокирует быстрый"""
+    handlers = HandlerRegistry()
+    release_slow = asyncio.Event()
+    
+    @handlers.register("slow", concurrency=1)
+    async def slow(payload):
+        await release_slow.wait()
+    
+    @handlers.register("fast")
+    async def fast(payload):
+        return None
+    
+    # Медленные задачи стоят в очереди перед быстрой
+    types = {task_id: "slow" for task_id in range(1, 7)}
+    types[7] = "fast"
+    tasks = {
+        task_id: Task(
+            id=task_id, status=TaskStatus.NEW, priority=TaskPriority.MEDIUM,
+            task_type=task_type, retry_count=0
+        )
+        for task_id, task_type in types.items()
+    }
+    claimable_tasks.update(tasks)
+    
+    broker = MemoryBroker()
+    await broker.start()
+    worker = make_worker(concurrency=2, handlers=handlers)
+    worker.publisher = broker
+    
+    with patch('src.services.broker.settings.task_queue_routing', "single"), \
+         patch('src.services.broker.settings.task_retry_base_delay_ms', 20):
+        await broker.publish_many([
+            (task_id, TaskPriority.MEDIUM, task.task_type)
+            for task_id, task in tasks.items()
+        ])
+        consumer = asyncio.create_task(worker.consume_tasks())
+        for _ in range(100):
+            if 7 in completed_ids(status_sink):
+                break
+            await asyncio.sleep(0.01)
+        assert completed_ids(status_sink) == {7}
+        
+        # Отложенные задачи возвращаются в очередь и выполняются, когда
+        # освобождается слот типа
+        release_slow.set()
+        for _ in range(200):
+            if completed_ids(status_sink) == set(tasks):
+                break
+            await asyncio.sleep(0.01)
+        assert completed_ids(status_sink) == set(tasks)
+        
+        consumer.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await consumer
+    
+    await broker.close()
+
+
+@pytest.mark.asyncio
+async def test_executor_dispatches_by_task_type():
+    """Тест выбора бэкенда выполнения по типу задачи"""
+    executor = TaskExecutor(
+        backends={
+            "io": ExecutionBackend.THREAD,
+            "cpu": ExecutionBackend.PROCESS,
+        },
+        thread_pool_size=2,
+        process_pool_size=1
+    )
+    
+    async def current_thread():
+        return threading.get_ident()
+    
+    try:
+        loop_thread = await executor.run("default", current_thread)
+        # Синхронный обработчик не блокирует event loop даже без бэкенда
+        sync_thread = await executor.run("default", threading.get_ident)
+        io_thread = await executor.run("io", threading.get_ident)
+        cpu_pid = await executor.run("cpu", os.getpid)
+    finally:
+        executor.shutdown()
+    
+    assert loop_thread == threading.get_ident()
+    assert sync_thread != threading.get_ident()
+    assert io_thread != threading.get_ident()
+    assert cpu_pid != os.getpid()
+
+
+@pytest.mark.asyncio
+async def test_status_sink_batches_transitions():
+    """Тест пакетной записи переходов статусов"""
+    session = AsyncMock()
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__.return_value = session
+    
+    with patch('src.services.status_sink.TaskService') as mock_service:
+        mock_service.return_value.apply_status_updates = AsyncMock(
+            side_effect=lambda updates: [True] * len(updates)
+        )
+        
+        sink = StatusSink(session_factory, max_batch_size=100, flush_interval_ms=20)
+        await sink.start()
+        
+        futures = []
+        for task_id in range(3):
+            futures.append(sink.record(task_id, TaskStatus.IN_PROGRESS))
+            futures.append(sink.record(task_id, TaskStatus.COMPLETED, result="ok"))
+        
+        assert await asyncio.gather(*futures) == [True] * 6
+        await sink.close()
+    
+    # Все переходы записаны одним пакетом и одним commit
+    apply_updates = mock_service.return_value.apply_status_updates
+    assert apply_updates.call_count == 1
+    assert session.commit.call_count == 1
+    
+    updates = apply_updates.call_args.args[0]
+    assert [(u.task_id, u.status) for u in updates[:2]] == [
+        (0, TaskStatus.IN_PROGRESS), (0, TaskStatus.COMPLETED)
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(
+    not settings.database_url.startswith("postgresql"),
+    reason="планы запросов проверяются только в PostgreSQL"
+)
+@pytest.mark.parametrize("filters", [
+    {},
+    {"status": TaskStatus.NEW},
+    {"priority": TaskPriority.HIGH},
+])
+async def test_list_queries_use_indexes(db_session, filters):
+    """Тест использования индексов запросами списка задач"""
+    # На почти пустой таблице планировщик честно выберет seq scan, поэтому
+    # таблица заполняется и статистика собирается заново
+    statuses = list(TaskStatus)
+    priorities = list(TaskPriority)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    await db_session.execute(insert(Task), [
+        {
+            "name": f"Task {number}",
+            "status": statuses[number % len(statuses)],
+            "priority": priorities[number % len(priorities)],
+            "created_at": start + timedelta(seconds=number),
+        }
+        for number in range(20000)
+    ])
+    await db_session.commit()
+    await db_session.execute(text("ANALYZE tasks"))
+    
+    task_service = TaskService(db_session)
+    query = task_service.list_query(**filters).limit(10)
+    sql = query.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    plan = "\n".join(
+        row[0] for row in await db_session.execute(text(f"EXPLAIN {sql}"))
+    )
+    
+    assert "Index" in plan
+    assert "Seq Scan" not in plan
+    # Порядок выдачи обеспечивается индексом, без отдельной сортировки
+    assert "Sort" not in plan
+
+
+@pytest.mark.asyncio
+async def test_outbox_relay_publishes_created_tasks(db_session, session_factory):
+    """Тест пересылки созданных задач из outbox в очередь"""
+    task_service = TaskService(db_session)
+    task = await task_service.create_task(
+        TaskCreate(name="Outbox Task", priority="HIGH")
+    )
+    
+    publisher = AsyncMock()
+    relay = OutboxRelay(session_factory=session_factory, publisher=publisher)
+    
+    assert await relay.relay_once() == 1
+    publisher.publish_many.assert_called_once_with(
+        [(task.id, TaskPriority.HIGH, "default")]
+    )
+    
+    # Отправленные строки удалены из outbox
+    assert await relay.relay_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_executor_enforces_timeout():
+    """Тест отмены обработчика по таймауту"""
+    cancelled = False
+    
+    async def hung_handler():
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+    
+    executor = TaskExecutor(backends={}, cancel_grace=0.1)
+    with pytest.raises(TaskTimeoutError):
+        await executor.run("default", hung_handler, timeout=0.1)
+    
+    assert cancelled
+
+
+@pytest.mark.asyncio
+async def test_executor_kills_process_on_timeout():
+    """Тест принудительной остановки процесса по таймауту"""
+    executor = TaskExecutor(
+        backends={"cpu": ExecutionBackend.PROCESS},
+        process_pool_size=1,
+        cancel_grace=0.1
+    )
+    try:
+        first_pid = await executor.run("cpu", os.getpid)
+        
+        started = time.monotonic()
+        with pytest.raises(TaskTimeoutError):
+            await executor.run("cpu", time.sleep, 60, timeout=0.2)
+        assert time.monotonic() - started < 5
+        
+        # Зависший процесс убит, следующая задача идет в новый пул
+        assert await executor.run("cpu", os.getpid) != first_pid
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_executor_fails_jobs_of_killed_process_pool():
+    """Тест: выполнявшаяся задача убитого пула не запускается повторно"""
+    executor = TaskExecutor(
+        backends={"cpu": ExecutionBackend.PROCESS},
+        process_pool_size=2,
+        cancel_grace=0.1
+    )
+    try:
+        hung, neighbour = await asyncio.gather(
+            executor.run("cpu", time.sleep, 60, timeout=0.5),
+            executor.run("cpu", time.sleep, 3),
+            return_exceptions=True
+        )
+        assert isinstance(hung, TaskTimeoutError)
+        assert isinstance(neighbour, ProcessPoolRestartedError)
+        
+        # Следующая задача выполняется на новом пуле
+        assert await executor.run("cpu", time.sleep, 0) is None
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_task_is_not_completed(db_session):
+    """Тест: воркер не перезаписывает отмену выполняющейся задачи"""
+    task_service = TaskService(db_session)
+    task = await task_service.create_task(TaskCreate(
+        name="Running Task",
+        priority=TaskPriority.LOW
+    ))
+    await task_service.update_task_status(task.id, TaskStatus.IN_PROGRESS)
+    
+    assert await task_service.cancel_task(task.id)
+    
+    applied = await task_service.apply_status_updates([
+        StatusUpdate(task.id, TaskStatus.COMPLETED, result="done")
+    ])
+    await db_session.commit()
+    
+    assert applied == [False]
+    task = await task_service.get_task(task.id)
+    assert task.status == TaskStatus.CANCELLED
+    assert task.result is None
+
+
+@pytest.mark.asyncio
+async def test_duplicate_delivery_does_not_start_running_task(db_session):
+    """Тест: повторно доставленная задача не запускается второй раз"""
+    task_service = TaskService(db_session)
+    task = await task_service.create_task(TaskCreate(name="Delivered Twice"))
+    
+    started = await task_service.start_task(task.id)
+    assert started.status == TaskStatus.IN_PROGRESS
+    assert started.claim_token is not None
+    # Захват жив: второе сообщение задачу не получает
+    assert await task_service.start_task(task.id) is None
+    
+    # Воркер остановился, и срок захвата истек: задачу забирает другой
+    await db_session.execute(
+        update(Task).where(Task.id == task.id)
+        .values(scheduled_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    )
+    await db_session.commit()
+    taken_over = await task_service.start_task(task.id)
+    assert taken_over.claim_token != started.claim_token
+    assert taken_over.retry_count == started.retry_count + 1
+    
+    await task_service.update_task_status(task.id, TaskStatus.COMPLETED)
+    assert await task_service.start_task(task.id) is None
+
+
+@pytest.mark.asyncio
+async def test_worker_redelivers_message_of_running_task(make_worker):
+    """Тест: сообщение о выполняющейся задаче откладывается, а не выполняется"""
+    running = Task(
+        id=1, status=TaskStatus.IN_PROGRESS, priority=TaskPriority.HIGH,
+        task_type="default"
+    )
+    
+    worker = make_worker()
+    worker._run_task = AsyncMock()
+    
+    with patch.object(TaskService, 'start_task', AsyncMock(return_value=None)), \
+         patch.object(TaskService, 'get_task', AsyncMock(return_value=running)), \
+         patch('src.services.worker.settings.task_max_retries', 3):
+        await worker.process_task(1)
+    
+    worker._run_task.assert_not_called()
+    worker.status_sink.record.assert_not_called()
+    worker.publisher.publish_retry.assert_awaited_once_with(
+        1, TaskPriority.HIGH, 3, "default"
+    )
+
+
+@pytest.mark.asyncio
+async def test_status_updates_match_partition_key(db_session):
+    """Тест: переход с created_at ищет задачу только по (id, created_at)"""
+    task_service = TaskService(db_session)
+    task = await task_service.create_task(TaskCreate(name="Pinned Task"))
+    
+    # Строки с таким ключом нет: переход не применяется
+    assert await task_service.apply_status_updates([
+        StatusUpdate(
+            task.id, TaskStatus.IN_PROGRESS,
+            created_at=task.created_at - timedelta(days=31)
+        )
+    ]) == [False]
+    assert await task_service.apply_status_updates([
+        StatusUpdate(task.id, TaskStatus.IN_PROGRESS, created_at=task.created_at)
+    ]) == [True]
+    await db_session.commit()
+    
+    task = await task_service.get_task(task.id)
+    assert task.status == TaskStatus.IN_PROGRESS
+    assert task.started_at is not None
+
+
+@pytest.mark.asyncio
+async def test_worker_interrupts_cancelled_task(make_worker):
+    """Тест прерывания выполняющейся задачи по уведомлению об отмене"""
+    handlers = HandlerRegistry()
+    
+    @handlers.register("hung")
+    async def hung_task(payload):
+        await asyncio.sleep(60)
+    
+    worker = make_worker(concurrency=1, handlers=handlers)
+    execution = asyncio.create_task(
+        worker._execute(7, handlers.get("hung"), {}, timeout=None)
+    )
+    await asyncio.sleep(0.01)
+    worker._on_cancelled("7")
+    
+    with pytest.raises(TaskCancelledError):
+        await execution
+    
+    assert 7 in worker._cancelled
+    assert not worker._running
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("retry_count, expected_status", [
+    (0, TaskStatus.PENDING),
+    (3, TaskStatus.FAILED),
+])
+async def test_worker_retries_failed_task(
+    make_worker, claimable_tasks, retry_count, expected_status
+):
+    """Тест отложенного повтора упавшей задачи и переноса в dead letter"""
+    handlers = HandlerRegistry()
+    
+    @handlers.register("flaky")
+    async def failing_task(payload):
+        raise TaskExecutionError(f"Task {payload['id']} failed")
+    
+    task = Task(
+        id=1,
+        name="Flaky Task",
+        priority=TaskPriority.HIGH,
+        status=TaskStatus.PENDING,
+        task_type="flaky",
+        payload={"id": 1},
+        retry_count=retry_count
+    )
+    claimable_tasks[task.id] = task
+    
+    worker = make_worker(handlers=handlers)
+    with patch('src.services.worker.settings.task_max_retries', 3):
+        await worker.process_task(task.id)
+    
+    final = worker.status_sink.record.call_args
+    assert final.args == (task.id, expected_status)
+    assert final.kwargs["error_info"] == "Task 1 failed"
+    if expected_status == TaskStatus.PENDING:
+        assert final.kwargs["retry_count"] == 1
+        worker.publisher.publish_retry.assert_awaited_once_with(
+            task.id, TaskPriority.HIGH, 1, "flaky"
+        )
+        worker.publisher.publish_dead.assert_not_called()
+    else:
+        worker.publisher.publish_retry.assert_not_called()
+        worker.publisher.publish_dead.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_worker_does_not_retry_timed_out_task(make_worker, claimable_tasks):
+    """Тест: задача, превысившая таймаут, сразу получает FAILED"""
+    handlers = HandlerRegistry()
+    
+    @handlers.register("hung")
+    async def hung_task(payload):
+        await asyncio.sleep(60)
+    
+    task = Task(
+        id=1,
+        name="Hung Task",
+        priority=TaskPriority.HIGH,
+        status=TaskStatus.PENDING,
+        task_type="hung",
+        timeout_seconds=0.05,
+        retry_count=0
+    )
+    claimable_tasks[task.id] = task
+    
+    worker = make_worker(handlers=handlers)
+    with patch('src.services.worker.settings.task_max_retries', 3):
+        await worker.process_task(task.id)
+    
+    final = worker.status_sink.record.call_args
+    assert final.args == (task.id, TaskStatus.FAILED)
+    assert "timed out" in final.kwargs["error_info"]
+    worker.publisher.publish_retry.assert_not_called()
+    worker.publisher.publish_dead.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_worker_dispatches_by_task_type(make_worker, claimable_tasks):
+    """Тест выбора обработчика по task_type и лимита параллелизма типа"""
+    class ResizePayload(BaseModel):
+        width: int
+    
+    handlers = HandlerRegistry()
+    running = 0
+    max_running = 0
+    
+    @handlers.register("resize", payload_model=ResizePayload, concurrency=1)
+    async def resize(payload: ResizePayload):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return {"width": payload.width}
+    
+    claimable_tasks.update({
+        task_id: Task(
+            id=task_id,
+            name="Resize",
+            priority=TaskPriority.MEDIUM,
+            status=TaskStatus.PENDING,
+            task_type="resize",
+            payload={"width": 100 * task_id},
+            retry_count=0
+        )
+        for task_id in range(1, 4)
+    })
+    claimable_tasks[4] = Task(
+        id=4, name="Unknown", priority=TaskPriority.MEDIUM,
+        status=TaskStatus.PENDING, task_type="missing", retry_count=0
+    )
+    
+    worker = make_worker(concurrency=4, handlers=handlers)
+    await asyncio.gather(*(worker.process_task(task_id) for task_id in claimable_tasks))
+    
+    assert max_running == 1
+    calls = {
+        (call.args, call.kwargs.get("result"), call.kwargs.get("error_info"))
+        for call in worker.status_sink.record.call_args_list
+        if call.args[1] != TaskStatus.IN_PROGRESS
+    }
+    assert ((2, TaskStatus.COMPLETED), '{"width": 200}', None) in calls
+    assert ((4, TaskStatus.FAILED), None, "Unknown task type: missing") in calls
+    # Слот типа ждет одна задача, третья откладывается без траты попытки
+    worker.publisher.publish_retry.assert_called_once_with(
+        3, TaskPriority.MEDIUM, 1, "resize"
+    )
+    
+    # Тип без обработчика не заводит свою серию метрик
+    failures = "task_failures_total"
+    assert REGISTRY.get_sample_value(
+        failures, {"task_type": "missing", "reason": "invalid"}
+    ) is None
+    assert REGISTRY.get_sample_value(
+        failures, {"task_type": "unknown", "reason": "invalid"}
+    ) >= 1
+
+
+@pytest.mark.asyncio
+async def test_weighted_scheduler_shares_slots_by_weight():
+    """Тест выбора сообщений из очередей пропорционально весам"""
+    scheduler = WeightedScheduler({"high": 3, "low": 1})
+    for i in range(8):
+        scheduler.put("high", f"high-{i}")
+        scheduler.put("low", f"low-{i}")
+    
+    picked = [await scheduler.get() for _ in range(8)]
+    assert sum(item.startswith("high") for item in picked) == 6
+    assert sum(item.startswith("low") for item in picked) == 2
+    
+    # Пустая очередь не забирает слоты у остальных
+    rest = [await scheduler.get() for _ in range(8)]
+    assert rest[-4:] == ["low-4", "low-5", "low-6", "low-7"]
+    
+    scheduler.close("high")
+    scheduler.close("low")
+    assert await scheduler.get() is None
+
+
+@pytest.mark.asyncio
+async def test_fast_type_queue_uses_free_slots(
+    make_worker, status_sink, claimable_tasks
+):
+    """Тест: очередь быстрого типа с малым весом занимает свободные слоты"""
+    handlers = HandlerRegistry()
+    release_slow = asyncio.Event()
+    fast_started = []
+    all_fast_started = asyncio.Event()
+    
+    @handlers.register("slow", concurrency=1)
+    async def slow(payload):
+        await release_slow.wait()
+    
+    # Быстрые задачи завершаются, только когда все три выполняются разом
+    @handlers.register("fast")
+    async def fast(payload):
+        fast_started.append(payload)
+        if len(fast_started) == 3:
+            all_fast_started.set()
+        await all_fast_started.wait()
+    
+    types = {1: "slow", 2: "slow", 3: "fast", 4: "fast", 5: "fast"}
+    tasks = {
+        task_id: Task(
+            id=task_id, status=TaskStatus.NEW, priority=TaskPriority.MEDIUM,
+            task_type=task_type, retry_count=0
+        )
+        for task_id, task_type in types.items()
+    }
+    claimable_tasks.update(tasks)
+    
+    broker = MemoryBroker()
+    await broker.start()
+    worker = make_worker(concurrency=4, handlers=handlers)
+    worker.publisher = broker
+    
+    with patch('src.services.broker.settings.task_queue_routing', "task_type"), \
+         patch('src.services.broker.settings.task_type_weights', {"slow": 9, "fast": 1}):
+        await broker.publish_many([
+            (task_id, TaskPriority.MEDIUM, task.task_type)
+            for task_id, task in tasks.items()
+        ])
+        consumer = asyncio.create_task(worker.consume_tasks())
+        # Доля очереди fast по весу - меньше одного слота, но медленная
+        # задача держит только один слот, и три быстрые идут параллельно
+        for _ in range(100):
+            if {3, 4, 5} <= completed_ids(status_sink):
+                break
+            await asyncio.sleep(0.01)
+        assert completed_ids(status_sink) == {3, 4, 5}
+        
+        release_slow.set()
+        for _ in range(100):
+            if completed_ids(status_sink) == set(tasks):
+                break
+            await asyncio.sleep(0.01)
+        assert completed_ids(status_sink) == set(tasks)
+        
+        consumer.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await consumer
+    
+    await broker.close()
+
+
+@pytest.mark.asyncio
+async def test_publisher_routes_by_priority():
+    """Тест публикации в отдельные очереди по приоритету"""
+    mock_channel = AsyncMock()
+    mock_connection = AsyncMock()
+    mock_connection.channel.return_value = mock_channel
+    mock_channel.close.func = None
+    mock_connection.close.func = None
+    
+    with patch('src.services.publisher.aio_pika.connect_robust',
+               AsyncMock(return_value=mock_connection)), \
+         patch('src.services.publisher.settings.task_queue_routing', "priority"):
+        publisher = TaskPublisher(
+            url="amqp://test", connection_pool_size=1, channel_pool_size=1
+        )
+        await publisher.start()
+        await publisher.publish_many([
+            (1, TaskPriority.HIGH, "default"),
+            (2, TaskPriority.LOW, "default"),
+        ])
+        await publisher.close()
+    
+    declared = {
+        call.args[0]: call.kwargs["arguments"]
+        for call in mock_channel.declare_queue.call_args_list
+        if "arguments" in call.kwargs
+    }
+    assert declared["task_queue.high"] == {}
+    assert declared["task_queue.low.retry.1"]["x-dead-letter-routing-key"] == (
+        "task_queue.low"
+    )
+    routing_keys = [
+        call.kwargs["routing_key"]
+        for call in mock_channel.default_exchange.publish.call_args_list
+    ]
+    assert routing_keys == ["task_queue.high", "task_queue.low"]
+
+
+def test_task_cache_invalidation():
+    """Тест кэша чтений задач: TTL активных задач и инвалидация"""
+    cache = TaskCache(max_size=2, ttl_seconds=60)
+    
+    # Без слушателя кэшируются только завершенные задачи
+    cache.put(1, "status", TaskStatus.IN_PROGRESS, TaskStatus.IN_PROGRESS, cache.epoch)
+    cache.put(2, "status", TaskStatus.COMPLETED, TaskStatus.COMPLETED, cache.epoch)
+    assert cache.get(1, "status") is None
+    assert cache.get(2, "status") == TaskStatus.COMPLETED
+    
+    listener = NotificationListener(database_url="postgresql://test/db")
+    listener._connection = MagicMock(is_closed=MagicMock(return_value=False))
+    cache.attach(listener)
+    
+    cache.put(1, "status", TaskStatus.IN_PROGRESS, TaskStatus.IN_PROGRESS, cache.epoch)
+    assert cache.get(1, "status") == TaskStatus.IN_PROGRESS
+    
+    # Значение, прочитанное до инвалидации, в кэш не попадает
+    epoch = cache.epoch
+    listener._dispatch(None, 0, TASK_STATUS_CHANNEL, "1:COMPLETED,7:PENDING")
+    assert cache.get(1, "status") is None
+    cache.put(1, "status", TaskStatus.IN_PROGRESS, TaskStatus.IN_PROGRESS, epoch)
+    assert cache.get(1, "status") is None
+    # Инвалидация другой задачи не мешает заполнению
+    cache.put(5, "status", TaskStatus.IN_PROGRESS, TaskStatus.IN_PROGRESS, epoch)
+    assert cache.get(5, "status") == TaskStatus.IN_PROGRESS
+    # Завершенная задача, удаленная во время чтения, тоже не кэшируется
+    epoch = cache.epoch
+    cache.invalidate(6)
+    cache.put(6, "task", {"id": 6}, TaskStatus.CANCELLED, epoch)
+    assert cache.get(6, "task") is None
+    
+    # LRU вытесняет самую давнюю запись
+    cache.put(3, "task", {"id": 3}, TaskStatus.FAILED, cache.epoch)
+    cache.put(4, "task", {"id": 4}, TaskStatus.FAILED, cache.epoch)
+    assert cache.get(2, "status") is None
+    assert cache.get(4, "task") == {"id": 4}
+
+
+@pytest.mark.asyncio
+async def test_status_hub_follows_transitions():
+    """Тест ожидания переходов статуса по уведомлениям"""
+    listener = NotificationListener(database_url="postgresql://test/db")
+    listener._connection = MagicMock(is_closed=MagicMock(return_value=False))
+    hub = TaskStatusHub(recheck_seconds=60)
+    hub.attach(listener)
+    load_status = AsyncMock(return_value=TaskStatus.PENDING)
+    
+    async def collect():
+        return [
+            status async for status in hub.follow(1, load_status, timeout=5)
+        ]
+    
+    waiter = asyncio.create_task(collect())
+    await asyncio.sleep(0.01)
+    assert hub.health() == {"tasks": 1, "waiters": 1}
+    
+    listener._dispatch(None, 0, TASK_STATUS_CHANNEL, "2:COMPLETED,1:IN_PROGRESS")
+    listener._dispatch(None, 0, TASK_STATUS_CHANNEL, "1:COMPLETED")
+    
+    assert await waiter == [
+        TaskStatus.PENDING, TaskStatus.IN_PROGRESS, TaskStatus.COMPLETED
+    ]
+    # Статус прочитан из базы один раз, дальше только уведомления
+    load_status.assert_awaited_once()
+    assert hub.health() == {"tasks": 0, "waiters": 0}
+
+
+@pytest.mark.asyncio
+async def test_large_result_is_stored_separately(db_session):
+    """Тест: большой результат уходит в task_results и читается по частям"""
+    task_service = TaskService(db_session)
+    task = await task_service.create_task(TaskCreate(
+        name="Report Task",
+        priority=TaskPriority.LOW
+    ))
+    await task_service.update_task_status(task.id, TaskStatus.IN_PROGRESS)
+    
+    result = "row;" * 10000
+    applied = await task_service.apply_status_updates([
+        StatusUpdate(task.id, TaskStatus.COMPLETED, stored_result=pack_result(result))
+    ])
+    await db_session.commit()
+    
+    assert applied == [True]
+    task = await task_service.get_task(task.id)
+    assert task.result is None
+    assert task.result_external
+    assert task.result_size == len(result)
+    
+    # Части читаются в своих сессиях, а не в сессии запроса
+    reader = ResultReader(
+        async_sessionmaker(db_session.bind, expire_on_commit=False), chunk_size=64
+    )
+    info = await reader.get_info(task.id)
+    assert info.encoding == GZIP
+    assert info.length < info.size == len(result)
+    chunks = [chunk async for chunk in reader.iter_decoded(task.id, info)]
+    assert b"".join(chunks).decode() == result
+    
+    # Удаление или перезапись результата во время отдачи прерывает поток
+    stream = reader.iter_content(task.id, info)
+    await stream.__anext__()
+    await db_session.execute(delete(TaskResult).where(TaskResult.task_id == task.id))
+    await db_session.commit()
+    with pytest.raises(ResultChangedError):
+        await stream.__anext__()
+
+
+def test_missing_partitions():
+    """Тест расчета месячных секций, которые нужно создать заранее"""
+    now = datetime(2026, 11, 15, 12, 0, tzinfo=timezone.utc)
+    
+    # Секции до января существуют, создаются февраль и март
+    partitions = missing_partitions(
+        datetime(2027, 2, 1, tzinfo=timezone.utc), now, premake_months=4
+    )
+    assert [name for name, _, _ in partitions] == ["tasks_p202702", "tasks_p202703"]
+    _, start, end = partitions[0]
+    assert start == datetime(2027, 2, 1, tzinfo=timezone.utc)
+    assert end == datetime(2027, 3, 1, tzinfo=timezone.utc)
+    
+    # Пропущенные месяцы тоже создаются, начиная с последней границы
+    partitions = missing_partitions(
+        datetime(2026, 9, 1, tzinfo=timezone.utc), now, premake_months=1
+    )
+    assert [name for name, _, _ in partitions] == [
+        "tasks_p202609", "tasks_p202610", "tasks_p202611", "tasks_p202612"
+    ]
+    
+    assert missing_partitions(datetime(2027, 6, 1, tzinfo=timezone.utc), now, 3) == []
+
+
+@pytest.mark.asyncio
+async def test_partitions_not_created_over_default_rows():
+    """Тест: строки в DEFAULT не переносятся, а блокируют создание секций"""
+    db = MagicMock()
+    db.get_bind.return_value.dialect.name = "postgresql"
+    db.get_bind.return_value.dialect.identifier_preparer.quote = lambda name: name
+    db.execute = AsyncMock()
+    db.commit = AsyncMock()
+    
+    @contextlib.asynccontextmanager
+    async def session_factory():
+        yield db
+    
+    now = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    following = now.replace(year=now.year + now.month // 12, month=now.month % 12 + 1)
+    
+    # Секции есть до начала текущего месяца, задачи этого месяца уже в DEFAULT
+    async def default_rows(db, default, start=None, end=None):
+        return 5 if start is None or start == now else 0
+    
+    maintainer = PartitionMaintainer(
+        session_factory=session_factory, premake_months=1, retention_days=0
+    )
+    maintainer._lock = AsyncMock(return_value=True)
+    maintainer._partitions = AsyncMock(
+        return_value={"tasks_legacy": now, "tasks_default": None}
+    )
+    maintainer._default_rows = default_rows
+    maintainer._runner = MagicMock()
+    
+    summary = await maintainer.run_once()
+    
+    assert summary["created"] == []
+    assert summary["default_rows"] == 5
+    assert summary["blocked"] == [f"tasks_p{now:%Y%m}", f"tasks_p{following:%Y%m}"]
+    # Ни DETACH DEFAULT, ни переноса строк под блокировкой tasks
+    db.execute.assert_not_called()
+    health = maintainer.health()
+    assert health["status"] == "degraded"
+    assert health["default_rows"] == 5
+    
+    # Строки перенесены вручную: секции создаются, health восстанавливается
+    maintainer._default_rows = AsyncMock(return_value=0)
+    summary = await maintainer.run_once()
+    assert summary["created"] == [f"tasks_p{now:%Y%m}", f"tasks_p{following:%Y%m}"]
+    statement = str(db.execute.call_args_list[0].args[0])
+    assert statement == (
+        f"CREATE TABLE tasks_p{now:%Y%m} PARTITION OF tasks FOR VALUES "
+        f"FROM ('{now.isoformat()}') TO ('{following.isoformat()}')"
+    )
+    assert maintainer.health()["status"] == "running"
+
+
+@pytest.mark.asyncio
+async def test_pool_reports_checkout_wait(tmp_path):
+    """Тест метрик ожидания соединения в пуле"""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05
+    )
+    try:
+        async with engine.connect():
+            assert engine.pool.stats()["saturation"] == 1
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect():
+                    pass
+        
+        stats = engine.pool.stats()
+        assert stats["checkouts"] == 2
+        assert stats["timeouts"] == 1
+        assert stats["checked_out"] == 0
+        assert stats["wait_ms_max"] >= 50
+    finally:
+        await engine.dispose()
+
+
+def test_benchmark_compare_detects_regressions():
+    """Тест сравнения результатов нагрузочного прогона с базовыми"""
+    assert percentile([5, 1, 3, 2, 4], 50) == 3
+    assert percentile([5, 1, 3, 2, 4], 99) == 5
+    
+    def level(concurrency, throughput, p99):
+        latency = {"p50": 1, "p99": p99, "max": p99}
+        return {
+            "concurrency": concurrency,
+            "throughput": throughput,
+            "create_latency_ms": latency,
+            "end_to_end_latency_ms": latency,
+        }
+    
+    baseline = {"levels": [level(1, 100, 10), level(8, 400, 20)]}
+    current = {"levels": [level(1, 95, 11), level(8, 300, 20), level(32, 50, 90)]}
+    
+    regressions = compare(current, baseline, tolerance=0.2)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("concurrency 8: throughput")
+
+
+@pytest.mark.asyncio
+async def test_worker_rejects_memory_broker_outside_api(make_worker):
+    """Тест: отдельный воркер не запускается с брокером в памяти"""
+    worker = make_worker(concurrency=1)
+    worker.dispatch_mode = DispatchMode.BROKER
+    worker.publisher = MemoryBroker()
+    worker.status_sink = AsyncMock()
+    
+    with pytest.raises(RuntimeError, match="BROKER=memory"):
+        await worker.run()
+    worker.status_sink.start.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_embedded_worker_stops_without_closing_shared_resources(make_worker):
+    """Тест: воркер в процессе API не закрывает брокер и пул соединений"""
+    broker = MemoryBroker()
+    await broker.start()
+    worker = make_worker(concurrency=1, embedded=True)
+    worker.dispatch_mode = DispatchMode.BROKER
+    worker.publisher = broker
+    worker.status_sink = AsyncMock()
+    worker.listener = AsyncMock()
+    
+    with patch('src.services.worker.settings.worker_metrics_port', 0), \
+         patch('src.services.worker.close_db') as close_db:
+        run = asyncio.create_task(worker.run())
+        await asyncio.sleep(0.05)
+        worker.stop()
+        await asyncio.wait_for(run, 1)
+    
+    assert broker.started
+    close_db.assert_not_called()
+    worker.status_sink.close.assert_awaited_once()
+    await broker.close()
+
+
+@pytest.mark.asyncio
+async def test_benchmark_tracker_reports_failed_tasks():
+    """Тест: ожидание прогона не висит до таймаута на упавшей задаче"""
+    tracker = CompletionTracker(MagicMock())
+    committed = asyncio.get_running_loop().create_future()
+    committed.set_result(True)
+    tracker._on_committed(1, TaskStatus.COMPLETED, committed)
+    tracker._on_committed(2, TaskStatus.FAILED, committed)
+    
+    await tracker.wait_for([1], timeout=1)
+    with pytest.raises(RuntimeError, match="did not complete"):
+        await tracker.wait_for([1, 2], timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_memory_broker_runs_pipeline(tmp_path):
+    """Тест полного цикла задачи на SQLite и брокере в памяти"""
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'tasks.db'}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    
+    handlers = HandlerRegistry()
+    
+    @handlers.register("echo")
+    async def echo(payload: dict) -> str:
+        return payload["text"]
+    
+    broker = MemoryBroker()
+    await broker.start()
+    worker = TaskWorker(concurrency=2, handlers=handlers)
+    worker.async_session = session_factory
+    worker.status_sink = StatusSink(session_factory)
+    worker.publisher = broker
+    await worker.status_sink.start()
+    consumer = asyncio.create_task(worker.consume_tasks())
+    try:
+        async with session_factory() as session:
+            task = await TaskService(session).create_task(TaskCreate(
+                name="Memory Task", task_type="echo", payload={"text": "done"}
+            ))
+        relay = OutboxRelay(session_factory=session_factory, publisher=broker)
+        assert await relay.relay_once() == 1
+        
+        for _ in range(100):
+            async with session_factory() as session:
+                stored = await TaskService(session).get_task(task.id)
+            if stored.status == TaskStatus.COMPLETED:
+                break
+            await asyncio.sleep(0.05)
+        
+        assert stored.status == TaskStatus.COMPLETED
+        assert stored.result == "done"
+        assert broker.health()["queued"] == {"task_queue": 0}
+    finally:
+        consumer.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await consumer
+        await worker.status_sink.close()
+        await broker.close()
+        worker.executor.shutdown()
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_claim_tasks_from_table(tmp_path):
+    """Тест захвата задач из tasks в режиме TASK_DISPATCH_MODE=database"""
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'tasks.db'}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    
+    try:
+        with patch('src.services.task_service.settings.task_dispatch_mode', "database"):
+            async with session_factory() as session:
+                service = TaskService(session)
+                low = await service.create_task(
+                    TaskCreate(name="Low", priority=TaskPriority.LOW)
+                )
+                high = await service.create_task(
+                    TaskCreate(name="High", priority=TaskPriority.HIGH)
+                )
+                slow = await service.create_task(TaskCreate(
+                    name="Slow", priority=TaskPriority.MEDIUM, timeout_seconds=3600
+                ))
+                # Outbox и брокер в этом режиме не участвуют
+                outbox = await session.scalar(
+                    select(func.count()).select_from(TaskOutbox)
+                )
+                assert outbox == 0
+                
+                claimed = await service.claim_tasks(2)
+                assert [task.id for task in claimed] == [high.id, slow.id]
+                assert all(task.status == TaskStatus.IN_PROGRESS for task in claimed)
+                assert [task.id for task in await service.claim_tasks(5)] == [low.id]
+                assert await service.claim_tasks(5) == []
+                
+                stats = await service.get_stats()
+                assert {(status, priority) for status, priority, _ in stats} == {
+                    (TaskStatus.IN_PROGRESS, priority) for priority in TaskPriority
+                }
+                
+                leases = dict((await session.execute(
+                    select(Task.id, Task.scheduled_at)
+                )).all())
+                assert leases[slow.id] - leases[high.id] > timedelta(minutes=50)
+                
+                # Задачу с истекшим сроком захвата забирает другой воркер
+                await session.execute(
+                    update(Task)
+                    .where(Task.id == high.id)
+                    .values(scheduled_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+                )
+                await session.commit()
+                reclaimed = await service.claim_tasks(5)
+                assert [task.id for task in reclaimed] == [high.id]
+                # Перехват считается попыткой и меняет метку захвата
+                assert reclaimed[0].retry_count == 1
+                assert reclaimed[0].claim_token != claimed[0].claim_token
+                
+                # Прежний воркер больше не записывает статусы задачи
+                assert await service.apply_status_updates([
+                    StatusUpdate(
+                        high.id, TaskStatus.COMPLETED,
+                        claim_token=claimed[0].claim_token
+                    )
+                ]) == [False]
+                assert await service.apply_status_updates([
+                    StatusUpdate(
+                        high.id, TaskStatus.COMPLETED,
+                        claim_token=reclaimed[0].claim_token
+                    )
+                ]) == [True]
+                await session.commit()
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_claimed_task_respects_lease(make_worker):
+    """Тест: захваченная задача не выполняется после потери захвата"""
+    handlers = HandlerRegistry()
+    executed = []
+    
+    @handlers.register("echo")
+    async def echo(payload):
+        executed.append(payload)
+    
+    def claimed_task(task_id, retry_count=0, waited=timedelta(0)):
+        return Task(
+            id=task_id, name="Claimed", priority=TaskPriority.MEDIUM,
+            status=TaskStatus.IN_PROGRESS, task_type="echo", payload={"id": task_id},
+            retry_count=retry_count, claim_token=f"token-{task_id}",
+            started_at=datetime.now(timezone.utc) - waited
+        )
+    
+    # Захват перехвачен: продление срока не применяется
+    def record(task_id, status, **kwargs):
+        applied = asyncio.get_running_loop().create_future()
+        applied.set_result(status != TaskStatus.IN_PROGRESS)
+        return applied
+    
+    worker = make_worker(concurrency=2, handlers=handlers)
+    worker.dispatch_mode = DispatchMode.DATABASE
+    worker.status_sink.record.side_effect = record
+    
+    # Задача ждала слот дольше половины запаса срока захвата
+    waited = timedelta(seconds=settings.task_claim_lease_grace_seconds)
+    await worker._semaphore.acquire()
+    await worker._run_claimed(claimed_task(1, waited=waited))
+    assert executed == []
+    renew = worker.status_sink.record.call_args_list[0]
+    assert renew.args == (1, TaskStatus.IN_PROGRESS)
+    assert renew.kwargs["claim_token"] == "token-1"
+    
+    # Свежий захват не продлевается, а итоговый статус несет метку захвата
+    worker.status_sink.record.reset_mock()
+    await worker._semaphore.acquire()
+    await worker._run_claimed(claimed_task(2))
+    assert executed == [{"id": 2}]
+    (completed,) = worker.status_sink.record.call_args_list
+    assert completed.args == (2, TaskStatus.COMPLETED)
+    assert completed.kwargs["claim_token"] == "token-2"
+    
+    # Перехваты по истекшему сроку исчерпали повторы
+    worker.status_sink.record.reset_mock()
+    await worker._semaphore.acquire()
+    await worker._run_claimed(claimed_task(3, retry_count=settings.task_max_retries + 1))
+    assert executed == [{"id": 2}]
+    (failed,) = worker.status_sink.record.call_args_list
+    assert failed.args == (3, TaskStatus.FAILED)
+    assert "claim lease expired" in failed.kwargs["error_info"]
+    
+    # Слоты воркера возвращены
+    assert worker._semaphore._value == 2